@@ -0,0 +1,286 @@
+"""
+CAMEL Agent 的精确匹配提示词缓存
+以 (模型, 模型参数, 系统提示词, 规范化后的提示词) 的哈希为键缓存 ChatAgent.step 的回复，
+重试循环中重复发送的相同提示词不再消耗 token 与等待时间
+
+注意：PromptCache.step 命中时不调用模型，本轮对话也不会写入 ChatAgent 的记忆；
+经 CachedChatAgent 调用时由包装层把命中的这一轮写回记忆，后续调用看到的历史与未命中时一致。
+回复依赖对话记忆的调用点仍应传入 use_cache=False。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    from camel.messages import BaseMessage
+    from camel.types import OpenAIBackendRole
+except ImportError:
+    BaseMessage = OpenAIBackendRole = None
+
+logger = logging.getLogger(__name__)
+
+
+def canonicalize_prompt(prompt: str) -> str:
+    """规范化提示词：去掉每行首尾空白与空行，消除 f-string 缩进带来的差异"""
+    lines = (line.strip() for line in (prompt or "").splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+@dataclass
+class CachedMessage:
+    """缓存命中时返回的消息，只提供调用方使用的 content"""
+    content: str
+
+
+@dataclass
+class CachedResponse:
+    """缓存命中时返回的响应，与 ChatAgentResponse 一样通过 response.msg.content 读取回复"""
+    msg: CachedMessage
+    cached: bool = True
+
+
+class MemoryPromptCacheBackend:
+    """进程内 LRU 后端"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, content: str):
+        with self._lock:
+            self._entries[key] = (content, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskPromptCacheBackend:
+    """SQLite 后端，可跨进程、跨重启共享"""
+
+    def __init__(self, path: str = "prompt_cache.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS prompt_cache (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, created_at FROM prompt_cache WHERE key = ?", (key,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def set(self, key: str, content: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prompt_cache VALUES (?, ?, ?)", (key, content, time.time())
+            )
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM prompt_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM prompt_cache")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class PromptCache:
+    """提示词缓存"""
+
+    def __init__(self, backend=None, ttl: Optional[float] = None, enabled: bool = True):
+        """
+        初始化提示词缓存
+
+        Args:
+            backend: 存储后端（MemoryPromptCacheBackend 或 DiskPromptCacheBackend），为None时使用进程内后端
+            ttl: 条目存活秒数，为None时不过期
+            enabled: 为False时所有调用直接访问模型
+        """
+        self.backend = backend or MemoryPromptCacheBackend()
+        self.ttl = ttl
+        self.enabled = enabled
+        self._metrics = {'hits': 0, 'misses': 0, 'bypassed': 0, 'expired': 0}
+
+    @staticmethod
+    def make_key(model: str, params: Optional[Dict[str, Any]], system_prompt: str, prompt: str) -> str:
+        """构造缓存键"""
+        payload = json.dumps({
+            "model": str(model),
+            "params": params or {},
+            "system": canonicalize_prompt(system_prompt),
+            "prompt": canonicalize_prompt(prompt),
+        }, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def step(
+        self,
+        step_fn: Callable[[Any], Any],
+        message: Any,
+        model: str,
+        params: Optional[Dict[str, Any]] = None,
+        system_prompt: str = "",
+        use_cache: bool = True
+    ) -> Any:
+        """
+        经缓存调用 ChatAgent.step
+
+        Args:
+            step_fn: 实际的 step 调用
+            message: BaseMessage（读取其 content 作为提示词）
+            model: 模型名称
+            params: 模型参数（temperature、max_tokens 等）
+            system_prompt: 系统提示词
+            use_cache: 为False时跳过缓存（调用点级别的开关）
+
+        Returns:
+            命中时为 CachedResponse，否则为 step_fn 的原始响应
+        """
+        if not (self.enabled and use_cache):
+            self._metrics['bypassed'] += 1
+            return step_fn(message)
+
+        key = self.make_key(model, params, system_prompt, getattr(message, "content", str(message)))
+        entry = self.backend.get(key)
+        if entry is not None:
+            content, created_at = entry
+            if self.ttl is None or time.time() - created_at <= self.ttl:
+                self._metrics['hits'] += 1
+                return CachedResponse(CachedMessage(content))
+            self._metrics['expired'] += 1
+            self.backend.delete(key)
+
+        self._metrics['misses'] += 1
+        response = step_fn(message)
+        content = getattr(getattr(response, "msg", None), "content", None)
+        if content:
+            self.backend.set(key, content)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率等统计信息"""
+        lookups = self._metrics['hits'] + self._metrics['misses']
+        return {**self._metrics, 'hit_rate': self._metrics['hits'] / lookups if lookups else 0.0}
+
+    def clear(self):
+        """清空缓存"""
+        self.backend.clear()
+
+
+class CachedChatAgent:
+    """
+    为 ChatAgent 加上提示词缓存的包装
+
+    step 经缓存调用，命中时把这一轮写回 ChatAgent 的记忆；
+    其余属性（memory、reset 等）透传给被包装的 ChatAgent。
+    """
+
+    def __init__(self, agent, model: str, params: Optional[Dict[str, Any]] = None,
+                 cache: Optional[PromptCache] = None):
+        """
+        Args:
+            agent: 被包装的 ChatAgent
+            model: 模型名称
+            params: 模型参数
+            cache: 使用的缓存，为None时使用进程内共享的默认缓存
+        """
+        self.agent = agent
+        self.model = model
+        self.params = params
+        self.cache = cache or get_default_prompt_cache()
+
+    def step(self, message, use_cache: bool = True):
+        """经缓存调用 ChatAgent.step，use_cache=False 时直接调用模型"""
+        system_prompt = getattr(getattr(self.agent, "system_message", None), "content", "") or ""
+        response = self.cache.step(
+            self.agent.step, message, self.model, self.params, system_prompt, use_cache=use_cache
+        )
+        if isinstance(response, CachedResponse):
+            self.record_turn(message, response.msg.content)
+        return response
+
+    def record_turn(self, message, reply: str):
+        """
+        把未经模型生成的一轮对话写入 ChatAgent 记忆
+
+        Args:
+            message: 用户消息
+            reply: 回复内容
+        """
+        if OpenAIBackendRole is None:
+            return
+        role_name = getattr(getattr(self.agent, "system_message", None), "role_name", None) or "assistant"
+        self.agent.update_memory(message, OpenAIBackendRole.USER)
+        self.agent.update_memory(
+            BaseMessage.make_assistant_message(role_name=role_name, content=reply),
+            OpenAIBackendRole.ASSISTANT
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.agent, name)
+
+
+_default_cache: Optional[PromptCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_prompt_cache() -> PromptCache:
+    """
+    获取进程内共享的默认缓存
+
+    由环境变量配置:
+        PROMPT_CACHE_BACKEND: memory（默认）或 disk
+        PROMPT_CACHE_PATH: disk 后端的 SQLite 文件路径（默认 prompt_cache.sqlite3）
+        PROMPT_CACHE_TTL: 条目存活秒数（默认不过期）
+        PROMPT_CACHE_DISABLED: 为 1/true 时关闭缓存
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            if os.getenv("PROMPT_CACHE_BACKEND", "memory").lower() == "disk":
+                backend = DiskPromptCacheBackend(os.getenv("PROMPT_CACHE_PATH", "prompt_cache.sqlite3"))
+            else:
+                backend = MemoryPromptCacheBackend()
+            ttl = float(os.getenv("PROMPT_CACHE_TTL")) if os.getenv("PROMPT_CACHE_TTL") else None
+            enabled = os.getenv("PROMPT_CACHE_DISABLED", "").lower() not in ("1", "true", "yes")
+            _default_cache = PromptCache(backend, ttl=ttl, enabled=enabled)
+        return _default_cache
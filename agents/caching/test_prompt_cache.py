@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件
+
+用于测试提示词缓存的键规范化、调用点开关、TTL、磁盘后端与命中时的记忆写回。
+"""
+
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from agents.caching import prompt_cache
+from agents.caching.prompt_cache import CachedChatAgent, DiskPromptCacheBackend, PromptCache
+
+
+def make_message(content):
+    return SimpleNamespace(content=content)
+
+
+class FakeStep:
+    """记录调用次数的 ChatAgent.step 替身"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, message):
+        self.calls += 1
+        return SimpleNamespace(msg=SimpleNamespace(content=f"reply-{self.calls}"))
+
+
+class FakeChatAgent:
+    """把每一轮写入 memory 的 ChatAgent 替身"""
+
+    def __init__(self):
+        self.system_message = SimpleNamespace(role_name="expert", content="system")
+        self.memory = []
+        self.step_fn = FakeStep()
+
+    def step(self, message):
+        response = self.step_fn(message)
+        self.memory.extend([("user", message.content), ("assistant", response.msg.content)])
+        return response
+
+    def update_memory(self, message, role):
+        self.memory.append((role, message.content))
+
+
+class PromptCacheTest(unittest.TestCase):
+
+    def test_whitespace_insensitive_hit(self):
+        cache, step = PromptCache(), FakeStep()
+        first = cache.step(step, make_message("  分析需求\n\n  预算3000  "), "kimi", {"temperature": 0.1})
+        second = cache.step(step, make_message("分析需求\n预算3000"), "kimi", {"temperature": 0.1})
+        self.assertEqual(step.calls, 1)
+        self.assertEqual(second.msg.content, first.msg.content)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_key_includes_model_and_params(self):
+        cache, step = PromptCache(), FakeStep()
+        cache.step(step, make_message("p"), "kimi", {"temperature": 0.1})
+        cache.step(step, make_message("p"), "kimi", {"temperature": 0.3})
+        cache.step(step, make_message("p"), "moonshot-v1-8k", {"temperature": 0.1})
+        cache.step(step, make_message("p"), "kimi", {"temperature": 0.1}, system_prompt="other")
+        self.assertEqual(step.calls, 4)
+
+    def test_opt_out_and_disabled(self):
+        cache, step = PromptCache(), FakeStep()
+        cache.step(step, make_message("p"), "kimi")
+        cache.step(step, make_message("p"), "kimi", use_cache=False)
+        self.assertEqual(step.calls, 2)
+        cache.enabled = False
+        cache.step(step, make_message("p"), "kimi")
+        self.assertEqual(step.calls, 3)
+        self.assertEqual(cache.stats()['bypassed'], 2)
+
+    def test_ttl_expiry(self):
+        cache, step = PromptCache(ttl=0.01), FakeStep()
+        cache.step(step, make_message("p"), "kimi")
+        time.sleep(0.02)
+        cache.step(step, make_message("p"), "kimi")
+        self.assertEqual(step.calls, 2)
+        self.assertEqual(cache.stats()['expired'], 1)
+
+    def test_disk_backend_persists(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "prompt_cache.sqlite3")
+            step = FakeStep()
+            backend = DiskPromptCacheBackend(path)
+            PromptCache(backend).step(step, make_message("p"), "kimi")
+            backend.close()
+
+            backend = DiskPromptCacheBackend(path)
+            response = PromptCache(backend).step(step, make_message("p"), "kimi")
+            backend.close()
+            self.assertEqual(step.calls, 1)
+            self.assertTrue(response.cached)
+            self.assertEqual(response.msg.content, "reply-1")
+
+    def test_cached_chat_agent_records_hits_in_memory(self):
+        agent = FakeChatAgent()
+        wrapper = CachedChatAgent(agent, "kimi", cache=PromptCache())
+        roles = SimpleNamespace(USER="user", ASSISTANT="assistant")
+        base_message = SimpleNamespace(make_assistant_message=lambda role_name, content: make_message(content))
+        with mock.patch.object(prompt_cache, "OpenAIBackendRole", roles), \
+                mock.patch.object(prompt_cache, "BaseMessage", base_message):
+            wrapper.step(make_message("p"))
+            response = wrapper.step(make_message("p"))
+        self.assertEqual(agent.step_fn.calls, 1)
+        self.assertTrue(response.cached)
+        self.assertEqual(agent.memory, [("user", "p"), ("assistant", "reply-1")] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
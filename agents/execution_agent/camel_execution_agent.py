@@ -24,6 +24,8 @@ try:
 except ImportError:
     pass
 
+from agents.caching.prompt_cache import CachedChatAgent
+
 logger = logging.getLogger(__name__)
 
 class ActionType(Enum):
@@ -62,14 +64,19 @@ class ExecutionAgent:
         }
         
         # 创建CAMEL Agent，使用Kimi模型
-        self.camel_agent = ChatAgent(
-            system_message=self._create_system_message(),
-            model=ModelFactory.create(
-                model_platform=ModelPlatformType.MOONSHOT,  # 使用Moonshot/Kimi
-                model_type="kimi-k2-0711-preview",                   # 使用kimi-k2-0711-preview模型
-                model_config_dict=model_config_dict
+        # step 经提示词缓存调用，重复的提示词直接返回缓存的回复
+        self.camel_agent = CachedChatAgent(
+            ChatAgent(
+                system_message=self._create_system_message(),
+                model=ModelFactory.create(
+                    model_platform=ModelPlatformType.MOONSHOT,  # 使用Moonshot/Kimi
+                    model_type="kimi-k2-0711-preview",                   # 使用kimi-k2-0711-preview模型
+                    model_config_dict=model_config_dict
+                ),
+                message_window_size=10
             ),
-            message_window_size=10
+            model="kimi-k2-0711-preview",
+            params=model_config_dict
         )
         
         # 注册可执行的动作
@@ -4,6 +4,7 @@ Weaviate Goods Agent
 
 import json
 import logging
+import os
 import re
 import requests
 from typing import Dict, List, Optional, Any, Tuple
@@ -29,6 +30,13 @@ except ImportError:
     CAMEL_AVAILABLE = False
     print("CAMEL framework not available")
 
+# 本地ANN索引（离线兜底检索）
+try:
+    from tools.rag.local_ann_index import LocalANNIndex
+    LOCAL_INDEX_AVAILABLE = True
+except ImportError:
+    LOCAL_INDEX_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -69,7 +77,9 @@ class AdvancedWeaviateAgent:
         weaviate_url: str = "http://localhost:8080",
         qwen_api_url: Optional[str] = None,
         rerank_api_url: Optional[str] = None,
-        use_ai: bool = True
+        use_ai: bool = True,
+        local_index_dir: Optional[str] = None,
+        embedding_service: Optional[Any] = None
     ):
         """
         初始化高级Weaviate代理
@@ -79,15 +89,20 @@ class AdvancedWeaviateAgent:
             qwen_api_url: Qwen API地址
             rerank_api_url: Qwen Rerank API地址
             use_ai: 是否使用AI模型
+            local_index_dir: 本地ANN索引目录，Weaviate不可用时使用，默认读取环境变量LOCAL_GOODS_INDEX_DIR
+            embedding_service: 查询向量化服务（需提供get_embedding），默认使用QwenEmbeddingService
         """
         self.weaviate_url = weaviate_url
         self.qwen_api_url = qwen_api_url
         self.rerank_api_url = rerank_api_url
         self.use_ai = use_ai
+        self.local_index_dir = local_index_dir or os.getenv("LOCAL_GOODS_INDEX_DIR", "local_goods_index")
+        self.embedding_service = embedding_service
         
         # 初始化客户端
         self.weaviate_client = None
         self.qwen_agent = None
+        self.local_index = None
         
         self._init_clients()
         
@@ -299,7 +314,7 @@ class AdvancedWeaviateAgent:
         if self.weaviate_client:
             return self._execute_weaviate_query(intent_result, current_category, limit)
         else:
-            return self._mock_weaviate_search(intent_result, limit)
+            return self._fallback_search(intent_result, current_category, limit)
     
     def _execute_weaviate_query(
         self,
@@ -362,7 +377,113 @@ class AdvancedWeaviateAgent:
             
         except Exception as e:
             logger.error(f"Weaviate query failed: {e}")
-            return self._mock_weaviate_search(intent_result, limit)
+            return self._fallback_search(intent_result, current_category, limit)
+    
+    def _fallback_search(
+        self,
+        intent_result: LLMIntentResult,
+        current_category: Optional[str] = None,
+        limit: int = 100
+    ) -> WeaviateSearchResult:
+        """Weaviate不可用时的兜底检索：优先使用本地ANN索引，其次返回模拟数据"""
+        
+        local_result = self._local_ann_search(intent_result, current_category, limit)
+        if local_result is not None:
+            return local_result
+        return self._mock_weaviate_search(intent_result, limit)
+    
+    def _get_local_index(self) -> Optional["LocalANNIndex"]:
+        """懒加载本地ANN索引"""
+        if self.local_index is None and LOCAL_INDEX_AVAILABLE and os.path.isdir(self.local_index_dir):
+            try:
+                self.local_index = LocalANNIndex.load(self.local_index_dir)
+                logger.info(f"Local ANN index loaded: {self.local_index_dir} ({len(self.local_index)} items)")
+            except Exception as e:
+                logger.warning(f"Failed to load local ANN index: {e}")
+        return self.local_index
+    
+    def _local_ann_search(
+        self,
+        intent_result: LLMIntentResult,
+        current_category: Optional[str] = None,
+        limit: int = 100
+    ) -> Optional[WeaviateSearchResult]:
+        """
+        使用本地ANN索引检索，索引不可用时返回None
+
+        查询向量先从本地嵌入缓存读取（不访问网络），未缓存时才在 DashScope 可达时调用 API；
+        两者都不可行时退化为基于同一索引的关键词匹配。
+        """
+        
+        index = self._get_local_index()
+        if index is None:
+            return None
+        
+        query = intent_result.positive_concepts
+        query_vector = None
+        source = None
+        try:
+            if self.embedding_service is None:
+                from tools.rag.qwen_embedding import QwenEmbeddingService
+                self.embedding_service = QwenEmbeddingService()
+            query_vector = self.embedding_service.get_cached_embedding(query)
+            if query_vector is not None:
+                source = "cache"
+            elif self.embedding_service.is_api_reachable():
+                query_vector = self.embedding_service.get_embedding(query)
+                source = "api"
+        except Exception as e:
+            logger.warning(f"Failed to embed query for local ANN search: {e}")
+            query_vector = None
+        
+        match = "vector" if query_vector is not None else "keyword"
+        logger.info(f"Local ANN search: {match} match, query embedding source: {source or 'unavailable'}")
+        
+        if match == "vector":
+            hits = index.search(
+                query_vector,
+                top_k=limit,
+                negative_keywords=intent_result.negative_keywords,
+                category=current_category
+            )
+        else:
+            hits = index.keyword_search(
+                intent_result.positive_concepts,
+                top_k=limit,
+                negative_keywords=intent_result.negative_keywords,
+                category=current_category
+            )
+        
+        products = []
+        for hit in hits:
+            item = hit["item"]
+            products.append({
+                "name": item.get("name", ""),
+                "description": item.get("detail", ""),
+                "price": item.get("price", ""),
+                "category": item.get("catagory", ""),
+                "goodId": item.get("goodId"),
+                "brandName": item.get("brandName", ""),
+                "picUrl": item.get("picUrl", ""),
+                "_additional": {
+                    "id": f"local-{item.get('goodId')}",
+                    "score": hit["score"]
+                }
+            })
+        
+        return WeaviateSearchResult(
+            products=products,
+            total_count=len(products),
+            search_params={
+                "concepts": intent_result.positive_concepts,
+                "negative_keywords": intent_result.negative_keywords,
+                "category": current_category,
+                "limit": limit,
+                "local_index": True,
+                "match": match,
+                "query_embedding": source
+            }
+        )
     
     def _mock_weaviate_search(
         self,
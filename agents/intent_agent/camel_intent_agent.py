@@ -23,6 +23,9 @@ try:
 except ImportError:
     pass
 
+from tools.rag.semantic_cache import SemanticCache
+from agents.caching.prompt_cache import CachedChatAgent
+
 logger = logging.getLogger(__name__)
 
 class IntentType(Enum):
@@ -43,8 +46,16 @@ class UserIntent:
 class IntentUnderstandingAgent:
     """基于CAMEL框架的用户意图理解Agent"""
     
-    def __init__(self, agent_id: str = "intent_agent"):
+    def __init__(self, agent_id: str = "intent_agent", semantic_cache: Optional[SemanticCache] = None):
+        """
+        Args:
+            agent_id: Agent ID
+            semantic_cache: 意图语义缓存，为None时基于 QwenEmbeddingService 创建（不可用时不启用缓存）
+        """
         self.agent_id = agent_id
+        self.semantic_cache = semantic_cache or self._create_semantic_cache()
+        # 最近一次理解/精化得到的意图，作为语义缓存的意图状态
+        self.current_intent: Optional[UserIntent] = None
         
         # 设置Kimi API环境变量（CAMEL框架通过环境变量读取）
         kimi_key = os.getenv("KIMI_API_KEY", "")
@@ -58,18 +69,32 @@ class IntentUnderstandingAgent:
         }
         
         # 创建CAMEL Agent，使用Kimi模型
-        self.camel_agent = ChatAgent(
-            system_message=self._create_system_message(),
-            model=ModelFactory.create(
-                model_platform=ModelPlatformType.MOONSHOT,  # 使用Moonshot/Kimi
-                model_type="kimi-k2-0711-preview",                   # 使用kimi-k2-0711-preview模型
-                model_config_dict=model_config_dict
+        # step 经提示词缓存调用，重复的提示词直接返回缓存的回复
+        self.camel_agent = CachedChatAgent(
+            ChatAgent(
+                system_message=self._create_system_message(),
+                model=ModelFactory.create(
+                    model_platform=ModelPlatformType.MOONSHOT,  # 使用Moonshot/Kimi
+                    model_type="kimi-k2-0711-preview",                   # 使用kimi-k2-0711-preview模型
+                    model_config_dict=model_config_dict
+                ),
+                message_window_size=10
             ),
-            message_window_size=10
+            model="kimi-k2-0711-preview",
+            params=model_config_dict
         )
         
         logger.info(f"IntentUnderstandingAgent {agent_id} initialized with CAMEL framework")
     
+    def _create_semantic_cache(self) -> Optional[SemanticCache]:
+        """创建默认的语义缓存"""
+        try:
+            from tools.rag.qwen_embedding import QwenEmbeddingService
+            return SemanticCache(QwenEmbeddingService())
+        except Exception as e:
+            logger.warning(f"语义缓存不可用，意图理解将始终调用模型: {e}")
+            return None
+    
     def _create_system_message(self) -> BaseMessage:
         """创建系统消息"""
         system_prompt = """
@@ -121,22 +146,37 @@ class IntentUnderstandingAgent:
     async def understand_intent(self, user_input: Dict) -> UserIntent:
         """理解用户意图的主方法"""
         try:
-            # 构造用户消息
-            user_message = self._construct_user_message(user_input)
-            
-            # 使用CAMEL Agent处理
-            response = self.camel_agent.step(user_message)
-            
-            # 解析响应
-            intent_data = self._parse_response(response.msg.content)
+            if self.semantic_cache is not None:
+                # 语义相近的输入（输入类型、附加信息与当前意图状态都相同时）直接复用已解析的意图
+                computed = []
+
+                async def compute():
+                    computed.append(True)
+                    return await self._analyze(user_input)
+
+                intent_data = await self.semantic_cache.get_or_compute(
+                    user_input.get("content", ""),
+                    compute,
+                    context=self._cache_context(user_input),
+                    cacheable=lambda data: data.get("intent_type", "unknown") != "unknown"
+                )
+                if not computed:
+                    # 命中时没有调用模型，仍把这一轮写入对话记忆
+                    self.camel_agent.record_turn(
+                        self._construct_user_message(user_input), json.dumps(intent_data, ensure_ascii=False)
+                    )
+            else:
+                intent_data = await self._analyze(user_input)
             
-            return UserIntent(
+            intent = UserIntent(
                 intent_type=IntentType(intent_data.get("intent_type", "unknown")),
                 confidence=intent_data.get("confidence", 0.0),
                 entities=intent_data.get("entities", {}),
                 user_requirements=intent_data.get("user_requirements", {}),
                 context=intent_data.get("context", {})
             )
+            self.current_intent = intent
+            return intent
             
         except Exception as e:
             logger.error(f"Intent understanding failed: {e}")
@@ -148,6 +188,30 @@ class IntentUnderstandingAgent:
                 context={"error": str(e)}
             )
     
+    def _cache_context(self, user_input: Dict) -> Dict:
+        """语义缓存的意图状态：输入类型、附加信息与当前已理解的意图"""
+        current = self.current_intent
+        return {
+            "type": user_input.get("type", "text"),
+            "metadata": user_input.get("metadata", {}),
+            "intent": {
+                "intent_type": current.intent_type.value,
+                "entities": current.entities,
+                "user_requirements": current.user_requirements
+            } if current else None
+        }
+    
+    async def _analyze(self, user_input: Dict) -> Dict:
+        """调用模型分析用户输入，返回解析后的意图数据"""
+        # 构造用户消息
+        user_message = self._construct_user_message(user_input)
+        
+        # 使用CAMEL Agent处理（提示词缓存命中时由 CachedChatAgent 写入记忆）
+        response = self.camel_agent.step(user_message)
+        
+        # 解析响应
+        return self._parse_response(response.msg.content)
+    
     def _construct_user_message(self, user_input: Dict) -> BaseMessage:
         """构造用户消息"""
         content_type = user_input.get("type", "text")
@@ -216,23 +280,26 @@ class IntentUnderstandingAgent:
             """
         )
         
-        response = self.camel_agent.step(refinement_message)
+        # 精化依赖对话记忆中的上下文，不走提示词缓存
+        response = self.camel_agent.step(refinement_message, use_cache=False)
         refined_data = self._parse_response(response.msg.content)
         
-        return UserIntent(
+        self.current_intent = UserIntent(
             intent_type=IntentType(refined_data.get("intent_type", initial_intent.intent_type.value)),
             confidence=refined_data.get("confidence", initial_intent.confidence),
             entities=refined_data.get("entities", initial_intent.entities),
             user_requirements=refined_data.get("user_requirements", initial_intent.user_requirements),
             context=refined_data.get("context", initial_intent.context)
         )
+        return self.current_intent
     
     def get_conversation_context(self) -> Dict:
         """获取对话上下文"""
         return {
             "agent_id": self.agent_id,
             "message_history": len(self.camel_agent.memory.messages),
-            "last_response": self.camel_agent.memory.messages[-1].content if self.camel_agent.memory.messages else None
+            "last_response": self.camel_agent.memory.messages[-1].content if self.camel_agent.memory.messages else None,
+            "semantic_cache": self.semantic_cache.stats() if self.semantic_cache else None
         }
 
 # 对外接口
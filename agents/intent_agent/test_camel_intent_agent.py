@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件
+
+用于测试意图理解的语义缓存：附加信息或当前意图状态不同时不命中，命中时仍写入对话记忆。
+模型以内存实现替代。
+"""
+
+import json
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import agents.intent_agent.camel_intent_agent as intent_module
+from agents.caching import prompt_cache
+from agents.intent_agent.camel_intent_agent import IntentType, IntentUnderstandingAgent, UserIntent
+from tools.rag.semantic_cache import SemanticCache
+
+
+class FakeEmbeddingService:
+    """相同文本返回相同向量的嵌入"""
+
+    async def aget_embedding(self, text):
+        return [float(ord(ch)) for ch in (text * 8)[:8]]
+
+
+class FakeChatAgent:
+    """把每一轮写入 memory.messages 的 ChatAgent"""
+
+    def __init__(self, system_message, **kwargs):
+        self.system_message = system_message
+        self.memory = SimpleNamespace(messages=[])
+        self.calls = 0
+
+    def step(self, message):
+        self.calls += 1
+        reply = SimpleNamespace(content=json.dumps({
+            "intent_type": "product_search",
+            "confidence": 0.9,
+            "entities": {"product_category": "油烟机"}
+        }, ensure_ascii=False))
+        self.memory.messages.extend([message, reply])
+        return SimpleNamespace(msg=reply)
+
+    def update_memory(self, message, role):
+        self.memory.messages.append(message)
+
+
+class TestIntentSemanticCache(unittest.IsolatedAsyncioTestCase):
+    """意图语义缓存测试"""
+
+    def setUp(self):
+        """测试前准备"""
+        patches = [
+            mock.patch.object(intent_module, "ChatAgent", FakeChatAgent),
+            mock.patch.object(intent_module, "ModelFactory"),
+            mock.patch.object(prompt_cache, "get_default_prompt_cache", lambda: prompt_cache.PromptCache(enabled=False)),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.cache = SemanticCache(FakeEmbeddingService(), threshold=0.99, ttl=60)
+        self.agent = IntentUnderstandingAgent(semantic_cache=self.cache)
+        self.chat_agent = self.agent.camel_agent.agent
+        self.user_input = {"type": "text", "content": "想买个油烟机", "metadata": {"source": "chat"}}
+
+    async def test_hit_requires_same_state_and_is_remembered(self):
+        """测试相同意图状态下命中且写入记忆，不同状态或附加信息时不命中"""
+        await self.agent.understand_intent(self.user_input)
+        # 第一次理解后当前意图状态已变化
+        await self.agent.understand_intent(self.user_input)
+        self.assertEqual(self.chat_agent.calls, 2)
+
+        intent = await self.agent.understand_intent(self.user_input)
+        self.assertEqual(intent.intent_type, IntentType.PRODUCT_SEARCH)
+        self.assertEqual(self.chat_agent.calls, 2)
+        self.assertEqual(len(self.chat_agent.memory.messages), 6)
+
+        self.agent.current_intent = UserIntent(IntentType.COMPARISON, 0.8, {"product_category": "冰箱"}, {}, {})
+        await self.agent.understand_intent(self.user_input)
+        self.assertEqual(self.chat_agent.calls, 3)
+
+        await self.agent.understand_intent({**self.user_input, "metadata": {"source": "voice"}})
+        self.assertEqual(self.chat_agent.calls, 4)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -28,6 +28,8 @@ except ImportError:
     CAMEL_AVAILABLE = False
     print("CAMEL framework not available, using simple implementation")
 
+from tools.rag.conversation_compactor import ConversationCompactor, format_turn
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -54,17 +56,20 @@ class FinalIntentResult:
 class EnhancedIntentRefiner:
     """增强版意图精化代理"""
     
-    def __init__(self, use_ai: bool = True, model_type: str = "kimi-k2-0711-preview"):
+    def __init__(self, use_ai: bool = True, model_type: str = "kimi-k2-0711-preview",
+                 compactor: Optional[ConversationCompactor] = None):
         """
         初始化增强版意图精化代理
         
         Args:
             use_ai: 是否使用AI模型
             model_type: AI模型类型
+            compactor: 对话压缩器，历史超过预算时较早轮次以摘要代替，为None时使用默认配置
         """
         self.use_ai = use_ai
         self.model_type = model_type
         self.agent = None
+        self.compactor = compactor or ConversationCompactor()
         
         if use_ai and CAMEL_AVAILABLE:
             self._init_camel_agent()
@@ -98,7 +103,7 @@ class EnhancedIntentRefiner:
     
     def _get_enhanced_system_prompt(self) -> str:
         """获取增强版系统提示词"""
-        return """你是一个电商意图分析专家。你的任务是分析用户的最新对话，并根据【已有意图】和【完整对话历史】来更新用户的购买需求。
+        return """你是一个电商意图分析专家。你的任务是分析用户的最新对话，并根据【已有意图】和【对话历史】（较早部分可能以摘要形式给出）来更新用户的购买需求。
 
 核心规则：
 1. **保持标题稳定**：不要更改【已有意图】中的 `title` 字段，除非用户明确表示要买完全不同的东西（例如从"买电脑"变成"买手机"）。
@@ -146,7 +151,7 @@ class EnhancedIntentRefiner:
             # 第2步：调用LLM进行增量分析
             if self.use_ai and self.agent:
                 analysis = await self._ai_incremental_analysis(
-                    existing_intent, conversation_history, latest_message
+                    existing_intent, conversation_history, latest_message, session_id
                 )
             else:
                 analysis = self._rule_based_incremental_analysis(
@@ -182,16 +187,25 @@ class EnhancedIntentRefiner:
         self,
         existing_intent: Dict[str, Any],
         conversation_history: List[Dict[str, str]],
-        latest_message: str
+        latest_message: str,
+        session_id: str = "default"
     ) -> IncrementalAnalysis:
         """使用AI进行增量分析"""
         
+        # 较早的轮次压缩为摘要，只携带最近轮次的原文
+        summary, recent_turns = await self.compactor.compact(
+            session_id, [format_turn(turn) for turn in conversation_history]
+        )
+        history = "\n".join(recent_turns)
+        if summary:
+            history = f"（较早对话摘要）{summary}\n{history}"
+        
         # 构建精确的Prompt
         prompt = f"""【已有意图】:
-{json.dumps(existing_intent, ensure_ascii=False, indent=2)}
+{json.dumps(existing_intent, ensure_ascii=False)}
 
-【完整对话历史】:
-{json.dumps(conversation_history, ensure_ascii=False, indent=2)}
+【对话历史】:
+{history}
 
 【最新的用户对话】:
 "{latest_message}"
@@ -0,0 +1,120 @@
+"""
+AgentMessage 编解码基准
+对比原有的 json.dumps(asdict(message), indent=2) 与 codec 模块二进制编码的耗时与体积，
+消息取自编排器的典型载荷（意图分析请求、推荐结果、心跳）。
+
+运行：
+    python -m agents.messaging.benchmark_codec --iterations 20000
+"""
+
+import argparse
+import json
+import time
+import uuid
+from dataclasses import asdict
+from typing import Callable, Dict, List
+
+from agents.messaging.codec import decode_message, encode_message
+from agents.messaging.message_broker import AgentMessage, MessagePriority, MessageType
+
+
+def sample_messages() -> Dict[str, AgentMessage]:
+    """编排器的典型消息"""
+    def make(message_type, priority, payload, correlation_id=None, ttl=None):
+        return AgentMessage(
+            message_id=str(uuid.uuid4()),
+            from_agent="orchestrator",
+            to_agent="intent_agent",
+            message_type=message_type,
+            priority=priority,
+            payload=payload,
+            correlation_id=correlation_id,
+            ttl=ttl
+        )
+
+    intent_request = make(MessageType.REQUEST, MessagePriority.HIGH, {
+        "task_type": "intent_analysis",
+        "session_id": str(uuid.uuid4()),
+        "user_input": {
+            "type": "text",
+            "content": "我家新房装修，厨房8平米，预算3000元左右，希望噪音小一些，想买个油烟机",
+            "metadata": {"source": "chat"}
+        }
+    }, correlation_id=str(uuid.uuid4()), ttl=30.0)
+
+    recommendation = make(MessageType.RESPONSE, MessagePriority.NORMAL, {
+        "status": "success",
+        "intent_type": "product_search",
+        "confidence": 0.92,
+        "products": [
+            {
+                "goodId": f"{100000 + i}",
+                "title": f"方太 EMD{i}A 顶侧双吸油烟机 大吸力 静音",
+                "price": 2999.0 + i * 100,
+                "score": round(0.95 - i * 0.03, 3),
+                "attributes": {"suction": "23m³/min", "noise": "52dB", "style": "现代简约"}
+            }
+            for i in range(10)
+        ]
+    }, correlation_id=str(uuid.uuid4()))
+
+    heartbeat = make(MessageType.HEARTBEAT, MessagePriority.LOW, {"status": "alive"})
+
+    return {"intent_request": intent_request, "recommendation": recommendation, "heartbeat": heartbeat}
+
+
+def json_encode(message: AgentMessage) -> bytes:
+    """原有路径：asdict + 缩进 JSON"""
+    return json.dumps(asdict(message), ensure_ascii=False, indent=2, default=str).encode("utf-8")
+
+
+def json_decode(data: bytes) -> AgentMessage:
+    fields = json.loads(data)
+    fields["message_type"] = MessageType(fields["message_type"].split(".")[-1].lower())
+    fields["priority"] = MessagePriority[fields["priority"].split(".")[-1]]
+    return AgentMessage(**fields)
+
+
+def _time_per_call(func: Callable, arg, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(arg)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def run_benchmark(iterations: int = 10000) -> List[Dict]:
+    """
+    运行基准
+
+    Args:
+        iterations: 每项测量的重复次数
+
+    Returns:
+        每条消息、每种编码一行的结果（体积字节数、编码/解码微秒数）
+    """
+    results = []
+    for name, message in sample_messages().items():
+        for codec_name, encode, decode in (
+            ("json_indent", json_encode, json_decode),
+            ("binary", encode_message, decode_message),
+        ):
+            data = encode(message)
+            results.append({
+                "message": name,
+                "codec": codec_name,
+                "bytes": len(data),
+                "encode_us": _time_per_call(encode, message, iterations),
+                "decode_us": _time_per_call(decode, data, iterations)
+            })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="AgentMessage 编解码基准")
+    parser.add_argument("--iterations", type=int, default=10000)
+    args = parser.parse_args()
+
+    print(f"{'message':<16}{'codec':<13}{'bytes':>8}{'encode_us':>12}{'decode_us':>12}")
+    for row in run_benchmark(args.iterations):
+        print(f"{row['message']:<16}{row['codec']:<13}{row['bytes']:>8}"
+              f"{row['encode_us']:>12.2f}{row['decode_us']:>12.2f}")
@@ -0,0 +1,133 @@
+"""
+AgentMessage 的二进制编解码
+定长 struct 头部（类型、优先级、时间戳、TTL、重试次数、各字符串长度）+ UTF-8 字符串 + payload；
+payload 优先用 msgpack 编码，未安装 msgpack 时退回紧凑 JSON（头部标志位记录所用编码）。
+"""
+
+import json
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from agents.messaging.message_broker import AgentMessage, MessagePriority, MessageType
+
+CODEC_VERSION = 1
+
+# 版本, 标志位, 消息类型, 优先级, 时间戳, TTL, 重试次数, 最大重试次数, 4 个字符串的字节长度
+_HEADER = struct.Struct(">BBBBddHHHHHH")
+
+_FLAG_MSGPACK = 0x01
+_FLAG_CORRELATION = 0x02
+_FLAG_TTL = 0x04
+
+_MESSAGE_TYPES = tuple(MessageType)
+_MESSAGE_TYPE_CODES = {message_type: code for code, message_type in enumerate(_MESSAGE_TYPES)}
+_PRIORITIES = {priority.value: priority for priority in MessagePriority}
+
+
+def _encode_payload(payload: Dict[str, Any]) -> Tuple[int, bytes]:
+    if msgpack is not None:
+        return _FLAG_MSGPACK, msgpack.packb(payload, use_bin_type=True, default=str)
+    return 0, json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def _decode_payload(flags: int, data: bytes) -> Dict[str, Any]:
+    if flags & _FLAG_MSGPACK:
+        if msgpack is None:
+            raise ValueError("Message payload is msgpack encoded but msgpack is not installed")
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    return json.loads(bytes(data))
+
+
+def encode_message(message: AgentMessage) -> bytes:
+    """
+    把消息编码为二进制
+
+    Args:
+        message: 消息
+
+    Returns:
+        bytes: 编码结果
+    """
+    flags, payload = _encode_payload(message.payload)
+    message_id = message.message_id.encode("utf-8")
+    from_agent = message.from_agent.encode("utf-8")
+    to_agent = message.to_agent.encode("utf-8")
+    correlation_id = b""
+    if message.correlation_id is not None:
+        flags |= _FLAG_CORRELATION
+        correlation_id = message.correlation_id.encode("utf-8")
+    if message.ttl is not None:
+        flags |= _FLAG_TTL
+    header = _HEADER.pack(
+        CODEC_VERSION, flags,
+        _MESSAGE_TYPE_CODES[message.message_type], message.priority.value,
+        message.timestamp, message.ttl or 0.0,
+        message.retry_count, message.max_retries,
+        len(message_id), len(from_agent), len(to_agent), len(correlation_id)
+    )
+    return b"".join((header, message_id, from_agent, to_agent, correlation_id, payload))
+
+
+def _unpack_header(data: bytes):
+    fields = _HEADER.unpack_from(data)
+    if fields[0] != CODEC_VERSION:
+        raise ValueError(f"Unsupported message codec version: {fields[0]}")
+    return fields
+
+
+def decode_message(data: bytes) -> AgentMessage:
+    """
+    解码 encode_message 的输出
+
+    Args:
+        data: 编码结果
+
+    Returns:
+        AgentMessage: 消息
+    """
+    (_, flags, type_code, priority, timestamp, ttl, retry_count, max_retries,
+     id_len, from_len, to_len, correlation_len) = _unpack_header(data)
+    view = memoryview(data)
+    offset = _HEADER.size
+    strings = []
+    for length in (id_len, from_len, to_len, correlation_len):
+        strings.append(str(view[offset:offset + length], "utf-8"))
+        offset += length
+    message_id, from_agent, to_agent, correlation_id = strings
+    return AgentMessage(
+        message_id=message_id,
+        from_agent=from_agent,
+        to_agent=to_agent,
+        message_type=_MESSAGE_TYPES[type_code],
+        priority=_PRIORITIES[priority],
+        payload=_decode_payload(flags, view[offset:]),
+        correlation_id=correlation_id if flags & _FLAG_CORRELATION else None,
+        timestamp=timestamp,
+        ttl=ttl if flags & _FLAG_TTL else None,
+        retry_count=retry_count,
+        max_retries=max_retries
+    )
+
+
+def peek_routing(data: bytes) -> Tuple[MessageType, str, Optional[str]]:
+    """
+    只解码路由所需的字段，不解码 payload
+
+    Args:
+        data: 编码结果
+
+    Returns:
+        (消息类型, 目标Agent, correlation_id)
+    """
+    (_, flags, type_code, _, _, _, _, _,
+     id_len, from_len, to_len, correlation_len) = _unpack_header(data)
+    offset = _HEADER.size + id_len + from_len
+    to_agent = str(data[offset:offset + to_len], "utf-8")
+    offset += to_len
+    correlation_id = str(data[offset:offset + correlation_len], "utf-8") if flags & _FLAG_CORRELATION else None
+    return _MESSAGE_TYPES[type_code], to_agent, correlation_id
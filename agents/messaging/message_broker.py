@@ -1,18 +1,27 @@
 """
 Agent间消息传递机制
 提供标准化的Agent通信协议和消息队列系统
+
+每个Agent拥有一个按优先级出队的消息队列和一组消费者任务：
+send_message 入队即返回，消费者在后台调用处理器，URGENT 消息优先于 NORMAL 消息处理。
+处理器按 agent_id -> message_type 索引，投递与分发均为 O(1) 且不加锁。
+队列有容量上限，队满时按溢出策略（阻塞/丢弃最早/丢弃最低优先级/拒绝）处理，过期消息在出队时丢弃。
+目标Agent不在本进程时，消息经可插拔的传输层（默认仅进程内，可选 socket_transport）转发到其他进程。
 """
 
 import asyncio
+import concurrent.futures
+import heapq
+import itertools
 import json
 import logging
-from typing import Dict, List, Optional, Any, Callable
+import os
+from typing import Dict, List, Optional, Any, Awaitable, Callable
 from dataclasses import dataclass, asdict
 from enum import Enum
 import time
 import uuid
 from collections import deque
-import threading
 
 logger = logging.getLogger(__name__)
 
@@ -29,9 +38,15 @@ class MessagePriority(Enum):
     HIGH = 3
     URGENT = 4
 
-@dataclass
+class OverflowPolicy(Enum):
+    BLOCK = "block"  # 发送方等待队列空出位置
+    DROP_OLDEST = "drop_oldest"  # 丢弃最早入队的消息
+    DROP_LOWEST_PRIORITY = "drop_lowest_priority"  # 丢弃最后才会被处理的消息（新消息优先级不高于它时丢弃新消息）
+    REJECT = "reject"  # 拒绝新消息
+
+@dataclass(slots=True)
 class AgentMessage:
-    """Agent间通信消息格式"""
+    """Agent间通信消息格式（使用 __slots__，跨进程传输时用 codec 模块编码为二进制）"""
     message_id: str
     from_agent: str
     to_agent: str
@@ -56,39 +71,203 @@ class MessageHandler:
     handler_func: Callable
     agent_id: str
 
+class Mailbox(asyncio.PriorityQueue):
+    """Agent的消息队列，条目为 (-priority, seq, message)，支持溢出时淘汰已入队的消息"""
+    
+    def peek_last(self):
+        """最后才会被处理的条目（优先级最低且最晚入队）"""
+        return max(self._queue)
+    
+    def evict_oldest(self) -> AgentMessage:
+        """淘汰最早入队的消息"""
+        return self._evict(min(self._queue, key=lambda entry: entry[1]))
+    
+    def evict_last(self) -> AgentMessage:
+        """淘汰最后才会被处理的消息"""
+        return self._evict(max(self._queue))
+    
+    def _evict(self, entry) -> AgentMessage:
+        self._queue.remove(entry)
+        heapq.heapify(self._queue)
+        self.task_done()
+        return entry[2]
+
+def _new_queue_metrics() -> Dict[str, int]:
+    return {
+        'enqueued': 0, 'processed': 0, 'expired': 0, 'blocked': 0,
+        'dropped': 0, 'rejected': 0, 'inbox_dropped': 0, 'max_depth': 0
+    }
+
+class MessageTransport:
+    """
+    传输层接口，负责把消息送到其他进程中的Agent
+
+    start 时传入 deliver 协程，传输层收到发往本进程Agent的消息时调用它。
+    """
+    
+    async def start(self, deliver: Callable[[AgentMessage], Awaitable[bool]]):
+        """启动传输层"""
+    
+    def register(self, agent_id: str):
+        """声明本进程托管该Agent"""
+    
+    def unregister(self, agent_id: str):
+        """取消声明"""
+    
+    async def send(self, message: AgentMessage) -> bool:
+        """发送给其他进程中的Agent，返回是否发出"""
+        return False
+    
+    async def close(self):
+        """关闭传输层"""
+
+class InMemoryTransport(MessageTransport):
+    """默认传输层：只支持进程内通信，发往本进程以外Agent的消息一律失败"""
+
+def create_transport() -> MessageTransport:
+    """
+    按环境变量创建传输层
+
+    环境变量:
+        MESSAGE_BROKER_TRANSPORT: memory（默认）或 socket
+        MESSAGE_BROKER_HOST / MESSAGE_BROKER_PORT: socket 传输层连接的 BrokerServer 地址（默认 127.0.0.1:8765）
+    """
+    if os.getenv("MESSAGE_BROKER_TRANSPORT", "memory").lower() == "socket":
+        from agents.messaging.socket_transport import SocketTransport
+        return SocketTransport(
+            os.getenv("MESSAGE_BROKER_HOST", "127.0.0.1"), int(os.getenv("MESSAGE_BROKER_PORT", 8765))
+        )
+    return InMemoryTransport()
+
 class MessageBroker:
-    """消息代理，负责Agent间消息路由和传递"""
+    """
+    消息代理，负责Agent间消息路由和传递
+
+    所有状态只在事件循环线程中访问，不使用锁；其他线程中的生产者通过 send_message_threadsafe 投递。
+    """
     
-    def __init__(self):
-        self.message_queues = {}  # agent_id -> deque of messages
-        self.handlers = {}  # agent_id -> list of handlers
+    def __init__(
+        self,
+        consumers_per_agent: Optional[int] = None,
+        queue_capacity: Optional[int] = None,
+        overflow_policy: Optional[OverflowPolicy] = None,
+        block_timeout: Optional[float] = None,
+        transport: Optional[MessageTransport] = None
+    ):
+        """
+        初始化消息代理
+
+        Args:
+            consumers_per_agent: 每个Agent的默认消费者任务数，为None时读取环境变量MESSAGE_BROKER_CONSUMERS（默认2）
+            queue_capacity: 每个Agent的默认队列容量，为None时读取环境变量MESSAGE_BROKER_QUEUE_CAPACITY（默认1000）
+            overflow_policy: 默认溢出策略，为None时读取环境变量MESSAGE_BROKER_OVERFLOW_POLICY（默认block）
+            block_timeout: BLOCK 策略下发送方最多等待的秒数，超时视为拒绝，为None时一直等待
+            transport: 跨进程传输层，为None时使用 InMemoryTransport
+        """
+        self.consumers_per_agent = consumers_per_agent or int(os.getenv("MESSAGE_BROKER_CONSUMERS", 2))
+        self.queue_capacity = queue_capacity or int(os.getenv("MESSAGE_BROKER_QUEUE_CAPACITY", 1000))
+        self.overflow_policy = overflow_policy or OverflowPolicy(os.getenv("MESSAGE_BROKER_OVERFLOW_POLICY", "block"))
+        self.block_timeout = block_timeout
+        self.message_queues = {}  # agent_id -> Mailbox
+        self.inboxes = {}  # agent_id -> deque of messages without a matching handler
+        self.queue_capacities = {}  # agent_id -> capacity
+        self.overflow_policies = {}  # agent_id -> OverflowPolicy
+        self.queue_metrics = {}  # agent_id -> counters
+        self.handlers = {}  # agent_id -> message_type -> list of handlers
         self.subscribers = {}  # message_type -> list of agent_ids
         self.message_history = deque(maxlen=1000)  # 保留最近1000条消息
         self.active_agents = set()
-        self.lock = threading.Lock()
+        self.consumer_counts = {}  # agent_id -> consumer pool size
+        self.consumers = {}  # agent_id -> list of consumer tasks
+        self._sequence = itertools.count()  # 同优先级内保持先进先出
+        self._loop: Optional[asyncio.AbstractEventLoop] = None  # 消费者所在的事件循环
+        self.transport = transport or InMemoryTransport()
+        self._transport_started = False
         
         logger.info("MessageBroker initialized")
     
-    def register_agent(self, agent_id: str):
-        """注册Agent"""
-        with self.lock:
-            if agent_id not in self.message_queues:
-                self.message_queues[agent_id] = deque()
-            if agent_id not in self.handlers:
-                self.handlers[agent_id] = []
-            self.active_agents.add(agent_id)
+    def register_agent(
+        self,
+        agent_id: str,
+        consumers: Optional[int] = None,
+        capacity: Optional[int] = None,
+        overflow_policy: Optional[OverflowPolicy] = None
+    ):
+        """
+        注册Agent
+
+        Args:
+            agent_id: Agent ID
+            consumers: 该Agent的消费者任务数，为None时使用默认值；处理器较慢的Agent可调大
+            capacity: 该Agent的队列容量，为None时使用默认值（只在队列创建时生效）
+            overflow_policy: 该Agent的溢出策略，为None时使用默认值
+        """
+        if capacity is not None or agent_id not in self.queue_capacities:
+            self.queue_capacities[agent_id] = capacity or self.queue_capacity
+        if overflow_policy is not None or agent_id not in self.overflow_policies:
+            self.overflow_policies[agent_id] = overflow_policy or self.overflow_policy
+        if agent_id not in self.message_queues:
+            self._reset_queue(agent_id)
+        self.queue_metrics.setdefault(agent_id, _new_queue_metrics())
+        self.handlers.setdefault(agent_id, {})
+        if consumers is not None or agent_id not in self.consumer_counts:
+            self.consumer_counts[agent_id] = consumers or self.consumers_per_agent
+        self.active_agents.add(agent_id)
+        self.transport.register(agent_id)
+        
+        # 在事件循环中注册时立即启动消费者，否则在首次发送时启动
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            self._ensure_consumers(agent_id)
         
         logger.info(f"Agent {agent_id} registered with MessageBroker")
     
     def unregister_agent(self, agent_id: str):
         """注销Agent"""
-        with self.lock:
-            self.active_agents.discard(agent_id)
-            if agent_id in self.message_queues:
-                self.message_queues[agent_id].clear()
+        self.active_agents.discard(agent_id)
+        self.transport.unregister(agent_id)
+        for task in self.consumers.pop(agent_id, []):
+            task.cancel()
+        if agent_id in self.message_queues:
+            self._reset_queue(agent_id)
         
         logger.info(f"Agent {agent_id} unregistered from MessageBroker")
     
+    def _reset_queue(self, agent_id: str):
+        """创建（或清空后重建）Agent的消息队列与收件箱"""
+        capacity = self.queue_capacities[agent_id]
+        self.message_queues[agent_id] = Mailbox(maxsize=capacity)
+        self.inboxes[agent_id] = deque(maxlen=capacity)
+    
+    def _ensure_consumers(self, agent_id: str):
+        """按配置的数量启动Agent的消费者任务（需在事件循环中调用）"""
+        self._loop = asyncio.get_running_loop()
+        tasks = [task for task in self.consumers.get(agent_id, []) if not task.done()]
+        for _ in range(self.consumer_counts.get(agent_id, self.consumers_per_agent) - len(tasks)):
+            tasks.append(asyncio.create_task(self._consume(agent_id)))
+        self.consumers[agent_id] = tasks
+    
+    async def _consume(self, agent_id: str):
+        """消费者：按优先级取出消息并调用处理器"""
+        queue = self.message_queues[agent_id]
+        metrics = self.queue_metrics[agent_id]
+        while True:
+            _, _, message = await queue.get()
+            try:
+                if self._is_expired(message):
+                    metrics['expired'] += 1
+                    logger.warning(f"Message {message.message_id} expired in queue of {agent_id}")
+                    continue
+                await self._process_message(message)
+                metrics['processed'] += 1
+            except Exception as e:
+                logger.error(f"Failed to process message {message.message_id}: {e}")
+            finally:
+                queue.task_done()
+    
     def register_handler(self, agent_id: str, message_type: MessageType, handler_func: Callable):
         """注册消息处理器"""
         handler = MessageHandler(
@@ -98,25 +277,20 @@ class MessageBroker:
             agent_id=agent_id
         )
         
-        with self.lock:
-            if agent_id not in self.handlers:
-                self.handlers[agent_id] = []
-            self.handlers[agent_id].append(handler)
+        self.handlers.setdefault(agent_id, {}).setdefault(message_type, []).append(handler)
         
         logger.info(f"Handler registered for {agent_id}: {message_type.value}")
     
     def subscribe(self, agent_id: str, message_type: MessageType):
         """订阅特定类型的消息"""
-        with self.lock:
-            if message_type not in self.subscribers:
-                self.subscribers[message_type] = []
-            if agent_id not in self.subscribers[message_type]:
-                self.subscribers[message_type].append(agent_id)
+        subscribers = self.subscribers.setdefault(message_type, [])
+        if agent_id not in subscribers:
+            subscribers.append(agent_id)
         
         logger.info(f"Agent {agent_id} subscribed to {message_type.value}")
     
     async def send_message(self, message: AgentMessage) -> bool:
-        """发送消息"""
+        """发送消息，入队后立即返回，不等待处理器执行"""
         try:
             # 验证消息
             if not self._validate_message(message):
@@ -124,30 +298,116 @@ class MessageBroker:
                 return False
             
             # 检查TTL
-            if message.ttl and (time.time() - message.timestamp) > message.ttl:
+            if self._is_expired(message):
                 logger.warning(f"Message {message.message_id} expired")
                 return False
             
-            # 检查目标Agent是否存在
+            # 目标Agent不在本进程时交给传输层
             if message.to_agent not in self.active_agents:
-                logger.error(f"Target agent {message.to_agent} not found")
-                return False
-            
-            # 添加到消息队列
-            with self.lock:
-                self.message_queues[message.to_agent].append(message)
+                if not await self.transport.send(message):
+                    logger.error(f"Target agent {message.to_agent} not found")
+                    return False
                 self.message_history.append(message)
+                logger.debug(f"Message {message.message_id} forwarded to {message.to_agent}")
+                return True
             
-            # 触发消息处理
-            await self._process_message(message)
-            
-            logger.debug(f"Message {message.message_id} sent to {message.to_agent}")
-            return True
+            return await self.deliver(message)
             
         except Exception as e:
             logger.error(f"Failed to send message {message.message_id}: {e}")
             return False
     
+    async def deliver(self, message: AgentMessage) -> bool:
+        """投递到本进程Agent的消息队列，由消费者异步处理（传输层收到的消息也经此投递）"""
+        if message.to_agent not in self.active_agents:
+            logger.warning(f"Agent {message.to_agent} is not hosted here, message {message.message_id} dropped")
+            return False
+        if self._is_expired(message):
+            self.queue_metrics[message.to_agent]['expired'] += 1
+            return False
+        self._ensure_consumers(message.to_agent)
+        if not await self._enqueue(message):
+            return False
+        self.message_history.append(message)
+        
+        logger.debug(f"Message {message.message_id} queued for {message.to_agent}")
+        return True
+    
+    async def start(self):
+        """启动传输层（可重复调用）；使用 InMemoryTransport 时无需调用"""
+        if not self._transport_started:
+            await self.transport.start(self.deliver)
+            self._transport_started = True
+    
+    async def close(self):
+        """关闭传输层并停止所有消费者"""
+        for agent_id in list(self.consumers):
+            for task in self.consumers.pop(agent_id):
+                task.cancel()
+        if self._transport_started:
+            await self.transport.close()
+            self._transport_started = False
+    
+    async def _enqueue(self, message: AgentMessage) -> bool:
+        """按溢出策略入队，返回新消息是否入队"""
+        agent_id = message.to_agent
+        queue = self.message_queues[agent_id]
+        metrics = self.queue_metrics[agent_id]
+        entry = (-message.priority.value, next(self._sequence), message)
+        
+        if queue.full():
+            policy = self.overflow_policies[agent_id]
+            if policy is OverflowPolicy.REJECT:
+                metrics['rejected'] += 1
+                logger.warning(f"Queue of {agent_id} is full, message {message.message_id} rejected")
+                return False
+            if policy is OverflowPolicy.BLOCK:
+                metrics['blocked'] += 1
+                try:
+                    await asyncio.wait_for(queue.put(entry), timeout=self.block_timeout)
+                except asyncio.TimeoutError:
+                    metrics['rejected'] += 1
+                    logger.warning(f"Queue of {agent_id} stayed full, message {message.message_id} rejected")
+                    return False
+                entry = None
+            elif policy is OverflowPolicy.DROP_OLDEST:
+                dropped = queue.evict_oldest()
+                metrics['dropped'] += 1
+                logger.warning(f"Queue of {agent_id} is full, dropped oldest message {dropped.message_id}")
+            elif entry > queue.peek_last():
+                # 新消息本身就是最后才会被处理的
+                metrics['dropped'] += 1
+                logger.warning(f"Queue of {agent_id} is full, dropped message {message.message_id}")
+                return False
+            else:
+                dropped = queue.evict_last()
+                metrics['dropped'] += 1
+                logger.warning(f"Queue of {agent_id} is full, dropped lowest priority message {dropped.message_id}")
+        
+        if entry is not None:
+            queue.put_nowait(entry)
+        metrics['enqueued'] += 1
+        metrics['max_depth'] = max(metrics['max_depth'], queue.qsize())
+        return True
+    
+    @staticmethod
+    def _is_expired(message: AgentMessage) -> bool:
+        return bool(message.ttl) and (time.time() - message.timestamp) > message.ttl
+    
+    def send_message_threadsafe(self, message: AgentMessage) -> concurrent.futures.Future:
+        """
+        从事件循环以外的线程发送消息
+
+        Args:
+            message: 消息
+
+        Returns:
+            concurrent.futures.Future，结果为 send_message 的返回值
+        """
+        if self._loop is None or self._loop.is_closed():
+            raise RuntimeError("MessageBroker has no running event loop yet")
+        return asyncio.run_coroutine_threadsafe(self.send_message(message), self._loop)
+    
     async def broadcast_message(self, from_agent: str, message_type: MessageType, payload: Dict) -> List[str]:
         """广播消息给所有订阅者"""
         successful_sends = []
@@ -170,36 +430,49 @@ class MessageBroker:
         return successful_sends
     
     async def get_messages(self, agent_id: str, limit: Optional[int] = None) -> List[AgentMessage]:
-        """获取Agent的消息"""
-        if agent_id not in self.message_queues:
+        """获取Agent没有对应处理器的消息"""
+        if agent_id not in self.inboxes:
             return []
         
         messages = []
-        with self.lock:
-            queue = self.message_queues[agent_id]
-            count = 0
-            while queue and (limit is None or count < limit):
-                messages.append(queue.popleft())
-                count += 1
+        queue = self.inboxes[agent_id]
+        count = 0
+        while queue and (limit is None or count < limit):
+            message = queue.popleft()
+            if self._is_expired(message):
+                self.queue_metrics[agent_id]['expired'] += 1
+                continue
+            messages.append(message)
+            count += 1
         
         return messages
     
     async def _process_message(self, message: AgentMessage):
-        """处理消息"""
+        """处理消息，没有匹配处理器的消息留给 get_messages 拉取"""
         target_agent = message.to_agent
         
-        if target_agent not in self.handlers:
-            logger.warning(f"No handlers found for agent {target_agent}")
+        # 查找匹配的处理器
+        handlers = self.handlers.get(target_agent, {}).get(message.message_type)
+        if not handlers:
+            inbox = self.inboxes[target_agent]
+            if len(inbox) == inbox.maxlen:
+                # 收件箱已满时丢弃最早的消息
+                self.queue_metrics[target_agent]['inbox_dropped'] += 1
+            inbox.append(message)
             return
         
-        # 查找匹配的处理器
-        handlers = self.handlers[target_agent]
         for handler in handlers:
-            if handler.message_type == message.message_type:
-                try:
-                    await handler.handler_func(message)
-                except Exception as e:
-                    logger.error(f"Handler error for {handler.handler_id}: {e}")
+            try:
+                await handler.handler_func(message)
+            except Exception as e:
+                logger.error(f"Handler error for {handler.handler_id}: {e}")
+    
+    async def join(self, agent_id: Optional[str] = None):
+        """等待指定Agent（默认全部Agent）已入队的消息处理完毕"""
+        agent_ids = [agent_id] if agent_id else list(self.message_queues)
+        for queue_agent in agent_ids:
+            if queue_agent in self.message_queues:
+                await self.message_queues[queue_agent].join()
     
     def _validate_message(self, message: AgentMessage) -> bool:
         """验证消息格式"""
@@ -216,26 +489,37 @@ class MessageBroker:
         if agent_id not in self.message_queues:
             return {"error": "Agent not found"}
         
-        with self.lock:
-            queue = self.message_queues[agent_id]
-            return {
-                "agent_id": agent_id,
-                "queue_length": len(queue),
-                "handlers_count": len(self.handlers.get(agent_id, [])),
-                "is_active": agent_id in self.active_agents
-            }
+        queue = self.message_queues[agent_id]
+        return {
+            "agent_id": agent_id,
+            "queue_length": queue.qsize(),
+            "capacity": queue.maxsize,
+            "overflow_policy": self.overflow_policies[agent_id].value,
+            "inbox_length": len(self.inboxes[agent_id]),
+            "metrics": dict(self.queue_metrics[agent_id]),
+            "consumers": len([task for task in self.consumers.get(agent_id, []) if not task.done()]),
+            "handlers_count": sum(len(handlers) for handlers in self.handlers.get(agent_id, {}).values()),
+            "is_active": agent_id in self.active_agents
+        }
     
     def get_system_status(self) -> Dict:
         """获取系统状态"""
-        with self.lock:
-            return {
-                "total_agents": len(self.active_agents),
-                "active_agents": list(self.active_agents),
-                "total_queues": len(self.message_queues),
-                "total_handlers": sum(len(handlers) for handlers in self.handlers.values()),
-                "message_history_size": len(self.message_history),
-                "subscribers": {k.value: v for k, v in self.subscribers.items()}
-            }
+        totals = _new_queue_metrics()
+        for metrics in self.queue_metrics.values():
+            for key, value in metrics.items():
+                totals[key] = max(totals[key], value) if key == 'max_depth' else totals[key] + value
+        return {
+            "total_agents": len(self.active_agents),
+            "active_agents": list(self.active_agents),
+            "total_queues": len(self.message_queues),
+            "total_handlers": sum(
+                len(handlers) for by_type in self.handlers.values() for handlers in by_type.values()
+            ),
+            "queue_depth": sum(queue.qsize() for queue in self.message_queues.values()),
+            "queue_metrics": totals,
+            "message_history_size": len(self.message_history),
+            "subscribers": {k.value: v for k, v in self.subscribers.items()}
+        }
 
 class AgentCommunicator:
     """Agent通信客户端"""
@@ -346,7 +630,7 @@ class AgentCommunicator:
         self.broker.unregister_agent(self.agent_id)
 
 # 全局消息代理实例
-_global_message_broker = MessageBroker()
+_global_message_broker = MessageBroker(transport=create_transport())
 
 def get_message_broker() -> MessageBroker:
     """获取全局消息代理"""
@@ -354,7 +638,9 @@ def get_message_broker() -> MessageBroker:
 
 async def create_agent_communicator(agent_id: str) -> AgentCommunicator:
     """创建Agent通信客户端"""
-    return AgentCommunicator(agent_id, get_message_broker())
+    broker = get_message_broker()
+    await broker.start()
+    return AgentCommunicator(agent_id, broker)
 
 if __name__ == "__main__":
     # 测试代码
@@ -0,0 +1,315 @@
+"""
+基于 TCP 的跨进程消息传输
+BrokerServer 是本地替身服务器，各进程的 MessageBroker 通过 SocketTransport 连接它：
+消息用 codec 模块编码为二进制，服务器只解码头部，按 to_agent 把消息转发给托管该Agent的连接（同一Agent由多个工作进程托管时轮询分发），
+REQUEST 的回复按 correlation_id 直接送回发起请求的连接。
+服务器为每个连接维护独立的发送队列，慢速或已断开的接收方不会阻塞、也不会断开发送方；
+SocketTransport 断线后按指数退避自动重连，重连期间 send 返回 False。
+
+启动服务器：
+    python -m agents.messaging.socket_transport --host 127.0.0.1 --port 8765
+工作进程设置 MESSAGE_BROKER_TRANSPORT=socket 后，get_message_broker() 即经该服务器通信。
+"""
+
+import argparse
+import asyncio
+import logging
+import struct
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from agents.messaging.codec import decode_message, encode_message, peek_routing
+from agents.messaging.message_broker import AgentMessage, MessageTransport, MessageType
+
+logger = logging.getLogger(__name__)
+
+# 帧格式：4 字节大端长度 + 1 字节类型 + 内容
+_FRAME_HEADER = struct.Struct(">IB")
+FRAME_MESSAGE = 1
+FRAME_REGISTER = 2
+FRAME_UNREGISTER = 3
+
+
+def write_frame(writer: asyncio.StreamWriter, kind: int, body: bytes):
+    writer.write(_FRAME_HEADER.pack(len(body), kind) + body)
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    length, kind = _FRAME_HEADER.unpack(await reader.readexactly(_FRAME_HEADER.size))
+    return kind, await reader.readexactly(length)
+
+
+class SocketTransport(MessageTransport):
+    """连接 BrokerServer 的传输层"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        reconnect: bool = True,
+        initial_backoff: float = 0.1,
+        max_backoff: float = 5.0
+    ):
+        """
+        Args:
+            host: BrokerServer 地址
+            port: BrokerServer 端口
+            reconnect: 连接断开后是否自动重连
+            initial_backoff: 首次重连前的等待秒数，之后每次失败翻倍
+            max_backoff: 重连等待的上限秒数
+        """
+        self.host = host
+        self.port = port
+        self.reconnect = reconnect
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.agent_ids = set()  # 本进程托管的Agent，连接建立后向服务器声明
+        self._deliver: Optional[Callable[[AgentMessage], Awaitable[bool]]] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def start(self, deliver: Callable[[AgentMessage], Awaitable[bool]]):
+        """连接服务器并声明已注册的Agent"""
+        self._deliver = deliver
+        self._closed = False
+        await self._connect()
+        logger.info(f"SocketTransport connected to {self.host}:{self.port}")
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        for agent_id in self.agent_ids:
+            write_frame(writer, FRAME_REGISTER, agent_id.encode("utf-8"))
+        await writer.drain()
+        self._writer = writer
+        self._reader_task = asyncio.create_task(self._read_loop(reader))
+
+    def register(self, agent_id: str):
+        self.agent_ids.add(agent_id)
+        if self.connected:
+            write_frame(self._writer, FRAME_REGISTER, agent_id.encode("utf-8"))
+
+    def unregister(self, agent_id: str):
+        self.agent_ids.discard(agent_id)
+        if self.connected:
+            write_frame(self._writer, FRAME_UNREGISTER, agent_id.encode("utf-8"))
+
+    @property
+    def connected(self) -> bool:
+        """与服务器的连接是否可用"""
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def send(self, message: AgentMessage) -> bool:
+        if not self.connected:
+            return False
+        try:
+            write_frame(self._writer, FRAME_MESSAGE, encode_message(message))
+            await self._writer.drain()
+        except ConnectionError as e:
+            logger.warning(f"SocketTransport send failed: {e}")
+            self._disconnect()
+            return False
+        return True
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        # deliver 在队列满（BLOCK 策略）时会等待，读循环随之暂停，由 TCP 向服务器施加背压
+        try:
+            while True:
+                kind, body = await read_frame(reader)
+                if kind != FRAME_MESSAGE:
+                    continue
+                # 单个帧解码或投递失败只丢弃该帧，不影响后续消息
+                try:
+                    await self._deliver(decode_message(body))
+                except Exception as e:
+                    logger.error(f"SocketTransport dropped an undecodable or undeliverable frame: {e}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logger.warning(f"SocketTransport disconnected from {self.host}:{self.port}")
+        finally:
+            # 读循环退出后连接不再可用，send 随之返回 False
+            self._disconnect()
+        # 被 close() 取消时不会执行到这里
+        if self.reconnect and not self._closed:
+            await self._reconnect()
+
+    async def _reconnect(self):
+        """按指数退避重连，成功后重新声明本进程托管的Agent"""
+        delay = self.initial_backoff
+        while not self._closed:
+            await asyncio.sleep(delay)
+            try:
+                await self._connect()
+            except OSError as e:
+                logger.debug(f"SocketTransport reconnect to {self.host}:{self.port} failed: {e}")
+                delay = min(delay * 2, self.max_backoff)
+                continue
+            logger.info(f"SocketTransport reconnected to {self.host}:{self.port}")
+            return
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def close(self):
+        self._closed = True
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        if self._writer is not None:
+            writer, self._writer = self._writer, None
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+class BrokerServer:
+    """本地替身消息服务器，在连接之间路由消息"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        max_pending_replies: int = 10000,
+        max_outbox: int = 10000
+    ):
+        """
+        Args:
+            host: 监听地址
+            port: 监听端口，为0时由系统分配（启动后从 self.port 读取）
+            max_pending_replies: 等待回复的请求数上限，超过时淘汰最早的请求
+            max_outbox: 每个连接待发送的消息数上限，超过时丢弃新消息
+        """
+        self.host = host
+        self.port = port
+        self.max_pending_replies = max_pending_replies
+        self.max_outbox = max_outbox
+        self.routes: Dict[str, List[asyncio.StreamWriter]] = {}  # agent_id -> 托管该Agent的连接
+        self.pending_replies: "OrderedDict[str, asyncio.StreamWriter]" = OrderedDict()  # correlation_id -> 请求方连接
+        self._next_route: Dict[str, int] = {}  # agent_id -> 轮询位置
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._outboxes: Dict[asyncio.StreamWriter, asyncio.Queue] = {}  # 连接 -> 待发送的帧
+        self.stats = {'routed': 0, 'replies': 0, 'unroutable': 0, 'dropped': 0, 'malformed': 0}
+
+    async def start(self):
+        """开始监听"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"BrokerServer listening on {self.host}:{self.port}")
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def close(self):
+        """停止监听并断开所有连接"""
+        for writer in list(self._outboxes):
+            writer.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        outbox = asyncio.Queue(maxsize=self.max_outbox)
+        self._outboxes[writer] = outbox
+        send_task = asyncio.create_task(self._write_loop(writer, outbox))
+        try:
+            while True:
+                kind, body = await read_frame(reader)
+                # 单个帧无法解析只丢弃该帧，不断开发送方
+                try:
+                    if kind == FRAME_MESSAGE:
+                        self._route(body, writer)
+                    elif kind == FRAME_REGISTER:
+                        writers = self.routes.setdefault(body.decode("utf-8"), [])
+                        if writer not in writers:
+                            writers.append(writer)
+                    elif kind == FRAME_UNREGISTER:
+                        self._remove_route(body.decode("utf-8"), writer)
+                except Exception as e:
+                    self.stats['malformed'] += 1
+                    logger.error(f"BrokerServer dropped a malformed frame: {e}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            send_task.cancel()
+            self._forget(writer)
+            writer.close()
+
+    async def _write_loop(self, writer: asyncio.StreamWriter, outbox: asyncio.Queue):
+        """把路由到该连接的帧依次写出；写入失败只影响这个连接"""
+        try:
+            while True:
+                body = await outbox.get()
+                write_frame(writer, FRAME_MESSAGE, body)
+                await writer.drain()
+        except ConnectionError as e:
+            logger.warning(f"BrokerServer lost a connection while forwarding: {e}")
+            # 立即撤销路由，后续消息不再发往该连接；读循环随后结束并完成清理
+            self._forget(writer)
+            writer.close()
+
+    def _forget(self, writer: asyncio.StreamWriter):
+        """撤销连接的全部路由与待回复的请求"""
+        for agent_id in list(self.routes):
+            self._remove_route(agent_id, writer)
+        for correlation_id in [cid for cid, w in self.pending_replies.items() if w is writer]:
+            del self.pending_replies[correlation_id]
+        self._outboxes.pop(writer, None)
+
+    def _remove_route(self, agent_id: str, writer: asyncio.StreamWriter):
+        writers = self.routes.get(agent_id)
+        if writers and writer in writers:
+            writers.remove(writer)
+            if not writers:
+                del self.routes[agent_id]
+
+    def _route(self, body: bytes, sender: asyncio.StreamWriter):
+        # 只解码头部，payload 不解码
+        message_type, to_agent, correlation_id = peek_routing(body)
+        target = None
+        if message_type in (MessageType.RESPONSE, MessageType.ERROR) and correlation_id:
+            target = self.pending_replies.pop(correlation_id, None)
+            if target is not None:
+                self.stats['replies'] += 1
+        if target is None:
+            writers = self.routes.get(to_agent)
+            if not writers:
+                self.stats['unroutable'] += 1
+                logger.warning(f"No connection hosts agent {to_agent}, {message_type.value} message dropped")
+                return
+            index = self._next_route.get(to_agent, 0) % len(writers)
+            self._next_route[to_agent] = index + 1
+            target = writers[index]
+
+        if message_type is MessageType.REQUEST and correlation_id:
+            self.pending_replies[correlation_id] = sender
+            while len(self.pending_replies) > self.max_pending_replies:
+                self.pending_replies.popitem(last=False)
+
+        # 原样转发，不重新编码；放入目标连接的发送队列，不等待目标读取
+        outbox = self._outboxes.get(target)
+        if outbox is None:
+            self.stats['unroutable'] += 1
+            return
+        try:
+            outbox.put_nowait(body)
+        except asyncio.QueueFull:
+            self.stats['dropped'] += 1
+            logger.warning(f"Outbox for agent {to_agent} is full, {message_type.value} message dropped")
+            return
+        self.stats['routed'] += 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agent 消息服务器（本地替身）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(BrokerServer(args.host, args.port).serve_forever())
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件
+
+用于测试 AgentMessage 二进制编解码的往返一致性、JSON 回退与路由字段解码。
+"""
+
+import unittest
+from unittest import mock
+
+from agents.messaging import codec
+from agents.messaging.benchmark_codec import json_decode, json_encode, run_benchmark, sample_messages
+from agents.messaging.codec import decode_message, encode_message, peek_routing
+from agents.messaging.message_broker import AgentMessage, MessageType
+
+
+class CodecTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for name, message in sample_messages().items():
+            with self.subTest(name):
+                self.assertEqual(decode_message(encode_message(message)), message)
+
+    def test_optional_fields(self):
+        message = sample_messages()["heartbeat"]
+        self.assertIsNone(message.correlation_id)
+        self.assertIsNone(message.ttl)
+        decoded = decode_message(encode_message(message))
+        self.assertIsNone(decoded.correlation_id)
+        self.assertIsNone(decoded.ttl)
+
+        message.correlation_id, message.ttl = "", 0.0
+        decoded = decode_message(encode_message(message))
+        self.assertEqual(decoded.correlation_id, "")
+        self.assertEqual(decoded.ttl, 0.0)
+
+    def test_json_payload_fallback(self):
+        message = sample_messages()["recommendation"]
+        with mock.patch.object(codec, "msgpack", None):
+            data = encode_message(message)
+            self.assertEqual(decode_message(data), message)
+        self.assertEqual(decode_message(data), message)
+
+    def test_peek_routing(self):
+        message = sample_messages()["intent_request"]
+        self.assertEqual(
+            peek_routing(encode_message(message)),
+            (MessageType.REQUEST, "intent_agent", message.correlation_id)
+        )
+
+    def test_slots_and_size(self):
+        message = sample_messages()["recommendation"]
+        self.assertFalse(hasattr(message, "__dict__"))
+        self.assertIn("payload", AgentMessage.__slots__)
+        self.assertEqual(json_decode(json_encode(message)), message)
+        self.assertLess(len(encode_message(message)), len(json_encode(message)))
+
+    def test_benchmark_runs(self):
+        rows = run_benchmark(iterations=10)
+        self.assertEqual(len(rows), 6)
+        self.assertTrue(all(row["bytes"] > 0 for row in rows))
+
+
+if __name__ == "__main__":
+    unittest.main()
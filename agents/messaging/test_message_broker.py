@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件
+
+用于测试消息代理的异步投递、优先级调度、跨线程投递、队列溢出策略与请求/响应。
+"""
+
+import asyncio
+import unittest
+import uuid
+
+from agents.messaging.message_broker import (
+    AgentCommunicator, AgentMessage, MessageBroker, MessagePriority, MessageType, OverflowPolicy
+)
+
+
+def make_message(to_agent, priority=MessagePriority.NORMAL, payload=None, message_type=MessageType.NOTIFICATION):
+    return AgentMessage(
+        message_id=str(uuid.uuid4()),
+        from_agent="tester",
+        to_agent=to_agent,
+        message_type=message_type,
+        priority=priority,
+        payload=payload or {}
+    )
+
+
+class MessageBrokerTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.broker = MessageBroker(consumers_per_agent=1)
+
+    async def asyncTearDown(self):
+        for agent_id in list(self.broker.active_agents):
+            self.broker.unregister_agent(agent_id)
+
+    async def test_send_does_not_wait_for_handler(self):
+        self.broker.register_agent("slow")
+        release = asyncio.Event()
+        handled = []
+
+        async def handler(message):
+            await release.wait()
+            handled.append(message.message_id)
+
+        self.broker.register_handler("slow", MessageType.NOTIFICATION, handler)
+        message = make_message("slow")
+        self.assertTrue(await asyncio.wait_for(self.broker.send_message(message), timeout=1))
+        self.assertEqual(handled, [])
+
+        release.set()
+        await self.broker.join("slow")
+        self.assertEqual(handled, [message.message_id])
+
+    async def test_urgent_overtakes_normal(self):
+        self.broker.register_agent("worker")
+        release = asyncio.Event()
+        order = []
+
+        async def handler(message):
+            await release.wait()
+            order.append(message.payload["name"])
+
+        self.broker.register_handler("worker", MessageType.NOTIFICATION, handler)
+        # 第一条消息占住唯一的消费者，其余消息在队列中排队
+        await self.broker.send_message(make_message("worker", payload={"name": "first"}))
+        await asyncio.sleep(0)
+        for i in range(3):
+            await self.broker.send_message(make_message("worker", payload={"name": f"normal-{i}"}))
+        await self.broker.send_message(make_message("worker", MessagePriority.URGENT, {"name": "urgent"}))
+
+        release.set()
+        await self.broker.join("worker")
+        self.assertEqual(order, ["first", "urgent", "normal-0", "normal-1", "normal-2"])
+
+    async def test_unhandled_messages_are_pulled(self):
+        self.broker.register_agent("puller")
+        await self.broker.send_message(make_message("puller", payload={"n": 1}))
+        await self.broker.join("puller")
+        messages = await self.broker.get_messages("puller")
+        self.assertEqual([m.payload for m in messages], [{"n": 1}])
+
+    async def test_threadsafe_send(self):
+        self.broker.register_agent("puller")
+        message = make_message("puller")
+        future = await asyncio.to_thread(lambda: self.broker.send_message_threadsafe(message))
+        self.assertTrue(await asyncio.wrap_future(future))
+        await self.broker.join("puller")
+        self.assertEqual(await self.broker.get_messages("puller"), [message])
+
+    async def _fill_blocked_queue(self, policy, names, priorities=None):
+        """占住唯一的消费者后按顺序发送消息，返回 (release 事件, 处理顺序, 各次发送结果)"""
+        self.broker.register_agent("bounded", capacity=2, overflow_policy=policy)
+        release = asyncio.Event()
+        order = []
+
+        async def handler(message):
+            await release.wait()
+            order.append(message.payload["name"])
+
+        self.broker.register_handler("bounded", MessageType.NOTIFICATION, handler)
+        await self.broker.send_message(make_message("bounded", payload={"name": "first"}))
+        await asyncio.sleep(0)
+        results = []
+        for i, name in enumerate(names):
+            priority = priorities[i] if priorities else MessagePriority.NORMAL
+            results.append(await self.broker.send_message(make_message("bounded", priority, {"name": name})))
+        return release, order, results
+
+    async def test_reject_policy(self):
+        release, order, results = await self._fill_blocked_queue(OverflowPolicy.REJECT, ["a", "b", "c"])
+        self.assertEqual(results, [True, True, False])
+        release.set()
+        await self.broker.join("bounded")
+        self.assertEqual(order, ["first", "a", "b"])
+        status = self.broker.get_queue_status("bounded")
+        self.assertEqual(status["metrics"]["rejected"], 1)
+        self.assertEqual(status["metrics"]["max_depth"], 2)
+        self.assertEqual(self.broker.get_system_status()["queue_metrics"]["rejected"], 1)
+
+    async def test_drop_oldest_policy(self):
+        release, order, results = await self._fill_blocked_queue(OverflowPolicy.DROP_OLDEST, ["a", "b", "c"])
+        self.assertEqual(results, [True, True, True])
+        release.set()
+        await self.broker.join("bounded")
+        self.assertEqual(order, ["first", "b", "c"])
+        self.assertEqual(self.broker.get_queue_status("bounded")["metrics"]["dropped"], 1)
+
+    async def test_drop_lowest_priority_policy(self):
+        low, normal, high = MessagePriority.LOW, MessagePriority.NORMAL, MessagePriority.HIGH
+        release, order, results = await self._fill_blocked_queue(
+            OverflowPolicy.DROP_LOWEST_PRIORITY, ["low", "normal", "high", "low-2"], [low, normal, high, low]
+        )
+        self.assertEqual(results, [True, True, True, False])
+        release.set()
+        await self.broker.join("bounded")
+        self.assertEqual(order, ["first", "high", "normal"])
+        self.assertEqual(self.broker.get_queue_status("bounded")["metrics"]["dropped"], 2)
+
+    async def test_block_policy_timeout(self):
+        self.broker.block_timeout = 0.05
+        release, order, results = await self._fill_blocked_queue(OverflowPolicy.BLOCK, ["a", "b", "c"])
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual(self.broker.get_queue_status("bounded")["metrics"]["blocked"], 1)
+
+        # 队列空出位置后，阻塞的发送方继续入队
+        pending = asyncio.create_task(self.broker.send_message(make_message("bounded", payload={"name": "d"})))
+        release.set()
+        self.assertTrue(await pending)
+        await self.broker.join("bounded")
+        self.assertEqual(order, ["first", "a", "b", "d"])
+
+    async def test_ttl_checked_at_dequeue(self):
+        release, order, _ = await self._fill_blocked_queue(OverflowPolicy.BLOCK, [])
+        message = make_message("bounded", payload={"name": "short-lived"})
+        message.ttl = 0.01
+        self.assertTrue(await self.broker.send_message(message))
+        await asyncio.sleep(0.02)
+        release.set()
+        await self.broker.join("bounded")
+        self.assertEqual(order, ["first"])
+        self.assertEqual(self.broker.get_queue_status("bounded")["metrics"]["expired"], 1)
+
+    async def test_request_response(self):
+        client = AgentCommunicator("client", self.broker)
+        server = AgentCommunicator("server", self.broker)
+
+        async def handle_request(message):
+            await server.send_response(message, {"echo": message.payload["value"]})
+
+        server.register_handler(MessageType.REQUEST, handle_request)
+        response = await client.send_request("server", {"value": 42}, timeout=1)
+        self.assertEqual(response, {"echo": 42})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件
+
+用于测试经 BrokerServer 的跨进程请求/响应、工作进程轮询、连接异常处理与断线重连。
+每个 MessageBroker 模拟一个独立进程。
+"""
+
+import asyncio
+import unittest
+import uuid
+
+from agents.messaging.message_broker import (
+    AgentCommunicator, AgentMessage, MessageBroker, MessagePriority, MessageType
+)
+from agents.messaging.socket_transport import (
+    FRAME_MESSAGE, FRAME_REGISTER, BrokerServer, SocketTransport, write_frame
+)
+
+
+class SocketTransportTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.server = BrokerServer(port=0)
+        await self.server.start()
+        self.brokers = []
+
+    async def asyncTearDown(self):
+        for broker in self.brokers:
+            await broker.close()
+        await self.server.close()
+
+    async def wait_until(self, predicate, timeout=2.0):
+        for _ in range(int(timeout / 0.01)):
+            if predicate():
+                return True
+            await asyncio.sleep(0.01)
+        return predicate()
+
+    async def make_broker(self):
+        broker = MessageBroker(transport=SocketTransport(port=self.server.port))
+        await broker.start()
+        self.brokers.append(broker)
+        return broker
+
+    async def make_worker(self, name):
+        worker = AgentCommunicator("heavy", await self.make_broker())
+
+        async def handle_request(message):
+            await worker.send_response(message, {"worker": name, "value": message.payload["value"] * 2})
+
+        worker.register_handler(MessageType.REQUEST, handle_request)
+        return worker
+
+    async def test_request_response_across_brokers(self):
+        await self.make_worker("w1")
+        client = AgentCommunicator("client", await self.make_broker())
+
+        response = await client.send_request("heavy", {"value": 21}, timeout=2)
+        self.assertEqual(response, {"worker": "w1", "value": 42})
+        self.assertEqual(self.server.stats["replies"], 1)
+        self.assertEqual(self.server.pending_replies, {})
+
+    async def test_requests_round_robin_across_workers(self):
+        await self.make_worker("w1")
+        await self.make_worker("w2")
+        client = AgentCommunicator("client", await self.make_broker())
+
+        workers = [(await client.send_request("heavy", {"value": i}, timeout=2))["worker"] for i in range(4)]
+        self.assertEqual(sorted(workers), ["w1", "w1", "w2", "w2"])
+
+    async def test_unroutable_message_dropped(self):
+        await self.make_worker("w1")
+        client = AgentCommunicator("client", await self.make_broker())
+        await client.send_notification("nobody", {})
+        # 同一连接上的帧按序处理，收到响应时前一条通知已被服务器丢弃
+        await client.send_request("heavy", {"value": 1}, timeout=2)
+        self.assertEqual(self.server.stats["unroutable"], 1)
+
+    async def test_bad_frame_does_not_stop_reader(self):
+        worker = await self.make_worker("w1")
+        client = AgentCommunicator("client", await self.make_broker())
+        # 元组键可以编码，但解码为列表键后无法作为字典键
+        bad = AgentMessage(
+            message_id=str(uuid.uuid4()), from_agent="client", to_agent="heavy",
+            message_type=MessageType.NOTIFICATION, priority=MessagePriority.NORMAL,
+            payload={(1, 2): "x"}
+        )
+        self.assertTrue(await client.broker.send_message(bad))
+
+        response = await client.send_request("heavy", {"value": 2}, timeout=2)
+        self.assertEqual(response, {"worker": "w1", "value": 4})
+        self.assertTrue(worker.broker.transport.connected)
+
+    async def test_send_fails_after_disconnect(self):
+        client = AgentCommunicator("client", await self.make_broker())
+        transport = client.broker.transport
+        await self.server.close()
+        self.assertTrue(await self.wait_until(lambda: not transport.connected))
+        self.assertFalse(await client.broker.send_message(AgentMessage(
+            message_id=str(uuid.uuid4()), from_agent="client", to_agent="heavy",
+            message_type=MessageType.NOTIFICATION, priority=MessagePriority.NORMAL, payload={}
+        )))
+
+    async def test_malformed_frame_does_not_disconnect_sender(self):
+        await self.make_worker("w1")
+        client = AgentCommunicator("client", await self.make_broker())
+        writer = client.broker.transport._writer
+        write_frame(writer, FRAME_MESSAGE, b"\x00")
+        write_frame(writer, FRAME_REGISTER, b"\xff")
+        await writer.drain()
+
+        response = await client.send_request("heavy", {"value": 3}, timeout=2)
+        self.assertEqual(response, {"worker": "w1", "value": 6})
+        self.assertEqual(self.server.stats["malformed"], 2)
+
+    async def test_slow_consumer_does_not_block_sender(self):
+        await self.make_worker("w1")
+        client = AgentCommunicator("client", await self.make_broker())
+        # 只声明托管 slow、从不读取的连接
+        _, slow_writer = await asyncio.open_connection("127.0.0.1", self.server.port)
+        write_frame(slow_writer, FRAME_REGISTER, b"slow")
+        await slow_writer.drain()
+        self.assertTrue(await self.wait_until(lambda: "slow" in self.server.routes))
+
+        for _ in range(200):
+            await client.send_notification("slow", {"blob": "x" * 65536})
+        response = await client.send_request("heavy", {"value": 4}, timeout=2)
+        self.assertEqual(response, {"worker": "w1", "value": 8})
+        slow_writer.close()
+
+    async def test_reconnects_after_server_restart(self):
+        worker = await self.make_worker("w1")
+        client = AgentCommunicator("client", await self.make_broker())
+        transports = [worker.broker.transport, client.broker.transport]
+        port = self.server.port
+        await self.server.close()
+        self.assertTrue(await self.wait_until(lambda: not any(t.connected for t in transports)))
+
+        self.server = BrokerServer(port=port)
+        await self.server.start()
+        self.assertTrue(await self.wait_until(lambda: all(t.connected for t in transports)))
+        self.assertTrue(await self.wait_until(lambda: "heavy" in self.server.routes))
+        response = await client.send_request("heavy", {"value": 5}, timeout=2)
+        self.assertEqual(response, {"worker": "w1", "value": 10})
+
+
+if __name__ == "__main__":
+    unittest.main()
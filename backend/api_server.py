@@ -13,14 +13,17 @@ import logging
 from datetime import datetime
 from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
-from tools.psql.dialog_crud import DialogCRUD
+from tools.psql.async_dialog_crud import DEFAULT_SESSION_ID, DIALOG_WINDOW, AsyncDialogCRUD, close_pool
 from tools.weaviate import weaviate_query
-from tools.weaviate.weaviate_query import query_good
 
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from tools.rag.qwen_embedding import KimiGPTService, QwenEmbeddingService
+from fastapi.responses import JSONResponse, StreamingResponse
+from tools.rag.qwen_embedding import AsyncKimiGPTService, QwenEmbeddingService
+from tools.rag.stream_parser import IntentStreamParser
+from tools.rag.conversation_compactor import ConversationCompactor
+from tools.rag.semantic_cache import SemanticCache
+from tools.rag.summary_cache import SUMMARY_PROMPT_VERSION, SummaryCache, build_summary_prompt
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -37,7 +40,14 @@ from agents.orchestrator.enhanced_multi_agent_orchestrator import (
 )
 from agents.recorder_agent.camel_behavior_recorder import BehaviorRecorderAgent
 
-kimi = KimiGPTService()
+kimi = AsyncKimiGPTService()
+# 商品概述缓存：详情与提示词版本不变时直接复用已生成的概述
+summary_cache = SummaryCache()
+# 对话压缩：会话历史超过 token 预算时，较早轮次在后台合并进 dialog_summary
+compactor = ConversationCompactor(summarize=kimi.generate, max_turns=DIALOG_WINDOW)
+_background_tasks = set()
+# 意图语义缓存：同一意图状态下语义相近的消息直接复用已生成的结果
+vibe_cache = SemanticCache(weaviate_query.qwen)
 # Pydantic模型定义
 class ItemInfo(BaseModel):
     title: str = Field(..., description="产品标题")
@@ -101,6 +111,15 @@ async def startup_event():
         logger.error(f"AI Agents系统初始化失败: {e}")
         logger.warning("系统将以降级模式运行，使用mock数据")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用退出时释放共享的外部连接"""
+    await weaviate_query.close_async_client()
+    weaviate_query.close_client()
+    await kimi.aclose()
+    summary_cache.close()
+    await close_pool()
+
 # 路由定义
 @app.get("/")
 async def root():
@@ -111,19 +130,11 @@ async def health_check():
     return {
         "status": "healthy",
         "ai_system_ready": orchestrator is not None,
+        "semantic_cache": vibe_cache.stats(),
         "timestamp": datetime.now().isoformat()
     }
 
-@app.get("/api/vibe")
-async def vibe(query: Optional[str] = None):
-    crud = DialogCRUD()
-    try:
-      # agent
-      pass
-    except:
-      pass
-    try:
-        prompt = """
+VIBE_PROMPT = """
 你是一位专业的商品导购，你需要识别用户的选购意图以帮助用户决策，用户会给你提供原有意图识别结果和历史对话信息。无非必要，请绝对不能更改原有的意图标题。你还需要生成一句 message，用于提示用户一些挑选中的关键缺失信息，不多于 200 字。最后用户会给出最新的文本消息。
 
 ## 输出示例及格式
@@ -142,37 +153,238 @@ async def vibe(query: Optional[str] = None):
 - 请严格按照输出示例的格式输出，不能有任何额外的内容。
 - 保持意图的连贯性和一致性。
 """.strip()
-        all_messages = '\n'.join(crud.get_all_messages())
-        if all_messages:
-            prompt += "\n\n## 历史对话信息" + all_messages
-        intent_info = crud.get_last_intent_info()
-        if intent_info:
-            prompt += "\n\n## 原有意图识别结果\n子类目：" + intent_info['intend_title']
-            prompt += '\n属性：' + ','.join(intent_info['intend_attrs'])
-            prompt += '\停用词：' + ','.join(intent_info['intend_stop_words'])
-        prompt += '\n\n===' + query
-        res = kimi.generate(prompt)
-        res = json.loads(res)
-        # check if format good
-        if 'intent' not in res or 'message' not in res:
-            raise Exception('生成格式错误...')
-        if 'title' not in res['intent']:
-            raise Exception('生成格式错误...')
-        if 'attrs' not in res['intent']:
-            raise Exception('生成格式错误...')
-        crud.insert_dialog(
-            message=query,
-            intend_title=res['intent']['title'],
-            intend_attrs=res['intent']['attrs'],
-            intend_stop_words=res['intent']['stop_words'],
-            reply=res['message']
+
+PRODUCTS_PROMPT = """
+你是一位 weaviate 专家，正在辅助一位电商导购筛选和获取商品列表。weaviate 中存储的是商品的详细描述信息，导购会将用户的历史对话信息提供给你，其中包含短关键词及长句。导购也可能会为你提供当前用户的子类目，你需要理解并识别用户的主要选购意图，并且拆解出用于执行 weaviate 的 query，并且解析出一些关键词，用于过滤用户不想要的商品。
+
+## 输出示例及格式
+```
+{
+  "query": "小米充电宝白色"
+  "stop_words": ["黑色"]
+}
+```
+
+## 注意事项
+请严格按照输出示例的格式输出，不能有任何额外的内容。
+""".strip()
+
+def build_dialog_context(state: Dict) -> str:
+    """拼接提示词中的历史摘要、最近对话与原有意图部分（state 为 get_dialog_state 的返回值）"""
+    context = ''
+    if state['summary']:
+        context += "\n\n## 较早对话摘要\n" + state['summary']
+    all_messages = '\n'.join(state['messages'])
+    intent_info = state['intent_info']
+    if all_messages:
+        context += "\n\n## 历史对话信息" + all_messages
+    if intent_info:
+        context += "\n\n## 原有意图识别结果\n子类目：" + intent_info['intend_title']
+        context += '\n属性：' + ','.join(intent_info['intend_attrs'])
+        context += '\停用词：' + ','.join(intent_info['intend_stop_words'])
+    return context
+
+def build_vibe_prompt(state: Dict, query: str) -> str:
+    """拼接 /api/vibe 的提示词：历史对话 + 原有意图 + 最新消息"""
+    return VIBE_PROMPT + build_dialog_context(state) + '\n\n===' + query
+
+def build_products_prompt(state: Dict) -> str:
+    """拼接 /api/products 的提示词：历史对话 + 原有意图"""
+    return PRODUCTS_PROMPT + build_dialog_context(state)
+
+def intent_query(title: str, attrs: List[str]) -> str:
+    """由意图的子类目与属性拼出检索 query"""
+    return ' '.join([title, *attrs]).strip()
+
+def format_threads(objects) -> List[Dict]:
+    """将 Weaviate 检索结果转换为前端的商品卡片列表"""
+    threads = []
+    for item in objects:
+        item = item.properties
+        threads.append(
+            {
+                "id": item['goodId'],
+                "good": {
+                    "id": 0,
+                    "title": item['name'],
+                    "pic_url": item['picUrl'],
+                    "brand": item['brandName'],
+                    "category": item['catagory'],
+                    "categoryColor": item['subCatagory'],
+                    "price": item['price']
+                },
+                "dchain": {
+                    "tbn_url": "",
+                    "user_nick": "test_user",
+                    "user_pic_url": ""
+                }
+            }
         )
+    return threads
+
+def is_valid_vibe_result(res: Dict) -> bool:
+    """生成结果是否包含 intent.title、intent.attrs 与 message"""
+    return (
+        isinstance(res, dict) and 'message' in res and isinstance(res.get('intent'), dict)
+        and 'title' in res['intent'] and 'attrs' in res['intent']
+    )
+
+def vibe_cache_context(state: Dict):
+    """语义缓存的意图状态：只有原有意图完全相同时才复用结果"""
+    intent_info = state['intent_info']
+    if not intent_info:
+        return None
+    return [intent_info['intend_title'], intent_info['intend_attrs'], intent_info['intend_stop_words']]
+
+async def generate_vibe(state: Dict, query: str) -> Dict:
+    """经语义缓存生成 /api/vibe 的结果"""
+    async def generate():
+        return json.loads(await kimi.generate(build_vibe_prompt(state, query)))
+    return await vibe_cache.get_or_compute(
+        query, generate, context=vibe_cache_context(state), cacheable=is_valid_vibe_result
+    )
+
+async def save_vibe_result(crud: AsyncDialogCRUD, query: str, res: Dict, session_id: str = DEFAULT_SESSION_ID):
+    """校验生成结果格式并写入对话记录"""
+    # check if format good
+    if not is_valid_vibe_result(res):
+        raise Exception('生成格式错误...')
+    await crud.insert_dialog(
+        message=query,
+        intend_title=res['intent']['title'],
+        intend_attrs=res['intent']['attrs'],
+        intend_stop_words=res['intent']['stop_words'],
+        reply=res['message'],
+        session_id=session_id
+    )
+    # 压缩在响应之后进行，不增加本轮延迟
+    task = asyncio.create_task(compactor.compact_dialog(crud, session_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+@app.get("/api/vibe")
+async def vibe(query: Optional[str] = None, session_id: str = DEFAULT_SESSION_ID):
+    crud = AsyncDialogCRUD()
+    try:
+      # agent
+      pass
+    except:
+      pass
+    try:
+        res = await generate_vibe(await crud.get_dialog_state(session_id), query)
+        await save_vibe_result(crud, query, res, session_id)
         res['status'] = 0
         return res
     except Exception as e:
       print(e)
       return {'status': 500, 'message': "vibe 不了一点，请再试试吧！"}
 
+async def vibe_events(query: str, session_id: str = DEFAULT_SESSION_ID):
+    """
+    流式生成 /api/vibe 的结果
+
+    Yields:
+        (事件名, 数据)：intent 解析完成时推送 intent，生成过程中逐段推送 message，
+        结束并写入对话记录后推送 done；出错时推送 error
+    """
+    crud = AsyncDialogCRUD()
+    parser = IntentStreamParser()
+    try:
+        state = await crud.get_dialog_state(session_id)
+        context = vibe_cache_context(state)
+        # 与 SemanticCache.get_or_compute 一致：缓存不可用时直接调用模型
+        try:
+            res = await vibe_cache.get(query, context)
+        except Exception as e:
+            logger.warning(f"语义缓存查询失败，直接调用: {e}")
+            res = None
+        if res is not None:
+            yield "intent", res['intent']
+            yield "message", res['message']
+        else:
+            async for delta in kimi.stream(build_vibe_prompt(state, query)):
+                for event in parser.feed(delta):
+                    yield event
+            res = parser.result()
+            if is_valid_vibe_result(res):
+                try:
+                    await vibe_cache.put(query, res, context)
+                except Exception as e:
+                    logger.warning(f"语义缓存写入失败: {e}")
+        await save_vibe_result(crud, query, res, session_id)
+        res['status'] = 0
+        yield "done", res
+    except Exception as e:
+        print(e)
+        yield "error", {'status': 500, 'message': "vibe 不了一点，请再试试吧！"}
+
+@app.get("/api/vibe/stream")
+async def vibe_stream(query: str, session_id: str = DEFAULT_SESSION_ID):
+    """以 SSE 推送 /api/vibe 的生成过程"""
+    async def sse():
+        async for event, data in vibe_events(query, session_id):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return StreamingResponse(sse(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.websocket("/ws/vibe")
+async def vibe_websocket(websocket: WebSocket):
+    """以 WebSocket 推送 /api/vibe 的生成过程，客户端每次发送 {"query": "...", "session_id": "..."}"""
+    await websocket.accept()
+    try:
+        while True:
+            # 格式不正确的消息只回复 error 事件，不断开连接
+            try:
+                request = json.loads(await websocket.receive_text())
+            except json.JSONDecodeError:
+                request = None
+            if not (isinstance(request, dict) and isinstance(request.get('query', ''), str)
+                    and isinstance(request.get('session_id', DEFAULT_SESSION_ID), str)):
+                await websocket.send_json({"event": "error", "data": {
+                    'status': 400, 'message': '消息应为 {"query": "...", "session_id": "..."}'
+                }})
+                continue
+            async for event, data in vibe_events(request.get('query', ''), request.get('session_id', DEFAULT_SESSION_ID)):
+                await websocket.send_json({"event": event, "data": data})
+    except WebSocketDisconnect:
+        pass
+
+@app.get("/api/vibe/products")
+async def vibe_products(query: str, session_id: str = DEFAULT_SESSION_ID):
+    """
+    合并 /api/vibe 与 /api/products：对话状态一次往返读取，意图更新与商品检索并发进行
+
+    检索先以原有意图（无历史意图时为用户消息）推测 query 提前发起；
+    新意图生成后若 query 不变则直接复用结果，否则取消推测检索并按新 query 重新检索。
+    """
+    crud = AsyncDialogCRUD()
+    retrieval = None
+    try:
+        state = await crud.get_dialog_state(session_id)
+        intent_info = state['intent_info']
+        if intent_info:
+            speculative_query = intent_query(intent_info['intend_title'], intent_info['intend_attrs'])
+        else:
+            speculative_query = query
+        retrieval = asyncio.create_task(weaviate_query.aquery(speculative_query))
+
+        res = await generate_vibe(state, query)
+        await save_vibe_result(crud, query, res, session_id)
+
+        res['query'] = intent_query(res['intent']['title'], res['intent']['attrs'])
+        res['speculative_hit'] = res['query'] == speculative_query
+        if not res['speculative_hit']:
+            retrieval.cancel()
+            retrieval = asyncio.create_task(weaviate_query.aquery(res['query']))
+        res['threas'] = format_threads(await retrieval)
+        res['status'] = 0
+        return res
+    except Exception as e:
+        print(e)
+        return {'status': 500, 'message': "vibe 不了一点，请再试试吧！"}
+    finally:
+        if retrieval is not None and not retrieval.done():
+            retrieval.cancel()
+
 @app.post("/api/clear")
 async def clear():
     return {
@@ -182,21 +394,25 @@ async def clear():
 @app.get("/api/thread")
 async def thread(tid: int):
     try:
-        prompt  = """
-        ===
-        请你担任一名专业的商品导购，商场提出两点和场景点，我会给你商品的详细描述，请根据描述生成一个商品的简要概述，其中请考虑用户会如何做决策，不多于 50 字。
-""".strip()
         print(tid)
-        good = query_good(tid)
-        desc = kimi.generate(good['detail'] + prompt)
-        
+        # 预计算的商品卡片与概述直接返回，只有未命中时才查询 Weaviate
+        product = summary_cache.lookup_product(tid, SUMMARY_PROMPT_VERSION)
+        if product is None:
+            good = await weaviate_query.aquery_good(tid)
+            desc = await summary_cache.get_or_create(
+                tid, good['detail'], SUMMARY_PROMPT_VERSION,
+                lambda: kimi.generate(build_summary_prompt(good['detail']))
+            )
+            summary_cache.put_product(tid, good['detail'], good['name'], good['picUrl'], good['price'])
+            product = {"title": good['name'], "pic_url": good['picUrl'], "price": good['price'], "summary": desc}
+
         return {
-          "title": good['name'],
-          "pic_url": good['picUrl'],
-          "price": good['price'],
+          "title": product['title'],
+          "pic_url": product['pic_url'],
+          "price": product['price'],
           "dchain": {
               "id": tid,
-              "description": desc
+              "description": product['summary']
           },
           "reference_links": [],
           "status": 0
@@ -206,64 +422,22 @@ async def thread(tid: int):
         return {'status': 500, 'message': "商品不存在"}
 
 @app.get("/api/products")
-async def products():
-    crud = DialogCRUD()
+async def products(session_id: str = DEFAULT_SESSION_ID):
+    crud = AsyncDialogCRUD()
     try:
       # agent
       pass
     except:
       pass
     try:
-        prompt = """
-你是一位 weaviate 专家，正在辅助一位电商导购筛选和获取商品列表。weaviate 中存储的是商品的详细描述信息，导购会将用户的历史对话信息提供给你，其中包含短关键词及长句。导购也可能会为你提供当前用户的子类目，你需要理解并识别用户的主要选购意图，并且拆解出用于执行 weaviate 的 query，并且解析出一些关键词，用于过滤用户不想要的商品。
-
-## 输出示例及格式
-```
-{
-  "query": "小米充电宝白色"
-  "stop_words": ["黑色"]
-}
-```
-
-## 注意事项
-请严格按照输出示例的格式输出，不能有任何额外的内容。
-""".strip()
-        all_messages = '\n'.join(crud.get_all_messages())
-        if all_messages:
-            prompt += "\n\n## 历史对话信息" + all_messages
-        intent_info = crud.get_last_intent_info()
-        if intent_info:
-            prompt += "\n\n## 原有意图识别结果\n子类目：" + intent_info['intend_title']
-            prompt += '\n属性：' + ','.join(intent_info['intend_attrs'])
-            prompt += '\停用词：' + ','.join(intent_info['intend_stop_words'])
-        res = kimi.generate(prompt)
+        prompt = build_products_prompt(await crud.get_dialog_state(session_id))
+        res = await kimi.generate(prompt)
         res = json.loads(res)
         # check if format good
         if 'query' not in res or 'stop_words' not in res:
             raise Exception('生成格式错误...')
-        res_list = weaviate_query.query(res['query'])
-        res["threas"] = []
-        for item in res_list:
-            item = item.properties
-            res["threas"].append(
-                {
-                    "id": item['goodId'],
-                    "good": {
-                        "id": 0,
-                        "title": item['name'],
-                        "pic_url": item['picUrl'],
-                        "brand": item['brandName'],
-                        "category": item['catagory'],
-                        "categoryColor": item['subCatagory'],
-                        "price": item['price']
-                    },
-                    "dchain": {
-                        "tbn_url": "",
-                        "user_nick": "test_user",
-                        "user_pic_url": ""
-                    }
-                }
-            )
+        res_list = await weaviate_query.aquery(res['query'])
+        res["threas"] = format_threads(res_list)
         res['status'] = 0
         return res
     except Exception as e:
@@ -19,15 +19,24 @@
 
 import os
 import json
+import hashlib
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import numpy as np
 from transformers import AutoTokenizer, AutoModel
 import torch
 
+try:
+    from tools.pgvector_params import (
+        apply_search_params, choose_hnsw_params, choose_ivfflat_lists, search_params
+    )
+except ImportError:  # 在 tools 目录下直接运行脚本
+    from pgvector_params import apply_search_params, choose_hnsw_params, choose_ivfflat_lists, search_params
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -148,6 +157,8 @@ class PGVectorDB:
                 pic_url TEXT,
                 detail TEXT,
                 embedding vector({vector_dim}),
+                good_key VARCHAR(64),
+                content_hash CHAR(64),
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
@@ -155,14 +166,12 @@ class PGVectorDB:
             
             self.cursor.execute(create_table_sql)
             
-            # 创建向量索引
-            index_sql = """
-            CREATE INDEX IF NOT EXISTS goods_embedding_idx 
-            ON goods USING ivfflat (embedding vector_cosine_ops) 
-            WITH (lists = 100);
-            """
-            
-            self.cursor.execute(index_sql)
+            # 兼容旧表：补充增量同步所需的列，good_key 为商品文件夹名
+            self.cursor.execute("ALTER TABLE goods ADD COLUMN IF NOT EXISTS good_key VARCHAR(64);")
+            self.cursor.execute("ALTER TABLE goods ADD COLUMN IF NOT EXISTS content_hash CHAR(64);")
+            self.cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS goods_good_key_idx ON goods (good_key);")
+            # 向量索引在数据导入完成后由 build_vector_index 创建，
+            # 空表上建 ivfflat 索引会得到无意义的聚类中心，并拖慢每次插入
             self.conn.commit()
             logger.info("商品表创建成功")
             
@@ -171,68 +180,284 @@ class PGVectorDB:
             self.conn.rollback()
             raise
     
-    def insert_good(self, good_data: Dict, embedding: np.ndarray):
-        """插入商品数据
+    def insert_goods_batch(self, goods: List[Dict], embeddings: np.ndarray, page_size: int = 500):
+        """批量写入商品数据（不提交事务，由调用方控制提交时机）
+        
+        good_key 已存在的行会被原地更新，用于内容变化后的重新嵌入。
         
         Args:
-            good_data: 商品数据字典
-            embedding: 商品嵌入向量
+            goods: 商品数据字典列表（需包含 good_key 与 content_hash）
+            embeddings: 与商品一一对应的嵌入向量矩阵
+            page_size: 每条 INSERT 语句携带的行数
         """
-        try:
-            insert_sql = """
-            INSERT INTO goods (
-                good_short_name, price, brand_name, catagory_full, 
-                sub_catagory, item_catagory, pic_url, detail, embedding
-            ) VALUES (
-                %(good_short_name)s, %(price)s, %(brand_name)s, %(catagory_full)s,
-                %(sub_catagory)s, %(item_catagory)s, %(pic_url)s, %(detail)s, %(embedding)s
+        rows = [
+            (
+                good.get('good_short_name'), good.get('price'), good.get('brand_name'),
+                good.get('catagory_full'), good.get('sub_catagory'), good.get('item_catagory'),
+                good.get('pic_url'), good.get('detail'),
+                # pgvector 接受 '[x,y,...]' 文本格式
+                '[' + ','.join(map(repr, embedding.tolist())) + ']',
+                good.get('good_key'), good.get('content_hash')
             )
+            for good, embedding in zip(goods, embeddings)
+        ]
+        execute_values(
+            self.cursor,
             """
+            INSERT INTO goods (
+                good_short_name, price, brand_name, catagory_full,
+                sub_catagory, item_catagory, pic_url, detail, embedding,
+                good_key, content_hash
+            ) VALUES %s
+            ON CONFLICT (good_key) DO UPDATE SET
+                good_short_name = EXCLUDED.good_short_name,
+                price = EXCLUDED.price,
+                brand_name = EXCLUDED.brand_name,
+                catagory_full = EXCLUDED.catagory_full,
+                sub_catagory = EXCLUDED.sub_catagory,
+                item_catagory = EXCLUDED.item_catagory,
+                pic_url = EXCLUDED.pic_url,
+                detail = EXCLUDED.detail,
+                embedding = EXCLUDED.embedding,
+                content_hash = EXCLUDED.content_hash,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            rows,
+            template="(%s, %s, %s, %s, %s, %s, %s, %s, %s::vector, %s, %s)",
+            page_size=page_size
+        )
+    
+    def fetch_content_hashes(self) -> Dict[str, str]:
+        """获取已导入商品的内容哈希
+        
+        Returns:
+            {good_key: content_hash}
+        """
+        self.cursor.execute("SELECT good_key, content_hash FROM goods WHERE good_key IS NOT NULL;")
+        return {row['good_key']: row['content_hash'] for row in self.cursor.fetchall()}
+    
+    def delete_goods(self, good_keys: List[str]) -> int:
+        """删除指定商品（不提交事务）
+        
+        Args:
+            good_keys: 待删除的 good_key 列表
             
-            # 将 numpy 数组转换为列表
-            good_data['embedding'] = embedding.tolist()
+        Returns:
+            删除的行数
+        """
+        if not good_keys:
+            return 0
+        self.cursor.execute("DELETE FROM goods WHERE good_key = ANY(%s);", (list(good_keys),))
+        return self.cursor.rowcount
+    
+    def delete_unkeyed_goods(self) -> int:
+        """删除没有 good_key 的旧版数据（不提交事务）"""
+        self.cursor.execute("DELETE FROM goods WHERE good_key IS NULL;")
+        return self.cursor.rowcount
+    
+    def commit(self):
+        """提交当前事务"""
+        self.conn.commit()
+    
+    def rollback(self):
+        """回滚当前事务"""
+        self.conn.rollback()
+    
+    def has_vector_index(self) -> bool:
+        """检查向量索引是否存在"""
+        self.cursor.execute("SELECT to_regclass('goods_embedding_idx') IS NOT NULL AS exists;")
+        return self.cursor.fetchone()['exists']
+    
+    def count_goods(self) -> int:
+        """获取商品表行数"""
+        self.cursor.execute("SELECT COUNT(*) AS total FROM goods;")
+        return self.cursor.fetchone()['total']
+    
+    def build_vector_index(self, method: str = "ivfflat", row_count: Optional[int] = None) -> Dict:
+        """在数据导入完成后（重新）创建向量索引，参数按行数确定
+        
+        Args:
+            method: 索引类型，ivfflat 或 hnsw
+            row_count: 表行数，为 None 时实时统计
             
-            self.cursor.execute(insert_sql, good_data)
+        Returns:
+            索引参数，例如 {'method': 'ivfflat', 'lists': 100, 'probes': 10}
+        """
+        if row_count is None:
+            row_count = self.count_goods()
+        
+        if method == "ivfflat":
+            lists = choose_ivfflat_lists(row_count)
+            params = {'method': method, 'lists': lists}
+            with_clause = f"lists = {lists}"
+        elif method == "hnsw":
+            m, ef_construction = choose_hnsw_params(row_count)
+            params = {'method': method, 'm': m, 'ef_construction': ef_construction}
+            with_clause = f"m = {m}, ef_construction = {ef_construction}"
+        else:
+            raise ValueError(f"不支持的索引类型: {method}")
+        # 附上默认查询参数（与 test_semantic_search 的规则相同）
+        params.update(search_params(params))
+        
+        try:
+            self.cursor.execute("DROP INDEX IF EXISTS goods_embedding_idx;")
+            self.cursor.execute(f"""
+            CREATE INDEX goods_embedding_idx 
+            ON goods USING {method} (embedding vector_cosine_ops) 
+            WITH ({with_clause});
+            """)
+            self.cursor.execute("ANALYZE goods;")
             self.conn.commit()
-            logger.info(f"成功插入商品: {good_data['good_short_name']}")
-            
+            logger.info(f"向量索引创建成功: {params}（{row_count} 行）")
+            return params
         except Exception as e:
-            logger.error(f"插入商品失败: {e}")
+            logger.error(f"创建向量索引失败: {e}")
             self.conn.rollback()
             raise
     
-    def check_good_exists(self, good_short_name: str) -> bool:
-        """检查商品是否已存在
+    def measure_recall(self, params: Dict, k: int = 10, sample_size: int = 50) -> float:
+        """以表中随机商品的向量为查询，比较索引查询与精确扫描的 recall@k
         
         Args:
-            good_short_name: 商品短名称
+            params: build_vector_index 返回的索引参数，查询参数按 k 与语义搜索相同的规则确定
+            k: 每次查询返回的结果数
+            sample_size: 查询样本数
             
         Returns:
-            是否存在
+            平均召回率
         """
+        search_sql = "SELECT id FROM goods ORDER BY embedding <=> %s::vector LIMIT %s;"
+        self.cursor.execute("SELECT embedding::text AS embedding FROM goods ORDER BY random() LIMIT %s;", (sample_size,))
+        queries = [row['embedding'] for row in self.cursor.fetchall()]
+        if not queries:
+            return 1.0
+        
+        recalls = []
         try:
-            self.cursor.execute(
-                "SELECT id FROM goods WHERE good_short_name = %s",
-                (good_short_name,)
-            )
-            return self.cursor.fetchone() is not None
-        except Exception as e:
-            logger.error(f"检查商品存在性失败: {e}")
-            return False
+            for query in queries:
+                self.cursor.execute("SET LOCAL enable_indexscan = off;")
+                self.cursor.execute(search_sql, (query, k))
+                exact = {row['id'] for row in self.cursor.fetchall()}
+                self.cursor.execute("SET LOCAL enable_indexscan = on;")
+                apply_search_params(self.cursor, search_params(params, k, params.get('probes')))
+                self.cursor.execute(search_sql, (query, k))
+                approx = {row['id'] for row in self.cursor.fetchall()}
+                recalls.append(len(exact & approx) / len(exact) if exact else 1.0)
+        finally:
+            self.conn.rollback()
+        
+        recall = sum(recalls) / len(recalls)
+        logger.info(f"索引召回率 recall@{k}: {recall:.3f}（{len(recalls)} 个查询）")
+        return recall
+
+def folder_signature(good_folder: Path) -> int:
+    """商品文件夹的修改签名（数据文件的最大 mtime），用于判断断点记录是否仍然有效"""
+    signature = 0
+    for name in ("clean_data.json", "detail.txt"):
+        try:
+            signature = max(signature, (good_folder / name).stat().st_mtime_ns)
+        except FileNotFoundError:
+            pass
+    return signature
+
+class ImportCheckpoint:
+    """导入断点文件，记录被中断的导入中已完成（已提交）的商品文件夹
+    
+    断点只用于续传被中断的导入：每次完整跑完都会清除断点，
+    失败的商品文件夹单独记录在 <断点文件名>.failed.json 中。
+    """
+    
+    def __init__(self, path: Optional[str]):
+        """初始化断点
+        
+        Args:
+            path: 断点文件路径，为 None 时不记录断点
+        """
+        self.path = Path(path) if path else None
+        self.failed_path = self.path.with_name(self.path.stem + '.failed.json') if self.path else None
+        # 文件夹名 -> 提交时的 folder_signature
+        self.done: Dict[str, int] = {}
+        if self.path and self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                done = json.load(f).get('done', {})
+            # 旧格式（文件夹名列表）无法判断文件是否被修改过，直接丢弃
+            if isinstance(done, dict):
+                self.done = done
+            logger.info(f"从断点恢复，已完成 {len(self.done)} 个商品")
+    
+    def is_done(self, folder_name: str, signature: int) -> bool:
+        """文件夹是否已在被中断的导入中提交，且之后未被修改"""
+        return self.done.get(folder_name) == signature
+    
+    def mark_done(self, signatures: Dict[str, int]):
+        """记录一批已提交的商品并落盘
+        
+        Args:
+            signatures: {文件夹名: folder_signature}
+        """
+        if not self.path:
+            return
+        self.done.update(signatures)
+        self._write(self.path, {'done': self.done})
+    
+    def record_failures(self, folder_names: List[str]):
+        """记录本次导入失败的商品文件夹（没有失败时删除记录）"""
+        if not self.failed_path:
+            return
+        if folder_names:
+            self._write(self.failed_path, {'failed': sorted(folder_names)})
+        elif self.failed_path.exists():
+            self.failed_path.unlink()
+    
+    def clear(self):
+        """一次导入跑完后删除断点文件"""
+        self.done = {}
+        if self.path and self.path.exists():
+            self.path.unlink()
+    
+    @staticmethod
+    def _write(path: Path, data: Dict):
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        # 原子替换，避免中断时写出半个文件
+        os.replace(tmp_path, path)
 
 class GoodsImporter:
     """商品导入器"""
     
-    def __init__(self, goods_dir: str, db_params: Dict[str, str]):
+    def __init__(
+        self,
+        goods_dir: str,
+        db_params: Dict[str, str],
+        batch_size: int = 32,
+        chunk_size: int = 1024,
+        commit_every: int = 2048,
+        max_workers: int = 8,
+        checkpoint_path: Optional[str] = "import_goods.checkpoint.json",
+        index_method: str = "ivfflat"
+    ):
         """初始化导入器
         
         Args:
             goods_dir: 商品数据目录
             db_params: 数据库连接参数
+            batch_size: 单次模型编码的文本数
+            chunk_size: 流水线每轮读取的商品文件夹数
+            commit_every: 累计插入多少行后提交一次事务
+            max_workers: 解析商品文件夹的线程数
+            checkpoint_path: 断点文件路径，为 None 时不支持断点续传
+            index_method: 导入完成后创建的向量索引类型，ivfflat 或 hnsw
         """
         self.goods_dir = Path(goods_dir)
         self.db = PGVectorDB(db_params)
         self.embedding_model = QwenEmbedding()
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.commit_every = commit_every
+        self.max_workers = max_workers
+        self.checkpoint = ImportCheckpoint(checkpoint_path)
+        self.index_method = index_method
         
     def load_good_data(self, good_folder: Path) -> Optional[Dict]:
         """加载单个商品数据
@@ -290,11 +515,86 @@ class GoodsImporter:
         # 过滤空字符串并连接
         return ' '.join(filter(None, text_parts))
     
+    def compute_content_hash(self, good_data: Dict) -> str:
+        """计算商品内容哈希，覆盖嵌入文本及其余写入数据库的字段
+        
+        Args:
+            good_data: 商品数据
+            
+        Returns:
+            SHA-256 十六进制字符串
+        """
+        payload = json.dumps(
+            [self.create_embedding_text(good_data)] + [good_data.get(field, '') for field in ('price', 'pic_url')],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def iter_loaded_chunks(self, good_folders: List[Path]) -> Iterator[List[tuple]]:
+        """在线程池中并行解析商品文件夹，按块产出 (文件夹, 商品数据)
+        
+        产出当前块之前先提交下一块的解析任务，调用方编码、写入当前块时
+        线程池已在解析下一块；同一时刻最多有两块数据驻留内存。
+        
+        Args:
+            good_folders: 待处理的商品文件夹
+            
+        Yields:
+            每块最多 chunk_size 个 (文件夹, 商品数据或 None)
+        """
+        chunks = [good_folders[start:start + self.chunk_size] for start in range(0, len(good_folders), self.chunk_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            def submit(chunk):
+                return [pool.submit(self.load_good_data, folder) for folder in chunk]
+            
+            next_futures = submit(chunks[0]) if chunks else []
+            for i, chunk in enumerate(chunks):
+                futures = next_futures
+                next_futures = submit(chunks[i + 1]) if i + 1 < len(chunks) else []
+                yield list(zip(chunk, (future.result() for future in futures)))
+    
+    def encode_bucketed(self, texts: List[str]) -> np.ndarray:
+        """按长度分桶批量编码，减少 padding 浪费
+        
+        Args:
+            texts: 待编码文本
+            
+        Returns:
+            与输入顺序一致的向量矩阵
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            vectors = self.embedding_model.encode([texts[i] for i in batch])
+            for i, vector in zip(batch, vectors):
+                embeddings[i] = vector
+        return np.stack(embeddings)
+    
+    def build_index(self, measure_recall: bool = True) -> Dict:
+        """（重新）创建向量索引并报告相对精确扫描的召回率
+        
+        Args:
+            measure_recall: 是否测量召回率
+            
+        Returns:
+            索引参数（包含 recall）
+        """
+        params = self.db.build_vector_index(self.index_method)
+        if measure_recall:
+            params['recall'] = self.db.measure_recall(params)
+        return params
+    
     def import_all_goods(self, skip_existing: bool = True):
         """导入所有商品
         
+        文件夹解析、批量编码、批量写入以流水线方式分块进行，
+        每次提交后记录断点，中断后重新运行会跳过已提交且之后未被修改的商品；
+        完整跑完一次后清除断点，失败的商品单独记录，下次运行会重新尝试。
+        以内容哈希做增量同步：只嵌入新增或内容变化的商品，并删除目录中已移除的商品。
+        
         Args:
-            skip_existing: 是否跳过已存在的商品
+            skip_existing: 是否跳过内容未变化的商品，为 False 时全部重新嵌入
         """
         try:
             # 连接数据库
@@ -307,45 +607,92 @@ class GoodsImporter:
             logger.info(f"向量维度: {vector_dim}")
             
             self.db.create_table(vector_dim)
+            # 即使全部重新嵌入，也需要已有的 good_key 来删除目录中已移除的商品
+            known_hashes = self.db.fetch_content_hashes()
             
             # 遍历商品文件夹
-            good_folders = [d for d in self.goods_dir.iterdir() if d.is_dir()]
+            good_folders = sorted(d for d in self.goods_dir.iterdir() if d.is_dir())
             logger.info(f"找到 {len(good_folders)} 个商品文件夹")
+            signatures = {d.name: folder_signature(d) for d in good_folders}
+            pending_folders = [d for d in good_folders if not self.checkpoint.is_done(d.name, signatures[d.name])]
+            skip_count = len(good_folders) - len(pending_folders)
             
             success_count = 0
-            skip_count = 0
-            error_count = 0
+            failed: List[str] = []
+            write_errors = 0
+            uncommitted: Dict[str, int] = {}
+            uncommitted_inserts: List[str] = []
             
-            for good_folder in good_folders:
-                try:
-                    # 加载商品数据
-                    good_data = self.load_good_data(good_folder)
+            for chunk in self.iter_loaded_chunks(pending_folders):
+                goods = []
+                folder_names = []
+                for good_folder, good_data in chunk:
                     if not good_data:
-                        error_count += 1
+                        failed.append(good_folder.name)
                         continue
-                    
-                    # 检查是否已存在
-                    if skip_existing and self.db.check_good_exists(good_data['good_short_name']):
-                        logger.info(f"商品已存在，跳过: {good_data['good_short_name']}")
+                    good_data['good_key'] = good_folder.name
+                    good_data['content_hash'] = self.compute_content_hash(good_data)
+                    # 内容未变化的商品无需重新嵌入
+                    if skip_existing and known_hashes.get(good_folder.name) == good_data['content_hash']:
                         skip_count += 1
+                        uncommitted[good_folder.name] = signatures[good_folder.name]
                         continue
-                    
-                    # 创建嵌入文本
-                    embedding_text = self.create_embedding_text(good_data)
-                    
-                    # 生成嵌入向量
-                    embedding = self.embedding_model.encode([embedding_text])[0]
-                    
-                    # 插入数据库
-                    self.db.insert_good(good_data, embedding)
-                    success_count += 1
-                    
-                except Exception as e:
-                    logger.error(f"处理商品失败 {good_folder.name}: {e}")
-                    error_count += 1
-                    continue
+                    goods.append(good_data)
+                    folder_names.append(good_folder.name)
+                
+                if goods:
+                    try:
+                        embeddings = self.encode_bucketed([self.create_embedding_text(g) for g in goods])
+                        self.db.insert_goods_batch(goods, embeddings)
+                        success_count += len(goods)
+                        uncommitted_inserts.extend(folder_names)
+                        uncommitted.update((name, signatures[name]) for name in folder_names)
+                    except Exception as e:
+                        # 回滚会丢弃上次提交以来的全部写入，这些商品未记入断点，下次运行会重新导入
+                        logger.error(f"批量写入失败，回滚未提交的写入: {e}")
+                        self.db.rollback()
+                        failed.extend(folder_names + uncommitted_inserts)
+                        write_errors += len(folder_names) + len(uncommitted_inserts)
+                        success_count -= len(uncommitted_inserts)
+                        uncommitted = {}
+                        uncommitted_inserts = []
+                        continue
+                
+                if len(uncommitted) >= self.commit_every:
+                    self.db.commit()
+                    self.checkpoint.mark_done(uncommitted)
+                    uncommitted = {}
+                    uncommitted_inserts = []
+                
+                logger.info(f"进度 - 成功: {success_count}, 跳过: {skip_count}, 错误: {len(failed)}")
+            
+            # 删除目录中已移除的商品，以及没有 good_key 的旧版数据；
+            # 写入失败时保留旧版数据，避免这些商品在表中完全消失
+            current_keys = {d.name for d in good_folders}
+            delete_count = self.db.delete_goods([key for key in known_hashes if key not in current_keys])
+            if write_errors == 0:
+                delete_count += self.db.delete_unkeyed_goods()
+            
+            self.db.commit()
+            # 本次导入已跑完：清除断点，失败的商品单独记录，下次运行重新尝试
+            self.checkpoint.clear()
+            self.checkpoint.record_failures(failed)
+            
+            logger.info(
+                f"导入完成 - 新增/更新: {success_count}, 未变化: {skip_count}, "
+                f"删除: {delete_count}, 错误: {len(failed)}"
+            )
+            if failed and self.checkpoint.failed_path:
+                logger.warning(f"失败的商品已记录到 {self.checkpoint.failed_path}")
             
-            logger.info(f"导入完成 - 成功: {success_count}, 跳过: {skip_count}, 错误: {error_count}")
+            # 数据就绪后再建索引，使聚类中心反映真实数据分布；
+            # 增量变化较小时沿用已有索引，避免每次同步都全量重建
+            changed = success_count + delete_count
+            total = self.db.count_goods()
+            if total == 0:
+                logger.warning("表中没有商品，跳过向量索引创建")
+            elif not self.db.has_vector_index() or changed * 10 >= total:
+                self.build_index()
             
         except Exception as e:
             logger.error(f"导入过程失败: {e}")
@@ -0,0 +1,61 @@
+"""
+pgvector 向量索引的建索引与查询参数
+导入工具（建索引、测量召回率）与语义搜索脚本共用同一套规则，
+保证导入后报告的召回率与实际查询所用的参数一致
+"""
+
+from typing import Dict, Optional
+
+
+def choose_ivfflat_lists(row_count: int) -> int:
+    """按 pgvector 的建议确定 ivfflat 的 lists：100 万行以内取 rows/1000，以上取 sqrt(rows)"""
+    if row_count <= 1_000_000:
+        return max(1, row_count // 1000)
+    return int(row_count ** 0.5)
+
+
+def choose_ivfflat_probes(lists: int) -> int:
+    """查询时的 ivfflat.probes，取 sqrt(lists)"""
+    return max(1, round(lists ** 0.5))
+
+
+def choose_hnsw_params(row_count: int) -> tuple:
+    """按行数确定 hnsw 的 (m, ef_construction)"""
+    if row_count <= 100_000:
+        return 16, 64
+    if row_count <= 1_000_000:
+        return 24, 100
+    return 32, 200
+
+
+def choose_hnsw_ef_search(limit: int) -> int:
+    """查询时的 hnsw.ef_search，至少为返回数量的 2 倍"""
+    return max(40, 2 * limit)
+
+
+def search_params(index_params: Dict, limit: int = 10, probes: Optional[int] = None) -> Dict:
+    """
+    由索引参数得到查询参数
+
+    Args:
+        index_params: 索引类型与建索引参数，例如 {'method': 'ivfflat', 'lists': 100}
+        limit: 查询返回的结果数
+        probes: 指定 ivfflat.probes，为 None 时取 sqrt(lists)
+
+    Returns:
+        可传给 apply_search_params 的参数，例如 {'method': 'ivfflat', 'probes': 10}
+    """
+    method = index_params.get('method')
+    if method == 'ivfflat':
+        return {'method': method, 'probes': probes or choose_ivfflat_probes(index_params.get('lists', 100))}
+    if method == 'hnsw':
+        return {'method': method, 'ef_search': choose_hnsw_ef_search(limit)}
+    return {}
+
+
+def apply_search_params(cursor, params: Dict):
+    """在当前事务内设置向量索引的查询参数"""
+    if params.get('method') == 'ivfflat':
+        cursor.execute("SET LOCAL ivfflat.probes = %s;", (params['probes'],))
+    elif params.get('method') == 'hnsw':
+        cursor.execute("SET LOCAL hnsw.ef_search = %s;", (params['ef_search'],))
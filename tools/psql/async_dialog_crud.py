@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dialog 表异步 CRUD 操作
+
+与 DialogCRUD 接口一致的 async 版本，基于 asyncpg 连接池：
+进程内共享一个连接池，语句由连接级缓存自动预编译，
+get_dialog_state 在一次往返中同时取回滚动摘要、最近若干轮消息与最近一次意图。
+所有读写均按 session_id 隔离。
+
+使用环境变量配置数据库连接（与 dialog_crud.py 相同）。
+"""
+
+import asyncio
+import logging
+import os
+import uuid
+from typing import Any, Dict, List, Optional
+
+import asyncpg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# 数据库配置
+db_config = {
+    'host': os.getenv('POSTGRESQL_HOST', 'localhost'),
+    'port': os.getenv('POSTGRESQL_PORT', '5432'),
+    'database': os.getenv('POSTGRESQL_NAME', 'postgres'),
+    'user': os.getenv('POSTGRESQL_USER', 'postgres'),
+    'password': os.getenv('POSTGRESQL_PASSWORD', 'password')
+}
+
+# 连接池大小
+POOL_MIN_SIZE = int(os.getenv('POSTGRESQL_POOL_MIN_SIZE', '1'))
+POOL_MAX_SIZE = int(os.getenv('POSTGRESQL_POOL_MAX_SIZE', '10'))
+
+# 未指定会话时使用的默认会话
+DEFAULT_SESSION_ID = 'default'
+# 提示词中保留的最近轮数，更早的轮次由 dialog_summary 中的滚动摘要代替
+DIALOG_WINDOW = int(os.getenv('DIALOG_WINDOW', '10'))
+
+INSERT_DIALOG_SQL = """
+    INSERT INTO dialog (uuid, session_id, message, reply, intend_title, intend_attrs, intend_stop_words)
+    VALUES ($1, $2, $3, $4, $5, $6, $7)
+"""
+
+SELECT_MESSAGES_SQL = """
+    SELECT message
+    FROM dialog
+    WHERE session_id = $1 AND message IS NOT NULL
+    ORDER BY created_at ASC
+"""
+
+SELECT_LAST_INTENT_SQL = """
+    SELECT id, uuid, intend_title, intend_attrs, intend_stop_words, created_at
+    FROM dialog
+    WHERE session_id = $1
+    ORDER BY created_at DESC
+    LIMIT 1
+"""
+
+# 滚动摘要、摘要之后的最近 $2 条消息与最近一次意图合并为一条语句，
+# 均走 (session_id, created_at) 索引，读取量与会话长度无关
+SELECT_DIALOG_STATE_SQL = """
+    WITH s AS (
+        SELECT summary, last_dialog_id FROM dialog_summary WHERE session_id = $1
+    )
+    SELECT
+        (SELECT summary FROM s) AS summary,
+        COALESCE(recent.messages, '{}'::text[]) AS messages,
+        COALESCE(recent.ids, '{}'::int[]) AS message_ids,
+        last.id, last.uuid, last.intend_title, last.intend_attrs, last.intend_stop_words, last.created_at
+    FROM (SELECT 1) AS one
+    LEFT JOIN LATERAL (
+        SELECT array_agg(message ORDER BY created_at ASC) AS messages,
+               array_agg(id ORDER BY created_at ASC) AS ids
+        FROM (
+            SELECT id, message, created_at
+            FROM dialog
+            WHERE session_id = $1 AND message IS NOT NULL
+              AND id > COALESCE((SELECT last_dialog_id FROM s), 0)
+            ORDER BY created_at DESC
+            LIMIT $2
+        ) AS r
+    ) AS recent ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT id, uuid, intend_title, intend_attrs, intend_stop_words, created_at
+        FROM dialog
+        WHERE session_id = $1
+        ORDER BY created_at DESC
+        LIMIT 1
+    ) AS last ON TRUE
+"""
+
+UPSERT_SUMMARY_SQL = """
+    INSERT INTO dialog_summary (session_id, summary, last_dialog_id, updated_at)
+    VALUES ($1, $2, $3, CURRENT_TIMESTAMP)
+    ON CONFLICT (session_id) DO UPDATE
+    SET summary = EXCLUDED.summary, last_dialog_id = EXCLUDED.last_dialog_id, updated_at = CURRENT_TIMESTAMP
+"""
+
+_pool: Optional[asyncpg.Pool] = None
+_pool_lock: Optional[asyncio.Lock] = None
+
+
+async def get_pool() -> asyncpg.Pool:
+    """获取进程内共享的连接池，首次调用时创建"""
+    global _pool, _pool_lock
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                host=db_config['host'],
+                port=int(db_config['port']),
+                database=db_config['database'],
+                user=db_config['user'],
+                password=db_config['password'],
+                min_size=POOL_MIN_SIZE,
+                max_size=POOL_MAX_SIZE,
+            )
+        return _pool
+
+
+async def close_pool():
+    """关闭共享的连接池（应用退出时调用）"""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def _intent_info(row) -> Optional[Dict[str, Any]]:
+    """将最近一次意图的查询结果转换为与 DialogCRUD 相同的字典格式"""
+    if row is None or row['id'] is None:
+        return None
+    return {
+        'id': row['id'],
+        'uuid': row['uuid'],
+        'intend_title': row['intend_title'],
+        'intend_attrs': row['intend_attrs'],
+        'intend_stop_words': row['intend_stop_words'],
+        'created_at': row['created_at']
+    }
+
+
+class AsyncDialogCRUD:
+    """Dialog 表的异步 CRUD 操作类，方法与 DialogCRUD 一一对应"""
+
+    def __init__(self, pool: Optional[asyncpg.Pool] = None):
+        """
+        初始化
+
+        Args:
+            pool: 使用的连接池，为None时使用进程内共享的连接池
+        """
+        self.pool = pool
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        if self.pool is None:
+            self.pool = await get_pool()
+        return self.pool
+
+    async def insert_dialog(self, message: str, reply: str, intend_title: str = None,
+                            intend_attrs: List[str] = None,
+                            intend_stop_words: List[str] = None,
+                            dialog_uuid: str = None,
+                            session_id: str = DEFAULT_SESSION_ID) -> bool:
+        """
+        录入 dialog 记录
+
+        Args:
+            message: 用户消息
+            reply: 系统回复
+            intend_title: 意图标题
+            intend_attrs: 意图属性列表
+            intend_stop_words: 意图停用词列表
+            dialog_uuid: 对话UUID，如果不提供则自动生成
+            session_id: 会话ID
+
+        Returns:
+            bool: 插入是否成功
+        """
+        if not dialog_uuid:
+            dialog_uuid = str(uuid.uuid4())
+        try:
+            pool = await self._get_pool()
+            await pool.execute(
+                INSERT_DIALOG_SQL,
+                dialog_uuid, session_id, message, reply, intend_title, intend_attrs, intend_stop_words
+            )
+            logger.info(f"成功录入 dialog 记录，UUID: {dialog_uuid}")
+            return True
+        except Exception as e:
+            logger.error(f"录入 dialog 失败: {e}")
+            return False
+
+    async def clear_dialog(self, session_id: Optional[str] = None) -> bool:
+        """
+        清空 dialog 记录及滚动摘要
+
+        Args:
+            session_id: 只清空该会话，为None时清空整张表
+
+        Returns:
+            bool: 清空是否成功
+        """
+        try:
+            pool = await self._get_pool()
+            async with pool.acquire() as conn, conn.transaction():
+                if session_id is None:
+                    await conn.execute("TRUNCATE TABLE dialog, dialog_summary RESTART IDENTITY")
+                else:
+                    await conn.execute("DELETE FROM dialog WHERE session_id = $1", session_id)
+                    await conn.execute("DELETE FROM dialog_summary WHERE session_id = $1", session_id)
+            logger.info(f"成功清空 dialog 记录，会话: {session_id or '全部'}")
+            return True
+        except Exception as e:
+            logger.error(f"清空 dialog 表失败: {e}")
+            return False
+
+    async def get_all_messages(self, session_id: str = DEFAULT_SESSION_ID) -> List[str]:
+        """
+        获取会话中所有的 message
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            List[str]: 按时间顺序排列的消息列表
+        """
+        try:
+            pool = await self._get_pool()
+            rows = await pool.fetch(SELECT_MESSAGES_SQL, session_id)
+            return [row['message'] for row in rows]
+        except Exception as e:
+            logger.error(f"获取所有消息失败: {e}")
+            return []
+
+    async def get_last_intent_info(self, session_id: str = DEFAULT_SESSION_ID) -> Optional[Dict[str, Any]]:
+        """
+        获取会话最后一行的意图信息，格式与 DialogCRUD.get_last_intent_info 相同
+
+        Args:
+            session_id: 会话ID
+
+        Returns:
+            Optional[Dict]: 最后一条记录的意图信息，没有记录时返回 None
+        """
+        try:
+            pool = await self._get_pool()
+            return _intent_info(await pool.fetchrow(SELECT_LAST_INTENT_SQL, session_id))
+        except Exception as e:
+            logger.error(f"获取最后一条意图信息失败: {e}")
+            return None
+
+    async def get_dialog_state(self, session_id: str = DEFAULT_SESSION_ID,
+                               window: Optional[int] = DIALOG_WINDOW) -> Dict[str, Any]:
+        """
+        一次往返获取构造提示词所需的对话状态
+
+        Args:
+            session_id: 会话ID
+            window: 最多返回的最近消息条数（只取滚动摘要尚未覆盖的部分），为None时不限制
+
+        Returns:
+            Dict: {
+                'summary': 较早轮次的滚动摘要，没有时为 None,
+                'messages': 最近的消息列表（按时间顺序）,
+                'message_ids': 与 messages 一一对应的 dialog.id,
+                'intent_info': 与 get_last_intent_info 格式相同的最近一次意图
+            }
+        """
+        try:
+            pool = await self._get_pool()
+            row = await pool.fetchrow(SELECT_DIALOG_STATE_SQL, session_id, window)
+            return {
+                'summary': row['summary'],
+                'messages': list(row['messages']),
+                'message_ids': list(row['message_ids']),
+                'intent_info': _intent_info(row)
+            }
+        except Exception as e:
+            logger.error(f"获取对话状态失败: {e}")
+            return {'summary': None, 'messages': [], 'message_ids': [], 'intent_info': None}
+
+    async def save_summary(self, session_id: str, summary: str, last_dialog_id: int) -> bool:
+        """
+        写入会话的滚动摘要
+
+        Args:
+            session_id: 会话ID
+            summary: 摘要文本
+            last_dialog_id: 摘要已覆盖到的最后一条 dialog.id
+
+        Returns:
+            bool: 写入是否成功
+        """
+        try:
+            pool = await self._get_pool()
+            await pool.execute(UPSERT_SUMMARY_SQL, session_id, summary, last_dialog_id)
+            return True
+        except Exception as e:
+            logger.error(f"写入会话摘要失败: {e}")
+            return False
+
+    async def get_table_info(self) -> Dict[str, Any]:
+        """
+        获取 dialog 表的基本信息
+
+        Returns:
+            Dict: 包含表的统计信息
+        """
+        try:
+            pool = await self._get_pool()
+            row = await pool.fetchrow("""
+                SELECT
+                    COUNT(*) AS total_records,
+                    COUNT(message) AS records_with_message,
+                    COUNT(intend_title) AS records_with_intent,
+                    MIN(created_at) AS earliest_record,
+                    MAX(created_at) AS latest_record
+                FROM dialog
+            """)
+            return dict(row)
+        except Exception as e:
+            logger.error(f"获取表信息失败: {e}")
+            return {}
@@ -7,11 +7,14 @@
 
 表结构:
 - uuid: 唯一标识符
+- session_id: 会话ID，按会话隔离历史
 - message: 用户消息
 - reply: 系统回复
 - intend_title: 意图标题
 - intend_attrs: 意图属性
 - intend_stop_words: 意图停用词
+
+另建 dialog_summary 表保存每个会话较早轮次的滚动摘要。
 """
 
 from dotenv import load_dotenv
@@ -46,6 +49,7 @@ def create_dialog_table():
         CREATE TABLE IF NOT EXISTS dialog (
             id SERIAL PRIMARY KEY,
             uuid VARCHAR(36) NOT NULL UNIQUE,
+            session_id VARCHAR(64) NOT NULL DEFAULT 'default',
             message TEXT,
             reply TEXT,
             intend_title VARCHAR(255),
@@ -67,8 +71,26 @@ def create_dialog_table():
         CREATE INDEX IF NOT EXISTS idx_dialog_intend_title ON dialog(intend_title);
         """
         
+        # 兼容已存在的旧表：补充 session_id 列
+        cursor.execute("ALTER TABLE dialog ADD COLUMN IF NOT EXISTS session_id VARCHAR(64) NOT NULL DEFAULT 'default';")
+
         print("正在创建索引...")
         cursor.execute(index_sql)
+
+        # 会话内按时间窗口读取最近若干轮
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_dialog_session_created_at ON dialog(session_id, created_at);")
+
+        # 每个会话一行滚动摘要，last_dialog_id 为摘要已覆盖到的最后一条 dialog.id
+        summary_table_sql = """
+        CREATE TABLE IF NOT EXISTS dialog_summary (
+            session_id VARCHAR(64) PRIMARY KEY,
+            summary TEXT NOT NULL,
+            last_dialog_id INTEGER NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+        print("正在创建 dialog_summary 表...")
+        cursor.execute(summary_table_sql)
         
         # 创建更新时间触发器
         trigger_sql = """
@@ -94,6 +116,7 @@ def create_dialog_table():
         print("\n表结构:")
         print("- id: 自增主键")
         print("- uuid: 唯一标识符 (VARCHAR(36), UNIQUE)")
+        print("- session_id: 会话ID (VARCHAR(64), 与 created_at 组成复合索引)")
         print("- message: 用户消息 (TEXT)")
         print("- reply: 系统回复 (TEXT)")
         print("- intend_title: 意图标题 (VARCHAR(255))")
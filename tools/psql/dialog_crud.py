@@ -37,6 +37,9 @@ db_config = {
     'password': os.getenv('POSTGRESQL_PASSWORD', 'password')
 }
 
+# 未指定会话时使用的默认会话
+DEFAULT_SESSION_ID = 'default'
+
 class DialogCRUD:
     """Dialog 表的 CRUD 操作类"""
     
@@ -56,7 +59,8 @@ class DialogCRUD:
     def insert_dialog(self, message: str, reply: str, intend_title: str = None, 
                      intend_attrs: List[str] = None, 
                      intend_stop_words: List[str] = None,
-                     dialog_uuid: str = None) -> bool:
+                     dialog_uuid: str = None,
+                     session_id: str = DEFAULT_SESSION_ID) -> bool:
         """
         录入 dialog 记录
         
@@ -67,6 +71,7 @@ class DialogCRUD:
             intend_attrs: 意图属性（字典格式）
             intend_stop_words: 意图停用词列表
             dialog_uuid: 对话UUID，如果不提供则自动生成
+            session_id: 会话ID
             
         Returns:
             bool: 插入是否成功
@@ -84,8 +89,8 @@ class DialogCRUD:
             
             # 准备插入语句
             insert_sql = """
-                INSERT INTO dialog (uuid, message, reply, intend_title, intend_attrs, intend_stop_words)
-                VALUES (%s, %s, %s, %s, %s, %s)
+                INSERT INTO dialog (uuid, session_id, message, reply, intend_title, intend_attrs, intend_stop_words)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
             """
             
             # 处理 JSON 数据
@@ -93,6 +98,7 @@ class DialogCRUD:
             # 执行插入
             cursor.execute(insert_sql, (
                 dialog_uuid,
+                session_id,
                 message,
                 reply,
                 intend_title,
@@ -158,10 +164,13 @@ class DialogCRUD:
             if conn:
                 conn.close()
     
-    def get_all_messages(self) -> List[Dict[str, Any]]:
+    def get_all_messages(self, session_id: str = DEFAULT_SESSION_ID) -> List[Dict[str, Any]]:
         """
-        获取所有的 message
+        获取会话中所有的 message
         
+        Args:
+            session_id: 会话ID
+            
         Returns:
             List[Dict]: 包含所有消息的列表，每个元素包含 id, uuid, message, created_at
         """
@@ -176,11 +185,11 @@ class DialogCRUD:
             select_sql = """
                 SELECT id, uuid, message, created_at
                 FROM dialog
-                WHERE message IS NOT NULL
+                WHERE session_id = %s AND message IS NOT NULL
                 ORDER BY created_at ASC
             """
             
-            cursor.execute(select_sql)
+            cursor.execute(select_sql, (session_id,))
             results = cursor.fetchall()
             
             # 转换为字典列表
@@ -209,10 +218,13 @@ class DialogCRUD:
             if conn:
                 conn.close()
     
-    def get_last_intent_info(self) -> Optional[Dict[str, Any]]:
+    def get_last_intent_info(self, session_id: str = DEFAULT_SESSION_ID) -> Optional[Dict[str, Any]]:
         """
-        获取最后一行的 intend_title 及 intend_attrs
+        获取会话最后一行的 intend_title 及 intend_attrs
         
+        Args:
+            session_id: 会话ID
+            
         Returns:
             Optional[Dict]: 包含最后一条记录的意图信息，格式为：
             {
@@ -236,11 +248,12 @@ class DialogCRUD:
             select_sql = """
                 SELECT id, uuid, intend_title, intend_attrs, intend_stop_words, created_at
                 FROM dialog
+                WHERE session_id = %s
                 ORDER BY created_at DESC
                 LIMIT 1
             """
             
-            cursor.execute(select_sql)
+            cursor.execute(select_sql, (session_id,))
             result = cursor.fetchone()
             
             if result:
@@ -0,0 +1,199 @@
+"""
+对话压缩
+历史超过 token 预算时，把较早的轮次合并进每个会话的滚动摘要，
+提示词只携带「摘要 + 最近若干轮」，单轮的 LLM 输入 token 与延迟不随对话增长
+"""
+
+import asyncio
+import contextlib
+import logging
+import re
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 中日韩字符约 1 token/字，其余文本约 4 字符/token
+_CJK = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+
+COMPACT_PROMPT = """
+你是一位电商导购的对话记录员。请把下面的「已有摘要」与「需要合并的对话」压缩为一段不超过 {max_chars} 字的新摘要，保留用户的购买目标、偏好、预算以及明确排除的特征，省略寒暄与重复内容。只输出摘要正文。
+
+## 已有摘要
+{summary}
+
+## 需要合并的对话
+{turns}
+""".strip()
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计文本的 token 数"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def format_turn(turn: Dict[str, str]) -> str:
+    """把 {"role"/"sender", "content"/"text"} 形式的对话轮次转换为一行文本"""
+    role = turn.get("role") or turn.get("sender") or "user"
+    return f"{role}: {turn.get('content', turn.get('text', ''))}"
+
+
+class ConversationCompactor:
+    """
+    对话压缩器
+
+    摘要由调用方提供的 summarize 协程生成（默认使用 Kimi）。
+    compact 在进程内按 session_id 缓存摘要（LRU，最多 max_sessions 个会话），适用于内存中的对话历史；
+    compact_dialog 读写 dialog_summary 表，适用于存储在 PostgreSQL 中的对话。
+    会话锁只在有协程持有或等待时保留，长期运行的进程中不会随会话数增长。
+    """
+
+    def __init__(
+        self,
+        summarize: Optional[Callable[[str], Awaitable[str]]] = None,
+        token_budget: int = 1200,
+        keep_recent: int = 4,
+        summary_max_chars: int = 300,
+        max_turns: Optional[int] = None,
+        max_sessions: int = 1024
+    ):
+        """
+        初始化压缩器
+
+        Args:
+            summarize: 输入提示词、返回摘要的协程函数，为None时使用 AsyncKimiGPTService
+            token_budget: 摘要与未压缩轮次合计的 token 上限，超过时触发压缩
+            keep_recent: 压缩时保留原文的最近轮数
+            summary_max_chars: 摘要的最大字数
+            max_turns: 未压缩轮数的上限，超过时即使未超出 token 预算也触发压缩，为None时不限制
+            max_sessions: 进程内缓存摘要的最大会话数，超过时淘汰最久未使用的会话（之后从头重新压缩）
+        """
+        self._summarize = summarize
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.summary_max_chars = summary_max_chars
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        # session_id -> (摘要, 已被摘要覆盖的轮数)
+        self._summaries: "OrderedDict[str, Tuple[Optional[str], int]]" = OrderedDict()
+        # session_id -> [锁, 持有与等待的协程数]
+        self._locks: Dict[str, list] = {}
+        self.stats = {'compactions': 0, 'failures': 0, 'folded_turns': 0}
+
+    async def summarize(self, prompt: str) -> str:
+        """调用 LLM 生成摘要"""
+        if self._summarize is None:
+            from tools.rag.qwen_embedding import AsyncKimiGPTService
+            self._summarize = AsyncKimiGPTService().generate
+        return await self._summarize(prompt)
+
+    def needs_compaction(self, summary: Optional[str], turns: List[str]) -> bool:
+        """摘要与轮次合计是否超过预算（轮数不多于 keep_recent 时无可压缩内容）"""
+        if len(turns) <= self.keep_recent:
+            return False
+        if self.max_turns is not None and len(turns) > self.max_turns:
+            return True
+        return estimate_tokens(summary or '') + sum(estimate_tokens(t) for t in turns) > self.token_budget
+
+    async def fold(self, summary: Optional[str], turns: List[str]) -> str:
+        """
+        把若干轮对话合并进摘要
+
+        Args:
+            summary: 已有摘要
+            turns: 需要合并的轮次
+
+        Returns:
+            新的摘要
+        """
+        prompt = COMPACT_PROMPT.format(
+            max_chars=self.summary_max_chars,
+            summary=summary or '（无）',
+            turns='\n'.join(turns)
+        )
+        new_summary = (await self.summarize(prompt)).strip()
+        self.stats['compactions'] += 1
+        self.stats['folded_turns'] += len(turns)
+        return new_summary
+
+    @contextlib.asynccontextmanager
+    async def _lock(self, session_id: str) -> AsyncIterator[None]:
+        """按会话串行化压缩，最后一个使用者退出时删除该会话的锁"""
+        entry = self._locks.get(session_id)
+        if entry is None:
+            entry = self._locks[session_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[session_id]
+
+    def _remember(self, session_id: str, summary: Optional[str], covered: int):
+        self._summaries[session_id] = (summary, covered)
+        self._summaries.move_to_end(session_id)
+        while len(self._summaries) > self.max_sessions:
+            self._summaries.popitem(last=False)
+
+    async def compact(self, session_id: str, turns: List[str]) -> Tuple[Optional[str], List[str]]:
+        """
+        压缩内存中的完整对话历史
+
+        Args:
+            session_id: 会话ID
+            turns: 该会话从头开始的全部轮次
+
+        Returns:
+            (摘要, 尚未被摘要覆盖的轮次)；摘要生成失败时保留旧摘要，只截取最近轮次
+        """
+        async with self._lock(session_id):
+            summary, covered = self._summaries.get(session_id, (None, 0))
+            if session_id in self._summaries:
+                self._summaries.move_to_end(session_id)
+            if covered > len(turns):
+                # 历史被重置
+                summary, covered = None, 0
+            recent = turns[covered:]
+            if not self.needs_compaction(summary, recent):
+                return summary, recent
+
+            split = len(recent) - self.keep_recent
+            try:
+                summary = await self.fold(summary, recent[:split])
+            except Exception as e:
+                self.stats['failures'] += 1
+                logger.warning(f"会话 {session_id} 对话压缩失败，仅保留最近 {self.keep_recent} 轮: {e}")
+                return summary, recent[split:]
+            covered += split
+            self._remember(session_id, summary, covered)
+            return summary, turns[covered:]
+
+    async def compact_dialog(self, crud, session_id: str) -> bool:
+        """
+        压缩存储在 dialog 表中的会话，摘要写入 dialog_summary 表
+
+        Args:
+            crud: AsyncDialogCRUD 实例
+            session_id: 会话ID
+
+        Returns:
+            bool: 是否进行了压缩
+        """
+        async with self._lock(session_id):
+            state = await crud.get_dialog_state(session_id, window=None)
+            messages = state['messages']
+            if not self.needs_compaction(state['summary'], messages):
+                return False
+            split = len(messages) - self.keep_recent
+            try:
+                summary = await self.fold(state['summary'], messages[:split])
+            except Exception as e:
+                self.stats['failures'] += 1
+                logger.warning(f"会话 {session_id} 对话压缩失败: {e}")
+                return False
+            return await crud.save_summary(session_id, summary, state['message_ids'][split - 1])
@@ -0,0 +1,139 @@
+"""
+嵌入请求的异步合并与微批处理
+在短时间窗口内收集并发请求，对相同文本去重，按服务商的批量上限分块调用 DashScope
+"""
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Dict, List, Set
+
+if TYPE_CHECKING:
+    from tools.rag.qwen_embedding import QwenEmbeddingService
+
+logger = logging.getLogger(__name__)
+
+# text-embedding-v3 单次调用最多支持 10 条文本
+DASHSCOPE_MAX_BATCH_SIZE = 10
+
+
+class EmbeddingBatcher:
+    """
+    异步嵌入请求分发器
+
+    绑定到创建它的事件循环。并发请求先在 max_wait 秒内聚合，
+    同一文本在请求飞行期间只会被发送一次，结果再分发给所有等待方。
+    """
+
+    def __init__(
+        self,
+        service: "QwenEmbeddingService",
+        max_batch_size: int = DASHSCOPE_MAX_BATCH_SIZE,
+        max_wait: float = 0.005
+    ):
+        """
+        初始化分发器（需在事件循环中调用）
+
+        Args:
+            service: 嵌入服务，负责实际的 API 调用与缓存
+            max_batch_size: 单次 API 调用的最大文本数
+            max_wait: 聚合等待时间（秒）
+        """
+        self.service = service
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.loop = asyncio.get_running_loop()
+
+        self._pending: List[str] = []
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._timer: asyncio.TimerHandle = None
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.stats = {
+            'requests': 0,
+            'cache_hits': 0,
+            'deduplicated': 0,
+            'api_calls': 0,
+            'texts_sent': 0,
+        }
+
+    async def get_embedding(self, text: str) -> List[float]:
+        """
+        获取单个文本的嵌入向量
+
+        Args:
+            text: 输入文本
+
+        Returns:
+            嵌入向量
+        """
+        self.stats['requests'] += 1
+        cached = self.service._lookup_cached(text)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return cached.tolist()
+
+        future = self._inflight.get(text)
+        if future is not None:
+            self.stats['deduplicated'] += 1
+        else:
+            future = self.loop.create_future()
+            self._inflight[text] = future
+            self._pending.append(text)
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = self.loop.call_later(self.max_wait, self._flush)
+
+        # shield: 单个调用方取消时不影响共享同一结果的其他调用方
+        return await asyncio.shield(future)
+
+    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        批量获取嵌入向量，保持输入顺序
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            嵌入向量列表
+        """
+        return list(await asyncio.gather(*(self.get_embedding(text) for text in texts)))
+
+    def _flush(self):
+        """将聚合的文本按批量上限分块发送"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        for start in range(0, len(pending), self.max_batch_size):
+            task = self.loop.create_task(self._dispatch(pending[start:start + self.max_batch_size]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _embed_and_cache(self, texts: List[str]) -> List[List[float]]:
+        embeddings = self.service.generate_embeddings(texts)
+        # 数量不一致时无法确定向量与文本的对应关系，整批视为失败（也不写入缓存）
+        if len(embeddings) != len(texts):
+            raise ValueError(f"嵌入向量数量 {len(embeddings)} 与文本数量 {len(texts)} 不一致")
+        self.service._cache_embeddings(texts, embeddings)
+        return embeddings
+
+    async def _dispatch(self, texts: List[str]):
+        """调用 API 并把结果分发给等待方"""
+        self.stats['api_calls'] += 1
+        self.stats['texts_sent'] += len(texts)
+        try:
+            # DashScope SDK 是同步的，放到线程池中执行以免阻塞事件循环
+            embeddings = await asyncio.to_thread(self._embed_and_cache, texts)
+        except Exception as e:
+            logger.error(f"批量生成嵌入向量失败: {e}")
+            for text in texts:
+                future = self._inflight.pop(text, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+
+        for text, embedding in zip(texts, embeddings):
+            future = self._inflight.pop(text, None)
+            if future is not None and not future.done():
+                future.set_result(embedding)
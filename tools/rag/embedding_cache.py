@@ -0,0 +1,117 @@
+"""
+进程内嵌入向量缓存
+按字节预算限制内存占用，支持 LRU 与 TTL 淘汰，并统计命中情况
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+
+class LRUEmbeddingCache:
+    """
+    有界的嵌入向量缓存
+
+    向量以 float32 的 numpy 数组保存（1024 维约 4 KB，远小于 Python float 列表），
+    超出字节预算时淘汰最久未使用的条目，设置 ttl 后过期条目在访问时剔除。
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, ttl: Optional[float] = None):
+        """
+        初始化缓存
+
+        Args:
+            max_bytes: 缓存向量占用的最大字节数，为 0 时禁用缓存
+            ttl: 条目存活秒数，为 None 时不过期
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """
+        读取缓存的向量
+
+        Args:
+            text: 文本
+
+        Returns:
+            向量，未命中或已过期时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(text)
+            if entry is None:
+                self.misses += 1
+                return None
+            vector, expires_at = entry
+            if expires_at and expires_at < time.monotonic():
+                self._remove(text)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(text)
+            self.hits += 1
+            return vector
+
+    def put(self, text: str, vector: Iterable[float]):
+        """
+        写入向量，必要时淘汰最久未使用的条目
+
+        Args:
+            text: 文本
+            vector: 向量
+        """
+        array = np.array(vector, dtype=np.float32)
+        array.setflags(write=False)
+        if array.nbytes > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0.0
+
+        with self._lock:
+            if text in self._entries:
+                self._remove(text)
+            self._entries[text] = (array, expires_at)
+            self._bytes += array.nbytes
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, text: str):
+        vector, _ = self._entries.pop(text)
+        self._bytes -= vector.nbytes
+
+    def clear(self):
+        """清空缓存（保留统计计数）"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,262 @@
+"""
+追加写入的内存映射嵌入向量存储
+向量以 float32 顺序追加到数据文件，文本键经哈希后追加到索引文件，
+加载时通过 mmap 映射，未命中时增量写入，支持多个工作进程共享
+"""
+
+import os
+import hashlib
+import struct
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows 下无 fcntl，退化为单进程模式
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"RSEMB001"
+_HEADER = struct.Struct("<8sI")           # magic, dim
+_RECORD = struct.Struct("<16sQ")          # 键哈希, 行号
+_KEY_BYTES = 16
+
+
+def hash_key(text: str) -> bytes:
+    """计算文本键的 128 位哈希"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=_KEY_BYTES).digest()
+
+
+class MmapEmbeddingStore:
+    """
+    追加写入的嵌入向量存储
+
+    文件布局:
+        <path>.f32: 连续存放的 float32 向量，每行 dim 个分量
+        <path>.idx: 头部 (magic, dim) + 若干 (键哈希, 行号) 记录
+        <path>.lock: 跨进程写锁
+
+    写入顺序为先向量后索引，读取方只信任完整的索引记录，
+    因此并发读写和中途崩溃都不会读到半截向量。
+    """
+
+    def __init__(self, path: str, dim: Optional[int] = None):
+        """
+        初始化存储
+
+        Args:
+            path: 存储文件路径前缀
+            dim: 向量维度，为 None 时从已有文件读取或在首次写入时确定
+        """
+        self.path = path
+        self.vectors_path = f"{path}.f32"
+        self.index_path = f"{path}.idx"
+        self.lock_path = f"{path}.lock"
+        self.dim = dim
+
+        self._index: Dict[bytes, int] = {}
+        self._index_offset = 0
+        self._mmap: Optional[np.memmap] = None
+        self._mapped_rows = 0
+        self._thread_lock = threading.RLock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._refresh_index()
+
+    # ---------- 锁与文件映射 ----------
+
+    @contextmanager
+    def _write_lock(self):
+        """进程内 + 跨进程的互斥写锁"""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, "a+b") as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    @property
+    def _row_bytes(self) -> int:
+        return self.dim * 4
+
+    def _refresh_index(self):
+        """读取索引文件中新增的记录（其他进程可能已追加）"""
+        with self._thread_lock:
+            try:
+                size = os.path.getsize(self.index_path)
+            except FileNotFoundError:
+                return
+            if size < _HEADER.size or size == self._index_offset:
+                return
+
+            with open(self.index_path, "rb") as f:
+                if self._index_offset == 0:
+                    magic, dim = _HEADER.unpack(f.read(_HEADER.size))
+                    if magic != _MAGIC:
+                        raise ValueError(f"无效的嵌入索引文件: {self.index_path}")
+                    if self.dim is not None and self.dim != dim:
+                        raise ValueError(f"向量维度不匹配: 期望 {self.dim}，文件为 {dim}")
+                    self.dim = dim
+                    self._index_offset = _HEADER.size
+                f.seek(self._index_offset)
+                # 只读取完整的记录，末尾可能存在其他进程正在写入的半条记录
+                complete = (size - self._index_offset) // _RECORD.size * _RECORD.size
+                data = f.read(complete)
+
+            for key, row in _RECORD.iter_unpack(data):
+                self._index[key] = row
+            self._index_offset += len(data)
+
+    def _ensure_mapped(self, row: int):
+        """确保 mmap 覆盖到指定行，数据文件增长后重新映射"""
+        if self._mmap is not None and row < self._mapped_rows:
+            return
+        rows = os.path.getsize(self.vectors_path) // self._row_bytes
+        self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        self._mapped_rows = rows
+
+    # ---------- 读取 ----------
+
+    def __len__(self) -> int:
+        self._refresh_index()
+        return len(self._index)
+
+    def __contains__(self, text: str) -> bool:
+        return self._lookup_row(text) is not None
+
+    def _lookup_row(self, text: str) -> Optional[int]:
+        key = hash_key(text)
+        row = self._index.get(key)
+        if row is None:
+            self._refresh_index()
+            row = self._index.get(key)
+        return row
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """
+        读取文本对应的向量
+
+        Args:
+            text: 文本
+
+        Returns:
+            只读的 float32 向量视图，未命中时返回 None
+        """
+        row = self._lookup_row(text)
+        if row is None:
+            return None
+        with self._thread_lock:
+            self._ensure_mapped(row)
+            return self._mmap[row]
+
+    def get_many(self, texts: Sequence[str]) -> Tuple[Dict[int, np.ndarray], List[int]]:
+        """
+        批量读取向量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            (命中结果 {位置: 向量}, 未命中的位置列表)
+        """
+        hits: Dict[int, np.ndarray] = {}
+        misses: List[int] = []
+        for i, text in enumerate(texts):
+            vector = self.get(text)
+            if vector is None:
+                misses.append(i)
+            else:
+                hits[i] = vector
+        return hits, misses
+
+    # ---------- 写入 ----------
+
+    def put(self, text: str, vector: Iterable[float]):
+        """写入单个向量"""
+        self.put_many([text], [vector])
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Iterable[float]]):
+        """
+        追加写入一批向量，已存在的键会被跳过
+
+        Args:
+            texts: 文本列表
+            vectors: 与文本一一对应的向量
+        """
+        if not texts:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or len(matrix) != len(texts):
+            raise ValueError("向量数量与文本数量不一致")
+
+        with self._write_lock():
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+            if matrix.shape[1] != self.dim:
+                raise ValueError(f"向量维度不匹配: 期望 {self.dim}，实际 {matrix.shape[1]}")
+
+            self._refresh_index()
+            pending: Dict[bytes, int] = {}
+            for i, text in enumerate(texts):
+                key = hash_key(text)
+                if key not in self._index and key not in pending:
+                    pending[key] = i
+            if not pending:
+                return
+
+            if not os.path.exists(self.index_path):
+                with open(self.index_path, "wb") as f:
+                    f.write(_HEADER.pack(_MAGIC, self.dim))
+                self._index_offset = _HEADER.size
+
+            with open(self.vectors_path, "ab") as f:
+                size = f.seek(0, os.SEEK_END)
+                start_row = size // self._row_bytes
+                if size % self._row_bytes:
+                    # 上次写入中途崩溃留下的残行，截断后再追加
+                    f.truncate(start_row * self._row_bytes)
+                    f.seek(start_row * self._row_bytes)
+                f.write(matrix[list(pending.values())].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            records = b"".join(
+                _RECORD.pack(key, start_row + offset) for offset, key in enumerate(pending)
+            )
+            with open(self.index_path, "ab") as f:
+                f.write(records)
+                f.flush()
+
+            self._refresh_index()
+
+    def clear(self):
+        """删除全部存储文件"""
+        with self._write_lock():
+            for path in (self.vectors_path, self.index_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._index = {}
+            self._index_offset = 0
+            self._mmap = None
+            self._mapped_rows = 0
+
+    def info(self) -> Dict:
+        """获取存储信息"""
+        self._refresh_index()
+        return {
+            "entries": len(self._index),
+            "dim": self.dim,
+            "path": self.path,
+        }
@@ -0,0 +1,353 @@
+"""
+本地近似最近邻（IVF）商品索引
+基于 resource/good 商品目录及其嵌入向量构建，向量矩阵以 mmap 方式加载，
+在 Weaviate 不可用时作为离线检索的兜底
+"""
+
+import os
+import json
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from tools.rag.embedding_batcher import DASHSCOPE_MAX_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GOODS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'resource', 'good')
+
+# 排除关键词与类目过滤所检查的字段
+TEXT_FIELDS = ("name", "brandName", "detail")
+CATEGORY_FIELDS = ("catagory", "subCatagory", "itemCatagory")
+
+
+def load_good_item(good_folder: Path) -> Optional[Dict[str, Any]]:
+    """
+    读取单个商品文件夹，字段与 weaviate_init 写入 ResoGoods 的属性一致
+
+    Args:
+        good_folder: 商品文件夹（文件夹名即 goodId）
+
+    Returns:
+        商品字典，缺少必要文件时返回 None
+    """
+    clean_data_path = good_folder / "clean_data.json"
+    detail_path = good_folder / "detail.txt"
+    if not clean_data_path.exists() or not detail_path.exists():
+        return None
+
+    with open(clean_data_path, 'r', encoding='utf-8') as f:
+        clean_data = json.load(f)
+    with open(detail_path, 'r', encoding='utf-8') as f:
+        detail_content = f.read()
+
+    return {
+        "goodId": int(good_folder.name),
+        "name": clean_data.get("good_short_name", ""),
+        "price": clean_data.get("price", ""),
+        "brandName": clean_data.get("brand_name", ""),
+        "catagory": clean_data.get("catagory_full", ""),
+        "subCatagory": clean_data.get("sub_catagory", ""),
+        "itemCatagory": clean_data.get("item_catagory", ""),
+        "picUrl": clean_data.get("pic_url", ""),
+        "detail": detail_content.strip()
+    }
+
+
+def load_catalog(goods_dir: str = DEFAULT_GOODS_DIR) -> List[Dict[str, Any]]:
+    """
+    读取整个商品目录
+
+    Args:
+        goods_dir: 商品数据目录
+
+    Returns:
+        按 goodId 排序的商品列表
+    """
+    base = Path(goods_dir)
+    if not base.exists():
+        logger.warning(f"目录不存在: {goods_dir}")
+        return []
+    items = []
+    for folder in base.iterdir():
+        if not folder.is_dir() or not folder.name.isdigit():
+            continue
+        item = load_good_item(folder)
+        if item is None:
+            logger.warning(f"跳过文件夹 {folder.name}: 缺少必要文件")
+            continue
+        items.append(item)
+    items.sort(key=lambda item: item["goodId"])
+    return items
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def _kmeans(vectors: np.ndarray, n_clusters: int, n_iter: int = 20, seed: int = 0) -> np.ndarray:
+    """在单位球面上做球面 k-means，返回归一化后的聚类中心"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(n_clusters):
+            members = vectors[assignment == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+            else:
+                # 空簇重新随机初始化
+                centroids[c] = vectors[rng.integers(len(vectors))]
+        centroids = _normalize(centroids)
+    return centroids
+
+
+class LocalANNIndex:
+    """
+    倒排文件（IVF）近似最近邻索引
+
+    向量按簇重新排列后连续存放，每个簇对应 offsets 中的一段区间；
+    查询时只扫描与查询最接近的 nprobe 个簇，并在扫描时应用排除关键词与类目过滤。
+
+    目录布局:
+        vectors.npy: 按簇排列的归一化 float32 向量（mmap 加载）
+        centroids.npy: 聚类中心
+        offsets.npy: 每个簇在 vectors 中的起止位置
+        items.json: 与 vectors 行对齐的商品属性
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        centroids: np.ndarray,
+        offsets: np.ndarray,
+        items: List[Dict[str, Any]],
+        nprobe: int = 8
+    ):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.offsets = offsets
+        self.items = items
+        self.nprobe = nprobe
+
+        # 预先拼接小写的过滤文本，避免查询时重复构造
+        self._filter_text = [
+            " ".join(str(item.get(field, "")) for field in TEXT_FIELDS).lower() for item in items
+        ]
+        self._categories = [
+            {str(item.get(field, "")) for field in CATEGORY_FIELDS} for item in items
+        ]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @classmethod
+    def build(
+        cls,
+        items: List[Dict[str, Any]],
+        embeddings: Sequence[Sequence[float]],
+        n_lists: Optional[int] = None,
+        nprobe: int = 8
+    ) -> "LocalANNIndex":
+        """
+        构建索引
+
+        Args:
+            items: 商品列表
+            embeddings: 与商品一一对应的嵌入向量
+            n_lists: 簇数量，默认取 sqrt(n)
+            nprobe: 查询时默认扫描的簇数量
+
+        Returns:
+            构建好的索引
+        """
+        if not items:
+            empty = np.zeros((0, 0), dtype=np.float32)
+            return cls(empty, empty, np.zeros(1, dtype=np.int64), [], nprobe=nprobe)
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        if len(vectors) != len(items):
+            raise ValueError("向量数量与商品数量不一致")
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(len(vectors))))
+        n_lists = max(1, min(n_lists, len(vectors)))
+
+        if n_lists == 1:
+            centroids = _normalize(vectors.mean(axis=0, keepdims=True))
+            assignment = np.zeros(len(vectors), dtype=np.int64)
+        else:
+            centroids = _kmeans(vectors, n_lists)
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=n_lists)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        return cls(
+            vectors=vectors[order],
+            centroids=centroids,
+            offsets=offsets,
+            items=[items[i] for i in order],
+            nprobe=nprobe
+        )
+
+    def save(self, index_dir: str):
+        """保存索引到目录"""
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(os.path.join(index_dir, "vectors.npy"), np.ascontiguousarray(self.vectors))
+        np.save(os.path.join(index_dir, "centroids.npy"), self.centroids)
+        np.save(os.path.join(index_dir, "offsets.npy"), self.offsets)
+        with open(os.path.join(index_dir, "items.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.items, f, ensure_ascii=False)
+        logger.info(f"本地索引已保存: {index_dir}，共 {len(self.items)} 个商品")
+
+    @classmethod
+    def load(cls, index_dir: str, nprobe: int = 8) -> "LocalANNIndex":
+        """从目录加载索引，向量矩阵以只读 mmap 方式映射"""
+        vectors = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode="r")
+        centroids = np.load(os.path.join(index_dir, "centroids.npy"))
+        offsets = np.load(os.path.join(index_dir, "offsets.npy"))
+        with open(os.path.join(index_dir, "items.json"), 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        return cls(vectors, centroids, offsets, items, nprobe=nprobe)
+
+    def _accept(self, row: int, negative_keywords: Sequence[str], category: Optional[str]) -> bool:
+        if category and category not in self._categories[row]:
+            return False
+        text = self._filter_text[row]
+        return not any(keyword.lower() in text for keyword in negative_keywords)
+
+    def search(
+        self,
+        query_vector: Sequence[float],
+        top_k: int = 10,
+        negative_keywords: Sequence[str] = (),
+        category: Optional[str] = None,
+        nprobe: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        近似最近邻查询
+
+        过滤后结果不足 top_k 时会逐步扩大扫描的簇数量，直至扫描全部簇。
+
+        Args:
+            query_vector: 查询向量
+            top_k: 返回数量
+            negative_keywords: 排除关键词，命中名称/品牌/详情的商品会被过滤
+            category: 类目过滤，匹配任一级类目
+            nprobe: 扫描的簇数量，默认使用构建时的设置
+
+        Returns:
+            [{"item": 商品属性, "score": 余弦相似度}] 列表，按相似度降序
+        """
+        if not self.items or top_k <= 0:
+            return []
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        n_lists = len(self.centroids)
+        nprobe = min(nprobe or self.nprobe, n_lists)
+        cluster_order = np.argsort(-(self.centroids @ query), kind="stable")
+
+        results: List[Dict[str, Any]] = []
+        scanned = 0
+        while True:
+            rows = []
+            scores = []
+            for c in cluster_order[scanned:nprobe]:
+                start, end = self.offsets[c], self.offsets[c + 1]
+                if start == end:
+                    continue
+                rows.append(np.arange(start, end))
+                scores.append(self.vectors[start:end] @ query)
+            scanned = nprobe
+
+            if rows:
+                rows = np.concatenate(rows)
+                scores = np.concatenate(scores)
+                for i in np.argsort(-scores, kind="stable"):
+                    row = int(rows[i])
+                    if self._accept(row, negative_keywords, category):
+                        results.append({"item": self.items[row], "score": float(scores[i])})
+                        if len(results) >= top_k:
+                            break
+
+            if len(results) >= top_k or scanned >= n_lists:
+                break
+            nprobe = min(nprobe * 2, n_lists)
+
+        results.sort(key=lambda r: r["score"], reverse=True)
+        return results[:top_k]
+
+    def keyword_search(
+        self,
+        query: str,
+        top_k: int = 10,
+        negative_keywords: Sequence[str] = (),
+        category: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        按字符二元组重合度的关键词查询，查询向量无法生成（完全离线）时使用
+
+        Args:
+            query: 查询文本
+            top_k: 返回数量
+            negative_keywords: 排除关键词
+            category: 类目过滤
+
+        Returns:
+            [{"item": 商品属性, "score": 命中的二元组比例}] 列表，按得分降序
+        """
+        text = "".join(str(query).lower().split())
+        grams = {text[i:i + 2] for i in range(len(text) - 1)} or ({text} if text else set())
+        if not grams or top_k <= 0:
+            return []
+
+        scored = []
+        for row, filter_text in enumerate(self._filter_text):
+            hits = sum(1 for gram in grams if gram in filter_text)
+            if hits and self._accept(row, negative_keywords, category):
+                scored.append((hits / len(grams), row))
+        # 得分相同时文本越短越贴近查询
+        scored.sort(key=lambda pair: (-pair[0], len(self._filter_text[pair[1]])))
+        return [{"item": self.items[row], "score": score} for score, row in scored[:top_k]]
+
+
+def build_catalog_index(
+    embed_texts: Callable[[List[str]], List[List[float]]],
+    goods_dir: str = DEFAULT_GOODS_DIR,
+    index_dir: Optional[str] = None,
+    n_lists: Optional[int] = None,
+    batch_size: int = DASHSCOPE_MAX_BATCH_SIZE
+) -> LocalANNIndex:
+    """
+    从商品目录构建本地索引，向量与 Weaviate 的 detail 命名向量一致
+
+    Args:
+        embed_texts: 批量嵌入函数，例如 QwenEmbeddingService.get_embeddings_batch
+        goods_dir: 商品数据目录
+        index_dir: 保存目录，为 None 时不保存
+        n_lists: 簇数量
+        batch_size: 单次调用 embed_texts 的文本数（text-embedding-v3 单次最多 10 条）
+
+    Returns:
+        构建好的索引
+    """
+    items = load_catalog(goods_dir)
+    embeddings = []
+    for start in range(0, len(items), batch_size):
+        embeddings.extend(embed_texts([item["detail"] for item in items[start:start + batch_size]]))
+    index = LocalANNIndex.build(items, embeddings, n_lists=n_lists)
+    if index_dir:
+        index.save(index_dir)
+    return index
+
+
+if __name__ == "__main__":
+    import sys
+    from tools.rag.qwen_embedding import QwenEmbeddingService
+
+    logging.basicConfig(level=logging.INFO)
+    target_dir = sys.argv[1] if len(sys.argv) > 1 else "local_goods_index"
+    build_catalog_index(QwenEmbeddingService().get_embeddings_batch, index_dir=target_dir)
@@ -4,21 +4,41 @@ Qwen文本嵌入服务封装
 """
 
 import os
+import asyncio
 import pickle
+import socket
+import time
 import requests
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 import pandas as pd
 import numpy as np
-from typing import List, Union, Dict, Optional
+from typing import List, Union, Dict, Optional, Tuple
 import dashscope
 from dashscope import TextEmbedding
 import logging
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from tools.rag.embedding_batcher import DASHSCOPE_MAX_BATCH_SIZE, EmbeddingBatcher
+from tools.rag.embedding_cache import LRUEmbeddingCache
+from tools.rag.embedding_store import MmapEmbeddingStore
 
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+KIMI_BASE_URL = "https://api.moonshot.cn/v1"
+KIMI_MODEL = "kimi-k2-0711-preview"
+KIMI_SYSTEM_PROMPT = "你是 Kimi，由 Moonshot AI 提供的人工智能助手，你擅长中文和英文的对话。你会为用户提供安全，有帮助，准确的回答。同时，你会拒绝一切涉及恐怖主义，种族歧视，黄色暴力等问题的回答。Moonshot AI 为专有名词，不可翻译成其他语言。"
+
+
+def _kimi_messages(text: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": KIMI_SYSTEM_PROMPT},
+        {"role": "user", "content": text}
+    ]
+
+
 class KimiGPTService:
     """
     Kimi文本嵌入服务
@@ -41,21 +61,18 @@ class KimiGPTService:
         
         self.api_key = self.api_key
         self.cache_path = cache_path
-        self.base_url = "https://api.moonshot.cn/v1"
+        self.base_url = KIMI_BASE_URL
+        # 复用同一个客户端及其连接池
+        self.client = OpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url
+        )
       
     def generate(self, text: str) -> str:
         try:
-            client = OpenAI(
-                api_key=self.api_key,
-                base_url= self.base_url
-            )
-            
-            completion = client.chat.completions.create(
-                model = "kimi-k2-0711-preview",
-                messages = [
-                    {"role": "system", "content": "你是 Kimi，由 Moonshot AI 提供的人工智能助手，你擅长中文和英文的对话。你会为用户提供安全，有帮助，准确的回答。同时，你会拒绝一切涉及恐怖主义，种族歧视，黄色暴力等问题的回答。Moonshot AI 为专有名词，不可翻译成其他语言。"},
-                    {"role": "user", "content": text}
-                ],
+            completion = self.client.chat.completions.create(
+                model = KIMI_MODEL,
+                messages = _kimi_messages(text),
                 temperature = 0.6,
             )
             
@@ -64,8 +81,107 @@ class KimiGPTService:
         except Exception as e:
             logger.error(f"生成嵌入向量失败: {e}")
             raise
-      
+
+
+class AsyncKimiGPTService:
+    """
+    Kimi异步生成服务
+    
+    共享一个 AsyncOpenAI 客户端（底层为带连接池的 httpx.AsyncClient），
+    在 async 路由中调用不会阻塞事件循环
+    """
+    
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        timeout: float = 60.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20
+    ):
+        """
+        初始化Kimi异步生成服务
+        
+        Args:
+            api_key: Kimi API密钥，如果为None则从环境变量KIMI_API_KEY获取
+            timeout: 默认的单次调用超时（秒）
+            max_connections: 连接池最大连接数
+            max_keepalive_connections: 连接池保持的空闲连接数
+        """
+        self.api_key = api_key or os.getenv("KIMI_API_KEY")
+        if not self.api_key:
+            raise ValueError("Kimi API密钥未设置，请设置KIMI_API_KEY环境变量或传入api_key参数")
+        
+        self.base_url = KIMI_BASE_URL
+        self.timeout = timeout
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections
+            ),
+            timeout=httpx.Timeout(timeout, connect=10.0)
+        )
+        self.client = AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            http_client=self.http_client,
+            timeout=timeout
+        )
+    
+    async def generate(self, text: str, timeout: Optional[float] = None, temperature: float = 0.6) -> str:
+        """
+        生成回复
+        
+        Args:
+            text: 用户输入
+            timeout: 本次调用超时（秒），为None时使用默认值
+            temperature: 采样温度
+            
+        Returns:
+            模型回复文本
+        """
+        try:
+            completion = await self.client.chat.completions.create(
+                model=KIMI_MODEL,
+                messages=_kimi_messages(text),
+                temperature=temperature,
+                timeout=timeout or self.timeout,
+            )
+            return completion.choices[0].message.content
+        except Exception as e:
+            logger.error(f"Kimi生成失败: {e}")
+            raise
     
+    async def stream(self, text: str, timeout: Optional[float] = None, temperature: float = 0.6):
+        """
+        流式生成回复
+        
+        Args:
+            text: 用户输入
+            timeout: 本次调用超时（秒），为None时使用默认值
+            temperature: 采样温度
+            
+        Yields:
+            模型新生成的文本片段
+        """
+        try:
+            stream = await self.client.chat.completions.create(
+                model=KIMI_MODEL,
+                messages=_kimi_messages(text),
+                temperature=temperature,
+                timeout=timeout or self.timeout,
+                stream=True,
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            logger.error(f"Kimi流式生成失败: {e}")
+            raise
+    
+    async def aclose(self):
+        """关闭底层连接池"""
+        await self.client.close()
+
 
 class QwenEmbeddingService:
     """
@@ -75,13 +191,21 @@ class QwenEmbeddingService:
     支持缓存机制，避免重复计算
     """
     
-    def __init__(self, api_key: Optional[str] = None, cache_path: str = "qwen_embeddings_cache.pkl"):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        cache_path: str = "qwen_embeddings_cache",
+        memory_cache_bytes: Optional[int] = None,
+        memory_cache_ttl: Optional[float] = None
+    ):
         """
         初始化Qwen嵌入服务
         
         Args:
             api_key: DashScope API密钥，如果为None则从环境变量DASHSCOPE_API_KEY获取
-            cache_path: 嵌入缓存文件路径
+            cache_path: 嵌入缓存文件路径前缀（生成 .f32/.idx 文件，可被多个进程共享）
+            memory_cache_bytes: 进程内缓存字节预算，为None时读取环境变量QWEN_EMBEDDING_CACHE_BYTES（默认256MB）
+            memory_cache_ttl: 进程内缓存条目存活秒数，为None时读取环境变量QWEN_EMBEDDING_CACHE_TTL（默认不过期）
         """
         # 设置API密钥
         self.api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
@@ -90,31 +214,82 @@ class QwenEmbeddingService:
         
         dashscope.api_key = self.api_key
         self.cache_path = cache_path
-        self.embedding_cache = self._load_cache()    
-      
-      
+        self.embedding_cache = MmapEmbeddingStore(cache_path)
+        self._migrate_legacy_cache()
+        
+        if memory_cache_bytes is None:
+            memory_cache_bytes = int(os.getenv("QWEN_EMBEDDING_CACHE_BYTES", 256 * 1024 * 1024))
+        if memory_cache_ttl is None and os.getenv("QWEN_EMBEDDING_CACHE_TTL"):
+            memory_cache_ttl = float(os.getenv("QWEN_EMBEDDING_CACHE_TTL"))
+        self.memory_cache = LRUEmbeddingCache(max_bytes=memory_cache_bytes, ttl=memory_cache_ttl)
+        self._batcher: Optional[EmbeddingBatcher] = None
+        self._reachable: Optional[Tuple[bool, float]] = None
         
-    def _load_cache(self) -> Dict[str, List[float]]:
-        """加载嵌入缓存"""
+    def _migrate_legacy_cache(self):
+        """将旧版 pickle 缓存一次性导入到内存映射存储"""
+        legacy_path = f"{self.cache_path}.pkl"
+        if len(self.embedding_cache) or not os.path.exists(legacy_path):
+            return
         try:
-            with open(self.cache_path, "rb") as f:
+            with open(legacy_path, "rb") as f:
                 cache = pickle.load(f)
-            logger.info(f"已加载嵌入缓存，包含 {len(cache)} 个条目")
-            return cache
-        except FileNotFoundError:
-            logger.info("未找到缓存文件，将创建新缓存")
-            return {}
+            if cache:
+                self.embedding_cache.put_many(list(cache.keys()), list(cache.values()))
+            logger.info(f"已从旧版缓存迁移 {len(cache)} 个条目")
         except Exception as e:
-            logger.warning(f"加载缓存失败: {e}，将创建新缓存")
-            return {}
+            logger.warning(f"迁移旧版缓存失败: {e}")
     
-    def _save_cache(self):
-        """保存嵌入缓存"""
+    def _lookup_cached(self, text: str) -> Optional[np.ndarray]:
+        """依次查找进程内缓存和磁盘缓存，磁盘命中时提升到进程内缓存"""
+        vector = self.memory_cache.get(text)
+        if vector is not None:
+            return vector
+        vector = self.embedding_cache.get(text)
+        if vector is not None:
+            self.memory_cache.put(text, vector)
+        return vector
+    
+    def get_cached_embedding(self, text: str) -> Optional[List[float]]:
+        """
+        只从本地缓存读取嵌入向量，不调用 API
+        
+        Args:
+            text: 输入文本
+            
+        Returns:
+            嵌入向量，未缓存时返回 None
+        """
+        vector = self._lookup_cached(text)
+        return vector.tolist() if vector is not None else None
+    
+    def is_api_reachable(self, timeout: float = 1.0, ttl: float = 30.0) -> bool:
+        """
+        DashScope 服务端能否建立 TCP 连接（结果缓存 ttl 秒，避免每次都探测）
+        
+        Args:
+            timeout: 连接超时（秒）
+            ttl: 探测结果的有效期（秒）
+            
+        Returns:
+            是否可达
+        """
+        now = time.monotonic()
+        if self._reachable is not None and now - self._reachable[1] < ttl:
+            return self._reachable[0]
+        url = urlparse(getattr(dashscope, "base_http_api_url", None) or "https://dashscope.aliyuncs.com")
         try:
-            with open(self.cache_path, "wb") as f:
-                pickle.dump(self.embedding_cache, f)
-        except Exception as e:
-            logger.error(f"保存缓存失败: {e}")
+            with socket.create_connection((url.hostname, url.port or 443), timeout=timeout):
+                reachable = True
+        except OSError:
+            reachable = False
+        self._reachable = (reachable, now)
+        return reachable
+    
+    def _cache_embeddings(self, texts: List[str], embeddings: List[List[float]]):
+        """将新生成的向量写入磁盘缓存和进程内缓存"""
+        self.embedding_cache.put_many(texts, embeddings)
+        for text, embedding in zip(texts, embeddings):
+            self.memory_cache.put(text, embedding)
     
     def generate_embeddings(self, text: Union[str, List[str]]) -> Union[List[float], List[List[float]]]:
         """
@@ -152,15 +327,15 @@ class QwenEmbeddingService:
         Returns:
             嵌入向量
         """
-        if text in self.embedding_cache:
-            return self.embedding_cache[text]
+        cached = self._lookup_cached(text)
+        if cached is not None:
+            return cached.tolist()
         
         # 生成新的嵌入向量
         embedding = self.generate_embeddings(text)
         
-        # 缓存结果
-        self.embedding_cache[text] = embedding
-        self._save_cache()
+        # 缓存结果（增量追加，无需重写整个缓存文件）
+        self._cache_embeddings([text], [embedding])
         
         return embedding
     
@@ -180,21 +355,23 @@ class QwenEmbeddingService:
         uncached_indices = []
         
         for i, text in enumerate(texts):
-            if text in self.embedding_cache:
-                cached_embeddings[i] = self.embedding_cache[text]
+            cached = self._lookup_cached(text)
+            if cached is not None:
+                cached_embeddings[i] = cached.tolist()
             else:
                 uncached_texts.append(text)
                 uncached_indices.append(i)
         
-        # 批量生成未缓存的嵌入向量
+        # 批量生成未缓存的嵌入向量（按服务商的单次上限分块调用）
         if uncached_texts:
-            new_embeddings = self.generate_embeddings(uncached_texts)
+            new_embeddings = []
+            for start in range(0, len(uncached_texts), DASHSCOPE_MAX_BATCH_SIZE):
+                new_embeddings.extend(
+                    self.generate_embeddings(uncached_texts[start:start + DASHSCOPE_MAX_BATCH_SIZE])
+                )
             
             # 更新缓存
-            for text, embedding in zip(uncached_texts, new_embeddings):
-                self.embedding_cache[text] = embedding
-            
-            self._save_cache()
+            self._cache_embeddings(uncached_texts, new_embeddings)
             
             # 将新的嵌入向量添加到结果中
             for i, embedding in zip(uncached_indices, new_embeddings):
@@ -203,6 +380,39 @@ class QwenEmbeddingService:
         # 按原始顺序返回结果
         return [cached_embeddings[i] for i in range(len(texts))]
     
+    def _get_batcher(self) -> EmbeddingBatcher:
+        """获取绑定到当前事件循环的请求分发器"""
+        loop = asyncio.get_running_loop()
+        if self._batcher is None or self._batcher.loop is not loop:
+            self._batcher = EmbeddingBatcher(self)
+        return self._batcher
+    
+    async def aget_embedding(self, text: str) -> List[float]:
+        """
+        异步获取单个文本的嵌入向量
+        
+        并发请求会被合并为批量API调用，相同文本只请求一次
+        
+        Args:
+            text: 输入文本
+            
+        Returns:
+            嵌入向量
+        """
+        return await self._get_batcher().get_embedding(text)
+    
+    async def aget_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        异步批量获取嵌入向量
+        
+        Args:
+            texts: 文本列表
+            
+        Returns:
+            嵌入向量列表
+        """
+        return await self._get_batcher().get_embeddings(texts)
+    
     def cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """
         计算两个向量的余弦相似度
@@ -218,6 +428,62 @@ class QwenEmbeddingService:
         vec2 = np.array(vec2)
         return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
     
+    def build_normalized_matrix(self, texts: List[str]) -> np.ndarray:
+        """
+        获取文本列表的嵌入矩阵，并按行归一化
+        
+        Args:
+            texts: 文本列表
+            
+        Returns:
+            形状为 (len(texts), dim) 的 float32 矩阵，每行为单位向量
+        """
+        matrix = np.asarray(self.get_embeddings_batch(texts), dtype=np.float32)
+        return _normalize_rows(matrix)
+    
+    def top_k_from_matrix(
+        self,
+        query_embedding: List[float],
+        matrix: np.ndarray,
+        top_k: int = 5,
+        exclude_index: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        在预归一化的矩阵中查找最相似的前k行
+        
+        一次矩阵-向量乘法得到全部相似度，argpartition 选出前k个后只对这k个排序；
+        相似度相同时按行号升序，保证结果稳定
+        
+        Args:
+            query_embedding: 查询向量（无需归一化）
+            matrix: build_normalized_matrix 返回的矩阵
+            top_k: 返回数量
+            exclude_index: 需要排除的行号（如源文本自身）
+            
+        Returns:
+            [(行号, 相似度)] 列表，按相似度降序
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        scores = matrix @ query
+        if exclude_index is not None:
+            scores[exclude_index] = -np.inf
+        
+        n = len(scores) - (exclude_index is not None)
+        k = min(top_k, n)
+        if k <= 0:
+            return []
+        if k < len(scores):
+            # argpartition 在第k名并列时只保留任意一部分，先取出不低于第k名分数的全部行再排序
+            kth = -np.partition(-scores, k - 1)[k - 1]
+            candidates = np.flatnonzero(scores >= kth)
+        else:
+            candidates = np.arange(len(scores))
+        order = np.lexsort((candidates, -scores[candidates]))[:k]
+        return [(int(candidates[i]), float(scores[candidates[i]])) for i in order]
+    
     def find_similar_texts(
         self, 
         query_text: str, 
@@ -235,31 +501,26 @@ class QwenEmbeddingService:
         Returns:
             相似度结果列表，每个元素包含 {'text': str, 'similarity': float, 'index': int}
         """
+        if not candidate_texts:
+            return []
+        
         # 获取查询文本的嵌入向量
         query_embedding = self.get_embedding(query_text)
         
-        # 获取候选文本的嵌入向量
-        candidate_embeddings = self.get_embeddings_batch(candidate_texts)
-        
-        # 计算相似度
-        similarities = []
-        for i, candidate_embedding in enumerate(candidate_embeddings):
-            similarity = self.cosine_similarity(query_embedding, candidate_embedding)
-            similarities.append({
-                'text': candidate_texts[i],
-                'similarity': similarity,
-                'index': i
-            })
+        # 获取候选文本的归一化嵌入矩阵
+        matrix = self.build_normalized_matrix(candidate_texts)
         
-        # 按相似度排序并返回前k个
-        similarities.sort(key=lambda x: x['similarity'], reverse=True)
-        return similarities[:top_k]
+        return [
+            {'text': candidate_texts[i], 'similarity': similarity, 'index': i}
+            for i, similarity in self.top_k_from_matrix(query_embedding, matrix, top_k)
+        ]
     
     def recommend_from_list(
         self, 
         texts: List[str], 
         source_index: int, 
-        top_k: int = 5
+        top_k: int = 5,
+        matrix: Optional[np.ndarray] = None
     ) -> List[Dict]:
         """
         从文本列表中推荐与源文本最相似的其他文本
@@ -268,42 +529,53 @@ class QwenEmbeddingService:
             texts: 文本列表
             source_index: 源文本在列表中的索引
             top_k: 推荐数量
+            matrix: 可选，texts 对应的预归一化嵌入矩阵，传入时不再重新获取
             
         Returns:
-            推荐结果列表
+            推荐结果列表，index 为在 texts 中的位置（重复文本各自对应真实位置）；
+            original_index 与 index 相同，保留以兼容旧调用方
         """
         if source_index >= len(texts):
             raise ValueError(f"源文本索引 {source_index} 超出范围")
         
-        source_text = texts[source_index]
-        candidate_texts = [text for i, text in enumerate(texts) if i != source_index]
+        if matrix is None:
+            matrix = self.build_normalized_matrix(texts)
         
-        results = self.find_similar_texts(source_text, candidate_texts, top_k)
-        
-        # 调整索引以反映原始列表中的位置
-        for result in results:
-            original_index = texts.index(result['text'])
-            result['original_index'] = original_index
+        # 源文本向量已在矩阵中，无需再次查询
+        results = []
+        for i, similarity in self.top_k_from_matrix(matrix[source_index], matrix, top_k, exclude_index=source_index):
+            results.append({
+                'text': texts[i],
+                'similarity': similarity,
+                'index': i,
+                'original_index': i
+            })
         
         return results
     
     def clear_cache(self):
         """清空缓存"""
-        self.embedding_cache = {}
-        try:
-            os.remove(self.cache_path)
-        except FileNotFoundError:
-            pass
+        self.embedding_cache.clear()
+        self.memory_cache.clear()
         logger.info("缓存已清空")
     
     def get_cache_info(self) -> Dict:
         """获取缓存信息"""
         return {
             'cache_size': len(self.embedding_cache),
-            'cache_path': self.cache_path
+            'cache_path': self.cache_path,
+            'memory_cache': self.memory_cache.stats(),
+            'batcher': dict(self._batcher.stats) if self._batcher else None
         }
 
 
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """按行做 L2 归一化，零向量保持不变"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
 class QwenTextRecommender:
     """
     基于Qwen嵌入的文本推荐系统
@@ -317,6 +589,18 @@ class QwenTextRecommender:
             embedding_service: Qwen嵌入服务实例
         """
         self.embedding_service = embedding_service
+        # {文本列名: (列内容指纹, 预归一化嵌入矩阵)}
+        self._matrix_cache: Dict[str, Tuple[int, np.ndarray]] = {}
+    
+    def _get_column_matrix(self, text_column: str, texts: List[str]) -> np.ndarray:
+        """获取文本列的预归一化嵌入矩阵，列内容未变化时复用缓存"""
+        fingerprint = hash(tuple(texts))
+        cached = self._matrix_cache.get(text_column)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        matrix = self.embedding_service.build_normalized_matrix(texts)
+        self._matrix_cache[text_column] = (fingerprint, matrix)
+        return matrix
     
     def load_data_from_csv(self, csv_path: str, text_column: str) -> pd.DataFrame:
         """
@@ -358,19 +642,21 @@ class QwenTextRecommender:
         texts = df[text_column].tolist()
         
         if query_text is not None:
-            results = self.embedding_service.find_similar_texts(query_text, texts, top_k)
+            matrix = self._get_column_matrix(text_column, texts)
+            query_embedding = self.embedding_service.get_embedding(query_text)
+            results = [
+                {'text': texts[i], 'similarity': similarity, 'index': i}
+                for i, similarity in self.embedding_service.top_k_from_matrix(query_embedding, matrix, top_k)
+            ]
         elif source_index is not None:
-            results = self.embedding_service.recommend_from_list(texts, source_index, top_k)
+            matrix = self._get_column_matrix(text_column, texts)
+            results = self.embedding_service.recommend_from_list(texts, source_index, top_k, matrix=matrix)
         else:
             raise ValueError("必须提供 query_text 或 source_index 其中之一")
         
         # 添加完整的行信息
         for result in results:
-            if 'original_index' in result:
-                row_index = result['original_index']
-            else:
-                row_index = result['index']
-            result['row_data'] = df.iloc[row_index].to_dict()
+            result['row_data'] = df.iloc[result['index']].to_dict()
         
         return results
     
@@ -0,0 +1,214 @@
+"""
+语义缓存
+对归一化后的用户输入做嵌入，与同一意图状态下已缓存的输入比较余弦相似度，
+超过阈值时直接返回缓存的结构化结果，跳过 LLM 调用
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r'[\s\.,!?;:~，。！？；：、…～"“”\'‘’]+')
+
+
+def normalize_text(text: str) -> str:
+    """归一化输入：全角转半角、英文小写、去掉空白与标点"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return _PUNCTUATION.sub("", text)
+
+
+def context_fingerprint(context: Any) -> str:
+    """意图状态的指纹，只有状态完全相同的条目之间才做相似度匹配"""
+    payload = json.dumps(context, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Partition:
+    """同一意图状态下的缓存条目"""
+    vectors: List[np.ndarray] = field(default_factory=list)
+    texts: List[str] = field(default_factory=list)
+    values: List[Any] = field(default_factory=list)
+    created_at: List[float] = field(default_factory=list)
+
+
+class SemanticCache:
+    """
+    语义缓存
+
+    条目按意图状态指纹分区，分区内按归一化输入的嵌入向量做最近邻匹配；
+    嵌入复用 QwenEmbeddingService 的异步批处理与向量缓存。
+    """
+
+    def __init__(
+        self,
+        embedding_service,
+        threshold: Optional[float] = None,
+        ttl: Optional[float] = None,
+        max_entries: int = 4096
+    ):
+        """
+        初始化语义缓存
+
+        Args:
+            embedding_service: QwenEmbeddingService 实例
+            threshold: 命中所需的最低余弦相似度，为None时读取环境变量SEMANTIC_CACHE_THRESHOLD（默认0.95）
+            ttl: 条目存活秒数，为None时读取环境变量SEMANTIC_CACHE_TTL（默认3600）
+            max_entries: 最大条目数，超过时淘汰最早写入的条目
+        """
+        self.embedding_service = embedding_service
+        self.threshold = threshold if threshold is not None else float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95))
+        self.ttl = ttl if ttl is not None else float(os.getenv("SEMANTIC_CACHE_TTL", 3600))
+        self.max_entries = max_entries
+        self._partitions: Dict[str, _Partition] = {}
+        self._size = 0
+        self._metrics = {'lookups': 0, 'hits': 0, 'misses': 0, 'expired': 0, 'stores': 0, 'evictions': 0}
+
+    async def _embed(self, normalized: str) -> np.ndarray:
+        vector = np.asarray(await self.embedding_service.aget_embedding(normalized), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _purge_expired(self, partition: _Partition, now: float):
+        keep = [i for i, t in enumerate(partition.created_at) if now - t <= self.ttl]
+        expired = len(partition.created_at) - len(keep)
+        if not expired:
+            return
+        for name in ("vectors", "texts", "values", "created_at"):
+            items = getattr(partition, name)
+            setattr(partition, name, [items[i] for i in keep])
+        self._size -= expired
+        self._metrics['expired'] += expired
+
+    def _lookup(self, key: str, vector: np.ndarray) -> Optional[Any]:
+        self._metrics['lookups'] += 1
+        partition = self._partitions.get(key)
+        if partition is not None:
+            self._purge_expired(partition, time.time())
+        if not partition or not partition.vectors:
+            self._metrics['misses'] += 1
+            return None
+        scores = np.stack(partition.vectors) @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            self._metrics['misses'] += 1
+            return None
+        self._metrics['hits'] += 1
+        logger.info(f"语义缓存命中 (相似度 {scores[best]:.3f}): {partition.texts[best]}")
+        # 返回副本，调用方修改结果不会影响缓存
+        return copy.deepcopy(partition.values[best])
+
+    def _store(self, key: str, normalized: str, vector: np.ndarray, value: Any):
+        partition = self._partitions.setdefault(key, _Partition())
+        partition.vectors.append(vector)
+        partition.texts.append(normalized)
+        partition.values.append(value)
+        partition.created_at.append(time.time())
+        self._size += 1
+        self._metrics['stores'] += 1
+        while self._size > self.max_entries:
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        key, partition = min(
+            ((k, p) for k, p in self._partitions.items() if p.created_at),
+            key=lambda kp: kp[1].created_at[0]
+        )
+        for name in ("vectors", "texts", "values", "created_at"):
+            getattr(partition, name).pop(0)
+        if not partition.created_at:
+            del self._partitions[key]
+        self._size -= 1
+        self._metrics['evictions'] += 1
+
+    async def get(self, text: str, context: Any = None) -> Optional[Any]:
+        """
+        查找语义相近的缓存结果
+
+        Args:
+            text: 用户输入
+            context: 意图状态（可 JSON 序列化），只与状态相同的条目匹配
+
+        Returns:
+            缓存的结果，未命中时返回 None
+        """
+        normalized = normalize_text(text)
+        if not normalized:
+            return None
+        return self._lookup(context_fingerprint(context), await self._embed(normalized))
+
+    async def put(self, text: str, value: Any, context: Any = None):
+        """
+        写入缓存
+
+        Args:
+            text: 用户输入
+            value: 结构化结果
+            context: 意图状态
+        """
+        normalized = normalize_text(text)
+        if normalized:
+            self._store(context_fingerprint(context), normalized, await self._embed(normalized), copy.deepcopy(value))
+
+    async def get_or_compute(
+        self,
+        text: str,
+        compute: Callable[[], Awaitable[Any]],
+        context: Any = None,
+        cacheable: Callable[[Any], bool] = lambda value: True
+    ) -> Any:
+        """
+        命中时返回缓存结果，否则调用 compute 并写入缓存
+
+        Args:
+            text: 用户输入
+            compute: 未命中时计算结果的协程函数
+            context: 意图状态
+            cacheable: 判断结果是否值得缓存（例如解析失败的结果不缓存）
+
+        Returns:
+            结果
+        """
+        normalized = normalize_text(text)
+        if not normalized:
+            return await compute()
+        key = context_fingerprint(context)
+        try:
+            vector = await self._embed(normalized)
+        except Exception as e:
+            logger.warning(f"语义缓存嵌入失败，直接调用: {e}")
+            return await compute()
+        value = self._lookup(key, vector)
+        if value is not None:
+            return value
+        value = await compute()
+        if cacheable(value):
+            self._store(key, normalized, vector, copy.deepcopy(value))
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        """命中率等统计信息"""
+        lookups = self._metrics['lookups']
+        return {
+            **self._metrics,
+            'entries': self._size,
+            'hit_rate': self._metrics['hits'] / lookups if lookups else 0.0,
+            'threshold': self.threshold,
+            'ttl': self.ttl
+        }
+
+    def clear(self):
+        """清空缓存（统计信息保留）"""
+        self._partitions.clear()
+        self._size = 0
@@ -0,0 +1,167 @@
+"""
+LLM 流式 JSON 输出的增量解析
+用于 /api/vibe 的流式响应：message 字段逐字推送，intent 对象一经完整即可解析
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_INTENT_KEY = re.compile(r'"intent"\s*:\s*\{')
+_MESSAGE_KEY = re.compile(r'"message"\s*:\s*"')
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+_HEX4 = re.compile(r'[0-9a-fA-F]{4}')
+_REPLACEMENT = '\ufffd'
+
+
+def _decode_unicode_escape(text: str, pos: int) -> Optional[Tuple[str, int]]:
+    """
+    解码 pos 处的 \\uXXXX 转义（代理对合并为一个字符）
+
+    Returns:
+        (字符, 下一个位置)；转义尚不完整时返回 None。
+        无效的十六进制或落单的代理项解码为 U+FFFD，保证输出可以编码为 UTF-8
+    """
+    if pos + 6 > len(text):
+        return None
+    if not _HEX4.fullmatch(text, pos + 2, pos + 6):
+        return _REPLACEMENT, pos + 6
+    code = int(text[pos + 2:pos + 6], 16)
+    if 0xDC00 <= code <= 0xDFFF:
+        return _REPLACEMENT, pos + 6
+    if not 0xD800 <= code <= 0xDBFF:
+        return chr(code), pos + 6
+    # 高代理项，需要紧随其后的 \\uXXXX 低代理项
+    follow = text[pos + 6:pos + 8]
+    if follow != '\\u'[:len(follow)]:
+        return _REPLACEMENT, pos + 6
+    if pos + 12 > len(text):
+        return None
+    if _HEX4.fullmatch(text, pos + 8, pos + 12):
+        low = int(text[pos + 8:pos + 12], 16)
+        if 0xDC00 <= low <= 0xDFFF:
+            return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), pos + 12
+    return _REPLACEMENT, pos + 6
+
+
+def _find_object_end(text: str, start: int) -> Optional[int]:
+    """从 start 处的 '{' 开始匹配括号，返回对象结束位置（不含），未闭合时返回 None"""
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+
+def parse_llm_json(text: str) -> Dict[str, Any]:
+    """解析 LLM 输出的 JSON，容忍外层的 ``` 代码块或多余说明文字"""
+    start = text.find('{')
+    end = text.rfind('}')
+    if start < 0 or end < start:
+        raise ValueError("输出中没有 JSON 对象")
+    return json.loads(text[start:end + 1])
+
+
+class IntentStreamParser:
+    """
+    增量解析形如 {"intent": {...}, "message": "..."} 的流式输出
+
+    每次 feed 返回新产生的事件:
+        ("intent", dict): intent 对象完整出现时触发一次
+        ("message", str): message 字段新增的已解码文本
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.intent: Optional[Dict[str, Any]] = None
+        self.message = ""
+        self._message_pos: Optional[int] = None
+        self._message_done = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        输入一段新生成的文本
+
+        Args:
+            chunk: 模型新输出的文本片段
+
+        Returns:
+            本次产生的事件列表
+        """
+        self.buffer += chunk
+        events: List[Tuple[str, Any]] = []
+
+        if self.intent is None:
+            match = _INTENT_KEY.search(self.buffer)
+            if match:
+                start = match.end() - 1
+                end = _find_object_end(self.buffer, start)
+                if end is not None:
+                    try:
+                        self.intent = json.loads(self.buffer[start:end])
+                        events.append(("intent", self.intent))
+                    except json.JSONDecodeError:
+                        pass
+
+        if self._message_pos is None:
+            match = _MESSAGE_KEY.search(self.buffer)
+            if match:
+                self._message_pos = match.end()
+
+        if self._message_pos is not None and not self._message_done:
+            delta = self._decode_message()
+            if delta:
+                self.message += delta
+                events.append(("message", delta))
+
+        return events
+
+    def _decode_message(self) -> str:
+        """从上次位置继续解码 message 字符串，遇到不完整的转义序列时停下等待后续片段"""
+        out = []
+        pos = self._message_pos
+        text = self.buffer
+        while pos < len(text):
+            ch = text[pos]
+            if ch == '"':
+                self._message_done = True
+                pos += 1
+                break
+            if ch != '\\':
+                out.append(ch)
+                pos += 1
+                continue
+            if pos + 1 >= len(text):
+                break
+            code = text[pos + 1]
+            if code == 'u':
+                decoded = _decode_unicode_escape(text, pos)
+                if decoded is None:
+                    break
+                ch, pos = decoded
+                out.append(ch)
+            else:
+                out.append(_ESCAPES.get(code, code))
+                pos += 2
+        self._message_pos = pos
+        return ''.join(out)
+
+    def result(self) -> Dict[str, Any]:
+        """流结束后解析完整输出"""
+        return parse_llm_json(self.buffer)
@@ -0,0 +1,286 @@
+"""
+商品概述缓存
+以 (goodId, 详情哈希, 提示词版本) 为键，进程内 LRU + 本地 SQLite 持久化，
+并对同一个键的并发生成做 single-flight 合并；
+同一 SQLite 文件中还保存商品卡片（详情哈希、标题、图片、价格），
+/api/thread 命中时无需再查询 Weaviate
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SummaryKey = Tuple[int, str, str]
+
+# 修改 SUMMARY_PROMPT 时同步递增版本号，已缓存的旧概述随之失效
+SUMMARY_PROMPT_VERSION = "v1"
+SUMMARY_PROMPT = """
+===
+请你担任一名专业的商品导购，商场提出两点和场景点，我会给你商品的详细描述，请根据描述生成一个商品的简要概述，其中请考虑用户会如何做决策，不多于 50 字。
+""".strip()
+SUMMARY_CACHE_PATH = os.getenv("PRODUCT_SUMMARY_CACHE", "product_summaries.sqlite3")
+
+
+def build_summary_prompt(detail: str) -> str:
+    """拼接商品详情与概述提示词"""
+    return detail + SUMMARY_PROMPT
+
+
+def detail_hash(detail: str) -> str:
+    """商品详情的内容哈希"""
+    return hashlib.sha256(detail.encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    """
+    商品概述缓存
+
+    详情或提示词版本变化时键随之变化，旧条目自然失效，无需主动清理。
+    """
+
+    def __init__(self, path: str = SUMMARY_CACHE_PATH, max_entries: int = 4096):
+        """
+        初始化缓存
+
+        Args:
+            path: SQLite 文件路径
+            max_entries: 进程内 LRU 的最大条目数
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[SummaryKey, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[SummaryKey, asyncio.Task] = {}
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL;")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS product_summary (
+                good_id INTEGER NOT NULL,
+                detail_hash TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (good_id, detail_hash, prompt_version)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS product_card (
+                good_id INTEGER PRIMARY KEY,
+                detail_hash TEXT NOT NULL,
+                title TEXT NOT NULL,
+                pic_url TEXT NOT NULL,
+                price TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+        self.stats = {'memory_hits': 0, 'store_hits': 0, 'misses': 0, 'generations': 0, 'coalesced': 0}
+
+    @staticmethod
+    def make_key(good_id: int, detail: str, prompt_version: str) -> SummaryKey:
+        """构造缓存键"""
+        return int(good_id), detail_hash(detail), prompt_version
+
+    def get(self, key: SummaryKey) -> Optional[str]:
+        """
+        读取概述，先查进程内 LRU，再查 SQLite
+
+        Args:
+            key: make_key 返回的键
+
+        Returns:
+            概述文本，未命中时返回 None
+        """
+        with self._lock:
+            summary = self._memory.get(key)
+            if summary is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return summary
+
+            row = self._conn.execute(
+                "SELECT summary FROM product_summary WHERE good_id = ? AND detail_hash = ? AND prompt_version = ?",
+                key
+            ).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['store_hits'] += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, key: SummaryKey, summary: str):
+        """写入概述"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO product_summary VALUES (?, ?, ?, ?, ?)",
+                (*key, summary, time.time())
+            )
+            self._conn.commit()
+            self._remember(key, summary)
+
+    def _remember(self, key: SummaryKey, summary: str):
+        self._memory[key] = summary
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def put_product(self, good_id: int, detail: str, title: str, pic_url: str, price: Any):
+        """
+        写入商品卡片
+
+        Args:
+            good_id: 商品ID
+            detail: 商品详情（只保存哈希）
+            title: 商品名称
+            pic_url: 图片地址
+            price: 价格
+        """
+        self.put_products([(good_id, detail, title, pic_url, price)])
+
+    def put_products(self, cards: Iterable[Tuple[int, str, str, str, Any]]):
+        """
+        批量写入商品卡片（一次提交）
+
+        Args:
+            cards: (商品ID, 详情, 名称, 图片地址, 价格) 列表
+        """
+        now = time.time()
+        rows = [
+            (int(good_id), detail_hash(detail), title or "", pic_url or "", str(price or ""), now)
+            for good_id, detail, title, pic_url, price in cards
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO product_card VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def lookup_product(self, good_id: int, prompt_version: str) -> Optional[Dict[str, Any]]:
+        """
+        读取商品卡片及与其详情哈希匹配的概述
+
+        Args:
+            good_id: 商品ID
+            prompt_version: 提示词版本
+
+        Returns:
+            {"title", "pic_url", "price", "summary"}，没有卡片或概述时返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT detail_hash, title, pic_url, price FROM product_card WHERE good_id = ?",
+                (int(good_id),)
+            ).fetchone()
+        if row is None:
+            return None
+        summary = self.get((int(good_id), row[0], prompt_version))
+        if summary is None:
+            return None
+        return {"title": row[1], "pic_url": row[2], "price": row[3], "summary": summary}
+
+    def contains(self, key: SummaryKey) -> bool:
+        """是否已有该键的概述，不影响 LRU 顺序与命中统计"""
+        with self._lock:
+            if key in self._memory:
+                return True
+            row = self._conn.execute(
+                "SELECT 1 FROM product_summary WHERE good_id = ? AND detail_hash = ? AND prompt_version = ?",
+                key
+            ).fetchone()
+            return row is not None
+
+    def prune(self, keep: Iterable[SummaryKey]) -> int:
+        """
+        删除 keep 所涉及商品的其他条目（详情已变化或提示词版本过期的旧概述）
+
+        只处理 keep 中出现的 goodId，其余商品的概述保持不变，
+        因此对部分商品目录运行预计算不会删除目录之外的商品。
+
+        Args:
+            keep: 需要保留的键
+
+        Returns:
+            删除的条目数
+        """
+        keep = set(keep)
+        good_ids = {key[0] for key in keep}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT good_id, detail_hash, prompt_version FROM product_summary"
+            ).fetchall()
+            stale = [tuple(row) for row in rows if row[0] in good_ids and tuple(row) not in keep]
+            self._conn.executemany(
+                "DELETE FROM product_summary WHERE good_id = ? AND detail_hash = ? AND prompt_version = ?",
+                stale
+            )
+            self._conn.commit()
+            for key in stale:
+                self._memory.pop(key, None)
+        return len(stale)
+
+    async def get_or_create(
+        self,
+        good_id: int,
+        detail: str,
+        prompt_version: str,
+        generate: Callable[[], Awaitable[str]]
+    ) -> str:
+        """
+        读取概述，未命中时生成并写入
+
+        同一个键的并发请求只会触发一次 generate，其余请求等待同一结果。
+        生成在独立的任务中进行，任一调用方（包括首个）被取消都不会影响其他等待方，
+        生成完成后结果照常写入缓存。
+
+        Args:
+            good_id: 商品ID
+            detail: 商品详情
+            prompt_version: 提示词版本
+            generate: 生成概述的协程函数
+
+        Returns:
+            概述文本
+        """
+        key = self.make_key(good_id, detail, prompt_version)
+        summary = self.get(key)
+        if summary is not None:
+            return summary
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats['coalesced'] += 1
+        else:
+            self.stats['generations'] += 1
+            task = asyncio.create_task(self._generate(key, generate))
+            self._inflight[key] = task
+            task.add_done_callback(self._generation_done)
+        # shield: 调用方被取消时生成任务继续运行
+        return await asyncio.shield(task)
+
+    async def _generate(self, key: SummaryKey, generate: Callable[[], Awaitable[str]]) -> str:
+        try:
+            summary = await generate()
+            self.put(key, summary)
+            return summary
+        finally:
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    def _generation_done(task: asyncio.Task):
+        # 所有等待方都已取消时，避免出现 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    def close(self):
+        """关闭 SQLite 连接"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,147 @@
+"""
+商品概述预计算
+离线遍历 resource/good 下的商品目录，为每件商品生成概述并写入 SummaryCache，
+同时写入商品卡片（标题、图片、价格与详情哈希）；
+/api/thread 直接读取预计算结果，仅在未命中时才查询 Weaviate 并即时生成
+
+用法:
+    python -m tools.rag.summary_precompute [商品目录] [--concurrency N]
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from tools.rag.local_ann_index import DEFAULT_GOODS_DIR, load_catalog
+from tools.rag.summary_cache import (
+    SUMMARY_PROMPT_VERSION,
+    SummaryCache,
+    build_summary_prompt,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    """是否为限流错误（HTTP 429）"""
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """读取限流响应中的 Retry-After（秒），没有时返回 None"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def precompute_summaries(
+    items: List[Dict[str, Any]],
+    generate: Callable[[str], Awaitable[str]],
+    cache: SummaryCache,
+    prompt_version: str = SUMMARY_PROMPT_VERSION,
+    concurrency: int = 4,
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    prune: bool = True
+) -> Dict[str, Any]:
+    """
+    为商品批量生成概述
+
+    已有与当前详情和提示词版本匹配的概述时跳过；并发数由信号量限制，
+    限流错误按 Retry-After 或指数退避（带抖动）等待后重试，其余错误同样退避重试。
+
+    Args:
+        items: 商品列表（load_catalog 的返回格式）
+        generate: 输入提示词、返回概述的协程函数
+        cache: 概述缓存
+        prompt_version: 提示词版本
+        concurrency: 同时进行的生成请求数
+        max_retries: 单件商品的最大重试次数
+        base_delay: 首次退避时间（秒）
+        max_delay: 单次退避的上限（秒）
+        prune: 是否删除 items 中商品的旧概述（详情已变化或提示词版本过期），不涉及 items 之外的商品
+
+    Returns:
+        统计信息 {"total", "skipped", "generated", "failed", "rate_limited", "pruned", "seconds"}
+    """
+    start_time = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {"total": len(items), "skipped": 0, "generated": 0, "failed": 0, "rate_limited": 0, "pruned": 0}
+    failed_ids = []
+
+    cache.put_products(
+        (item["goodId"], item["detail"], item["name"], item["picUrl"], item["price"]) for item in items
+    )
+    pending = []
+    for item in items:
+        key = cache.make_key(item["goodId"], item["detail"], prompt_version)
+        if cache.contains(key):
+            stats["skipped"] += 1
+        else:
+            pending.append((key, item))
+    logger.info(f"待生成概述: {len(pending)}，已是最新: {stats['skipped']}")
+
+    async def worker(key, item):
+        for attempt in range(max_retries + 1):
+            async with semaphore:
+                try:
+                    summary = await generate(build_summary_prompt(item["detail"]))
+                except Exception as e:
+                    error = e
+                else:
+                    cache.put(key, summary)
+                    stats["generated"] += 1
+                    return
+            # 退避在信号量之外等待，不占用并发名额
+            if attempt == max_retries:
+                break
+            delay = min(max_delay, base_delay * (2 ** attempt)) * (0.5 + random.random() / 2)
+            if _is_rate_limited(error):
+                stats["rate_limited"] += 1
+                delay = _retry_after(error) or delay
+            logger.warning(f"商品 {item['goodId']} 概述生成失败，{delay:.1f}s 后重试: {error}")
+            await asyncio.sleep(delay)
+        stats["failed"] += 1
+        failed_ids.append(item["goodId"])
+        logger.error(f"商品 {item['goodId']} 概述生成最终失败: {error}")
+
+    await asyncio.gather(*(worker(key, item) for key, item in pending))
+
+    if prune:
+        stats["pruned"] = cache.prune(
+            cache.make_key(item["goodId"], item["detail"], prompt_version) for item in items
+        )
+
+    stats["seconds"] = round(time.perf_counter() - start_time, 2)
+    logger.info(f"概述预计算完成: {stats}")
+    if failed_ids:
+        logger.error(f"未能生成概述的商品: {sorted(failed_ids)}")
+    return stats
+
+
+async def main(goods_dir: str = DEFAULT_GOODS_DIR, concurrency: int = 4):
+    from tools.rag.qwen_embedding import AsyncKimiGPTService
+
+    kimi = AsyncKimiGPTService()
+    cache = SummaryCache()
+    try:
+        return await precompute_summaries(load_catalog(goods_dir), kimi.generate, cache, concurrency=concurrency)
+    finally:
+        await kimi.aclose()
+        cache.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="预计算商品概述")
+    parser.add_argument("goods_dir", nargs="?", default=DEFAULT_GOODS_DIR)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.goods_dir, args.concurrency))
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件
+
+用于测试对话压缩的触发条件、摘要缓存、失败降级与会话状态的内存上限。
+"""
+
+import unittest
+
+from tools.rag.conversation_compactor import ConversationCompactor, estimate_tokens
+
+
+class FakeDialogCRUD:
+    """模拟 AsyncDialogCRUD 的 get_dialog_state / save_summary"""
+
+    def __init__(self, messages):
+        self.rows = list(enumerate(messages, start=1))
+        self.summary = None
+        self.last_dialog_id = 0
+
+    async def get_dialog_state(self, session_id, window=None):
+        recent = [(i, m) for i, m in self.rows if i > self.last_dialog_id]
+        return {
+            'summary': self.summary,
+            'messages': [m for _, m in recent],
+            'message_ids': [i for i, _ in recent],
+            'intent_info': None
+        }
+
+    async def save_summary(self, session_id, summary, last_dialog_id):
+        self.summary, self.last_dialog_id = summary, last_dialog_id
+        return True
+
+
+class TestConversationCompactor(unittest.IsolatedAsyncioTestCase):
+    """对话压缩测试"""
+
+    def setUp(self):
+        self.prompts = []
+
+    async def _summarize(self, prompt):
+        self.prompts.append(prompt)
+        return f"摘要{len(self.prompts)}"
+
+    async def test_compact_folds_old_turns_and_caches_summary(self):
+        """测试超出预算时只压缩较早轮次，后续调用复用缓存的摘要"""
+        compactor = ConversationCompactor(self._summarize, token_budget=50, keep_recent=2)
+        turns = [f"user: 我想买一台轻薄笔记本，第{i}轮" for i in range(8)]
+        summary, recent = await compactor.compact("s1", turns)
+        self.assertEqual(summary, "摘要1")
+        self.assertEqual(recent, turns[-2:])
+
+        turns.append("user: 预算五千")
+        summary, recent = await compactor.compact("s1", turns)
+        self.assertEqual((summary, recent), ("摘要1", turns[-3:]))
+        self.assertEqual(len(self.prompts), 1)
+
+        # 其他会话互不影响
+        self.assertEqual(await compactor.compact("s2", turns[:2]), (None, turns[:2]))
+
+    async def test_compact_falls_back_to_recent_turns_on_failure(self):
+        """测试摘要生成失败时截取最近轮次"""
+        async def fail(prompt):
+            raise RuntimeError("timeout")
+
+        compactor = ConversationCompactor(fail, token_budget=10, keep_recent=2)
+        turns = ["user: 第一轮对话内容", "user: 第二轮对话内容", "user: 第三轮对话内容"]
+        self.assertEqual(await compactor.compact("s1", turns), (None, turns[-2:]))
+        self.assertEqual(compactor.stats['failures'], 1)
+
+    async def test_compact_dialog_writes_summary_row(self):
+        """测试数据库会话按 max_turns 触发压缩并记录覆盖到的 dialog.id"""
+        crud = FakeDialogCRUD([f"消息{i}" for i in range(6)])
+        compactor = ConversationCompactor(self._summarize, token_budget=10_000, keep_recent=2, max_turns=5)
+        self.assertTrue(await compactor.compact_dialog(crud, "s1"))
+        self.assertEqual((crud.summary, crud.last_dialog_id), ("摘要1", 4))
+        self.assertFalse(await compactor.compact_dialog(crud, "s1"))
+
+    async def test_session_state_is_bounded(self):
+        """测试摘要缓存按 LRU 限制会话数，会话锁在使用后释放"""
+        compactor = ConversationCompactor(self._summarize, token_budget=10, keep_recent=1, max_sessions=2)
+        turns = ["用户: 想买个充电宝，要能上飞机的", "助手: 好的"]
+        for session_id in ("a", "b", "a", "c"):
+            await compactor.compact(session_id, turns)
+        self.assertEqual(list(compactor._summaries), ["a", "c"])
+        self.assertEqual(compactor._locks, {})
+
+    def test_estimate_tokens(self):
+        """测试中文按字、英文按 4 字符估计"""
+        self.assertEqual(estimate_tokens("充电宝"), 3)
+        self.assertEqual(estimate_tokens("abcdefgh"), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
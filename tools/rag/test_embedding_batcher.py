@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件
+
+用于测试嵌入请求的合并、去重与分块发送。
+"""
+
+import asyncio
+import unittest
+
+from tools.rag.embedding_batcher import EmbeddingBatcher
+
+
+class FakeEmbeddingService:
+    """记录 API 调用的假嵌入服务"""
+
+    def __init__(self, fail: bool = False, drop: int = 0):
+        self.calls = []
+        self.cache = {}
+        self.fail = fail
+        self.drop = drop
+
+    def _lookup_cached(self, text):
+        return None
+
+    def _cache_embeddings(self, texts, embeddings):
+        self.cache.update(zip(texts, embeddings))
+
+    def generate_embeddings(self, texts):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("API调用失败")
+        return [[float(len(text))] for text in texts][:len(texts) - self.drop]
+
+
+class TestEmbeddingBatcher(unittest.IsolatedAsyncioTestCase):
+    """嵌入请求分发器测试"""
+
+    async def test_concurrent_requests_are_batched(self):
+        """测试并发请求合并为一次调用"""
+        service = FakeEmbeddingService()
+        batcher = EmbeddingBatcher(service, max_batch_size=10, max_wait=0.01)
+        results = await asyncio.gather(*(batcher.get_embedding("x" * i) for i in range(1, 6)))
+        self.assertEqual(results, [[1.0], [2.0], [3.0], [4.0], [5.0]])
+        self.assertEqual(len(service.calls), 1)
+        self.assertEqual(len(service.cache), 5)
+
+    async def test_identical_texts_are_deduplicated(self):
+        """测试飞行中的相同文本只发送一次"""
+        service = FakeEmbeddingService()
+        batcher = EmbeddingBatcher(service, max_wait=0.01)
+        results = await batcher.get_embeddings(["充电宝"] * 20)
+        self.assertEqual(results, [[3.0]] * 20)
+        self.assertEqual(service.calls, [["充电宝"]])
+        self.assertEqual(batcher.stats['deduplicated'], 19)
+
+    async def test_chunks_respect_batch_limit(self):
+        """测试按批量上限分块"""
+        service = FakeEmbeddingService()
+        batcher = EmbeddingBatcher(service, max_batch_size=10, max_wait=0.01)
+        await batcher.get_embeddings([f"文本{i}" for i in range(25)])
+        self.assertEqual([len(call) for call in service.calls], [10, 10, 5])
+
+    async def test_errors_propagate_to_all_waiters(self):
+        """测试失败时所有等待方都收到异常"""
+        service = FakeEmbeddingService(fail=True)
+        batcher = EmbeddingBatcher(service, max_wait=0.01)
+        results = await asyncio.gather(
+            batcher.get_embedding("a"), batcher.get_embedding("a"), return_exceptions=True
+        )
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+        self.assertEqual(batcher._inflight, {})
+
+    async def test_short_response_fails_all_waiters(self):
+        """测试返回的向量少于文本数时所有等待方都收到异常，不会一直挂起"""
+        service = FakeEmbeddingService(drop=1)
+        batcher = EmbeddingBatcher(service, max_wait=0.01)
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batcher.get_embedding(t) for t in ("a", "bb", "ccc")), return_exceptions=True),
+            timeout=1
+        )
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(batcher._inflight, {})
+        self.assertEqual(service.cache, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件
+
+用于测试进程内嵌入向量缓存的 LRU/TTL 淘汰与统计。
+"""
+
+import time
+import unittest
+
+from tools.rag.embedding_cache import LRUEmbeddingCache
+
+
+class TestLRUEmbeddingCache(unittest.TestCase):
+    """进程内缓存测试"""
+
+    def test_hit_and_miss_counters(self):
+        """测试命中与未命中计数"""
+        cache = LRUEmbeddingCache(max_bytes=1024)
+        cache.put("a", [1.0, 2.0])
+        self.assertEqual(cache.get("a").tolist(), [1.0, 2.0])
+        self.assertIsNone(cache.get("b"))
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['bytes'], 8)
+
+    def test_lru_eviction_by_bytes(self):
+        """测试超出字节预算时淘汰最久未使用的条目"""
+        cache = LRUEmbeddingCache(max_bytes=16)  # 两个 2 维 float32 向量
+        cache.put("a", [1.0, 1.0])
+        cache.put("b", [2.0, 2.0])
+        cache.get("a")
+        cache.put("c", [3.0, 3.0])
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertLessEqual(cache.stats()['bytes'], 16)
+
+    def test_ttl_expiry(self):
+        """测试过期条目被剔除"""
+        cache = LRUEmbeddingCache(max_bytes=1024, ttl=0.01)
+        cache.put("a", [1.0])
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()['expirations'], 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_oversized_vector_is_not_cached(self):
+        """测试超过预算的单个向量不会被缓存"""
+        cache = LRUEmbeddingCache(max_bytes=4)
+        cache.put("a", [1.0, 2.0])
+        self.assertEqual(len(cache), 0)
+
+    def test_vectors_are_read_only(self):
+        """测试返回的向量不可被调用方修改"""
+        cache = LRUEmbeddingCache(max_bytes=1024)
+        cache.put("a", [1.0])
+        with self.assertRaises(ValueError):
+            cache.get("a")[0] = 5.0
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件
+
+用于测试内存映射嵌入向量存储的读写、重载与多进程共享。
+"""
+
+import os
+import tempfile
+import unittest
+from multiprocessing import get_context
+
+import numpy as np
+
+from tools.rag.embedding_store import MmapEmbeddingStore
+
+
+def _worker_put(path, worker_id):
+    store = MmapEmbeddingStore(path)
+    for i in range(50):
+        store.put(f"文本-{worker_id}-{i}", [float(worker_id), float(i), 1.0])
+
+
+class TestMmapEmbeddingStore(unittest.TestCase):
+    """嵌入向量存储测试"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache")
+
+    def tearDown(self):
+        """测试后清理"""
+        self.tmpdir.cleanup()
+
+    def test_put_and_get(self):
+        """测试写入与读取"""
+        store = MmapEmbeddingStore(self.path)
+        store.put("充电宝", [0.1, 0.2, 0.3])
+        self.assertIn("充电宝", store)
+        np.testing.assert_allclose(store.get("充电宝"), [0.1, 0.2, 0.3], rtol=1e-6)
+        self.assertIsNone(store.get("笔记本"))
+
+    def test_reload_from_disk(self):
+        """测试重新打开后数据仍可读取"""
+        store = MmapEmbeddingStore(self.path)
+        store.put_many(["a", "b", "a"], [[1, 0], [0, 1], [9, 9]])
+        self.assertEqual(len(store), 2)
+
+        reopened = MmapEmbeddingStore(self.path)
+        self.assertEqual(reopened.dim, 2)
+        np.testing.assert_array_equal(reopened.get("a"), [1, 0])
+        np.testing.assert_array_equal(reopened.get("b"), [0, 1])
+
+    def test_sees_appends_from_other_instance(self):
+        """测试能读取其他实例追加的数据"""
+        reader = MmapEmbeddingStore(self.path)
+        writer = MmapEmbeddingStore(self.path)
+        writer.put("x", [1.0, 2.0])
+        np.testing.assert_array_equal(reader.get("x"), [1.0, 2.0])
+
+    def test_dimension_mismatch(self):
+        """测试维度不一致时报错"""
+        store = MmapEmbeddingStore(self.path)
+        store.put("x", [1.0, 2.0])
+        with self.assertRaises(ValueError):
+            store.put("y", [1.0, 2.0, 3.0])
+
+    def test_truncated_tail_is_ignored(self):
+        """测试崩溃留下的残行会被截断"""
+        store = MmapEmbeddingStore(self.path)
+        store.put("x", [1.0, 2.0])
+        with open(store.vectors_path, "ab") as f:
+            f.write(b"\x00\x01")
+        store.put("y", [3.0, 4.0])
+        reopened = MmapEmbeddingStore(self.path)
+        np.testing.assert_array_equal(reopened.get("x"), [1.0, 2.0])
+        np.testing.assert_array_equal(reopened.get("y"), [3.0, 4.0])
+
+    def test_multiprocess_writers(self):
+        """测试多进程并发写入"""
+        ctx = get_context("spawn")
+        processes = [ctx.Process(target=_worker_put, args=(self.path, w)) for w in range(4)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+
+        store = MmapEmbeddingStore(self.path)
+        self.assertEqual(len(store), 200)
+        for w in range(4):
+            for i in (0, 49):
+                np.testing.assert_array_equal(store.get(f"文本-{w}-{i}"), [w, i, 1.0])
+
+    def test_clear(self):
+        """测试清空"""
+        store = MmapEmbeddingStore(self.path)
+        store.put("x", [1.0])
+        store.clear()
+        self.assertEqual(len(store), 0)
+        self.assertFalse(os.path.exists(store.vectors_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件
+
+用于测试本地 IVF 近似最近邻索引的召回、过滤、关键词兜底、分批构建与持久化。
+"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from tools.rag.local_ann_index import DEFAULT_GOODS_DIR, LocalANNIndex, build_catalog_index, load_catalog
+
+
+def _make_items(n):
+    return [
+        {
+            "goodId": i,
+            "name": f"商品{i}",
+            "brandName": "小米" if i % 2 else "华为",
+            "catagory": "数码",
+            "subCatagory": "充电宝" if i % 3 == 0 else "耳机",
+            "itemCatagory": "",
+            "detail": "黑色" if i % 5 == 0 else "白色",
+        }
+        for i in range(n)
+    ]
+
+
+class TestLocalANNIndex(unittest.TestCase):
+    """本地ANN索引测试"""
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(42)
+        cls.items = _make_items(5000)
+        # 真实商品嵌入具有明显的聚类结构，这里用围绕 50 个主题中心的点模拟
+        centers = rng.normal(size=(50, 64))
+        cls.vectors = (centers[rng.integers(50, size=5000)] + rng.normal(scale=0.3, size=(5000, 64))).astype(np.float32)
+        cls.index = LocalANNIndex.build(cls.items, cls.vectors, nprobe=16)
+
+    def _exact_top(self, query, k):
+        normed = self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        return set(np.argsort(-(normed @ query))[:k].tolist())
+
+    def test_recall_against_exact_scan(self):
+        """测试与精确扫描相比的召回率"""
+        rng = np.random.default_rng(7)
+        recalls = []
+        for _ in range(20):
+            query = self.vectors[rng.integers(len(self.vectors))] + rng.normal(scale=0.1, size=64)
+            query = (query / np.linalg.norm(query)).astype(np.float32)
+            hits = {hit["item"]["goodId"] for hit in self.index.search(query, top_k=10)}
+            recalls.append(len(hits & self._exact_top(query, 10)) / 10)
+        self.assertGreaterEqual(np.mean(recalls), 0.8)
+
+    def test_query_returns_itself_first(self):
+        """测试查询库内向量时首个结果为其自身"""
+        hits = self.index.search(self.vectors[123], top_k=3)
+        self.assertEqual(hits[0]["item"]["goodId"], 123)
+        self.assertAlmostEqual(hits[0]["score"], 1.0, places=5)
+
+    def test_negative_keyword_and_category_filters(self):
+        """测试排除关键词与类目过滤"""
+        hits = self.index.search(self.vectors[0], top_k=20, negative_keywords=["黑色", "华为"], category="充电宝")
+        self.assertEqual(len(hits), 20)
+        for hit in hits:
+            self.assertNotEqual(hit["item"]["detail"], "黑色")
+            self.assertEqual(hit["item"]["brandName"], "小米")
+            self.assertEqual(hit["item"]["subCatagory"], "充电宝")
+
+    def test_search_latency(self):
+        """测试单次查询延迟低于 10ms"""
+        query = self.vectors[0]
+        self.index.search(query, top_k=10)
+        start = time.perf_counter()
+        for _ in range(20):
+            self.index.search(query, top_k=10, negative_keywords=["黑色"])
+        self.assertLess((time.perf_counter() - start) / 20, 0.01)
+
+    def test_save_and_load(self):
+        """测试保存后以 mmap 方式加载"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.index.save(tmpdir)
+            loaded = LocalANNIndex.load(tmpdir, nprobe=16)
+            self.assertIsInstance(loaded.vectors, np.memmap)
+            self.assertEqual(
+                [h["item"]["goodId"] for h in loaded.search(self.vectors[5], top_k=5)],
+                [h["item"]["goodId"] for h in self.index.search(self.vectors[5], top_k=5)],
+            )
+
+    def test_empty_index(self):
+        """测试空索引"""
+        index = LocalANNIndex.build([], [])
+        self.assertEqual(index.search([1.0, 0.0], top_k=5), [])
+
+    def test_keyword_search(self):
+        """测试离线关键词匹配与过滤"""
+        hits = self.index.keyword_search("商品12", top_k=3, negative_keywords=["黑色"])
+        self.assertEqual(hits[0]["item"]["goodId"], 12)
+        self.assertEqual(hits[0]["score"], 1.0)
+        self.assertTrue(all("黑色" not in hit["item"]["detail"] for hit in hits))
+        self.assertEqual(self.index.keyword_search("", top_k=3), [])
+
+    def test_build_catalog_index_batches_embedding_calls(self):
+        """测试构建索引时按单次上限分块调用嵌入函数"""
+        batch_sizes = []
+
+        def embed_texts(texts):
+            batch_sizes.append(len(texts))
+            return [[float(len(text)), 1.0] for text in texts]
+
+        with tempfile.TemporaryDirectory() as goods_dir:
+            for i in range(23):
+                folder = os.path.join(goods_dir, str(i))
+                os.makedirs(folder)
+                with open(os.path.join(folder, "clean_data.json"), "w", encoding="utf-8") as f:
+                    json.dump({"good_short_name": f"商品{i}"}, f, ensure_ascii=False)
+                with open(os.path.join(folder, "detail.txt"), "w", encoding="utf-8") as f:
+                    f.write("详情" * (i + 1))
+            index = build_catalog_index(embed_texts, goods_dir=goods_dir)
+
+        self.assertEqual(batch_sizes, [10, 10, 3])
+        self.assertEqual(len(index), 23)
+
+    @unittest.skipUnless(os.path.isdir(DEFAULT_GOODS_DIR), "缺少商品目录")
+    def test_load_catalog(self):
+        """测试读取商品目录"""
+        items = load_catalog()
+        self.assertGreater(len(items), 0)
+        self.assertEqual(items, sorted(items, key=lambda item: item["goodId"]))
+        self.assertIn("detail", items[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
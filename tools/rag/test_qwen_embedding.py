@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件
+
+用于测试矩阵化 top-k 相似度检索的排序、并列、排除与重复文本处理。
+嵌入以固定向量替代，不调用 DashScope API。
+"""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from tools.rag.qwen_embedding import QwenEmbeddingService
+
+VECTORS = {
+    "油烟机": [1.0, 0.0, 0.0],
+    "吸油烟机": [0.9, 0.1, 0.0],
+    "燃气灶": [0.0, 1.0, 0.0],
+    "冰箱": [0.0, 0.0, 1.0],
+}
+
+
+class FakeQwenEmbeddingService(QwenEmbeddingService):
+    """从 VECTORS 读取嵌入的服务"""
+
+    def __init__(self, cache_path):
+        super().__init__(api_key="test", cache_path=cache_path)
+        self.requested = []
+
+    def get_embedding(self, text):
+        self.requested.append(text)
+        return VECTORS[text]
+
+    def get_embeddings_batch(self, texts):
+        self.requested.extend(texts)
+        return [VECTORS[text] for text in texts]
+
+
+class TestTopKSimilarity(unittest.TestCase):
+    """top-k 相似度检索测试"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.service = FakeQwenEmbeddingService(os.path.join(self.tmpdir.name, "cache"))
+
+    def tearDown(self):
+        """测试后清理"""
+        self.tmpdir.cleanup()
+
+    def test_find_similar_texts_without_candidates(self):
+        """测试候选为空时直接返回空列表，不请求嵌入"""
+        self.assertEqual(self.service.find_similar_texts("油烟机", []), [])
+        self.assertEqual(self.service.requested, [])
+
+    def test_get_cached_embedding_does_not_call_api(self):
+        """测试只读缓存的查询未命中时返回 None，不请求嵌入"""
+        self.assertIsNone(self.service.get_cached_embedding("油烟机"))
+        self.service._cache_embeddings(["油烟机"], [VECTORS["油烟机"]])
+        self.assertEqual(self.service.get_cached_embedding("油烟机"), VECTORS["油烟机"])
+        self.assertEqual(self.service.requested, [])
+
+    def test_ties_ordered_by_row(self):
+        """测试相似度相同时按行号升序"""
+        matrix = np.array([[0, 1], [1, 0], [1, 0], [0, 1], [1, 0]], dtype=np.float32)
+        self.assertEqual(
+            self.service.top_k_from_matrix([1.0, 0.0], matrix, top_k=3),
+            [(1, 1.0), (2, 1.0), (4, 1.0)]
+        )
+        self.assertEqual([i for i, _ in self.service.top_k_from_matrix([1.0, 0.0], matrix, top_k=10)], [1, 2, 4, 0, 3])
+
+    def test_ties_at_kth_score_match_stable_sort(self):
+        """测试第k名并列时结果与稳定排序一致"""
+        rng = np.random.default_rng(0)
+        for _ in range(200):
+            n = int(rng.integers(2, 40))
+            top_k = int(rng.integers(1, n + 1))
+            matrix = np.eye(4, dtype=np.float32)[rng.integers(0, 4, size=n)]
+            query = rng.integers(0, 3, size=4).astype(np.float32)
+            expected = np.argsort(-(matrix @ (query / (np.linalg.norm(query) or 1))), kind="stable")[:top_k]
+            results = self.service.top_k_from_matrix(query, matrix, top_k=top_k)
+            self.assertEqual([i for i, _ in results], expected.tolist())
+
+    def test_exclude_index(self):
+        """测试排除的行不出现在结果中，top_k 超出时返回其余全部行"""
+        matrix = self.service.build_normalized_matrix(list(VECTORS))
+        results = self.service.top_k_from_matrix(matrix[0], matrix, top_k=10, exclude_index=0)
+        self.assertEqual([i for i, _ in results], [1, 2, 3])
+        self.assertEqual(self.service.top_k_from_matrix(matrix[0], matrix[:1], top_k=3, exclude_index=0), [])
+
+    def test_recommend_from_list_with_duplicates(self):
+        """测试重复文本各自返回真实位置，index 为原始列表中的位置"""
+        texts = ["燃气灶", "油烟机", "冰箱", "油烟机", "吸油烟机"]
+        results = self.service.recommend_from_list(texts, 1, top_k=2)
+        self.assertEqual([(r['text'], r['index']) for r in results], [("油烟机", 3), ("吸油烟机", 4)])
+        self.assertAlmostEqual(results[0]['similarity'], 1.0, places=5)
+        self.assertTrue(all(r['index'] == r['original_index'] for r in results))
+
+
+if __name__ == "__main__":
+    unittest.main()
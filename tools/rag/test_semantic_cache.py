@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件
+
+用于测试语义缓存的相似度命中、意图状态隔离、TTL 与统计信息。
+"""
+
+import hashlib
+import time
+import unittest
+
+import numpy as np
+
+from tools.rag.semantic_cache import SemanticCache, normalize_text
+
+
+class FakeEmbeddingService:
+    """以首字符决定主方向的确定性嵌入：首字符相同的文本高度相似"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def aget_embedding(self, text):
+        self.calls += 1
+        main = np.zeros(16)
+        main[ord(text[0]) % 16] = 1.0
+        seed = int(hashlib.md5(text.encode("utf-8")).hexdigest(), 16) % (2 ** 32)
+        noise = np.random.default_rng(seed).normal(size=16) * 0.05
+        return (main + noise).tolist()
+
+
+class TestSemanticCache(unittest.IsolatedAsyncioTestCase):
+    """语义缓存测试"""
+
+    async def test_similar_input_hits_within_same_context(self):
+        """测试相近输入在相同意图状态下命中，不同状态互不命中"""
+        cache = SemanticCache(FakeEmbeddingService(), threshold=0.9, ttl=60)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return {"intent": {"title": "充电宝"}}
+
+        first = await cache.get_or_compute("想买个充电宝", compute, context=None)
+        second = await cache.get_or_compute("想买个充电宝！！", compute, context=None)
+        self.assertEqual(first, second)
+        self.assertEqual(len(calls), 1)
+
+        await cache.get_or_compute("想买个充电宝", compute, context={"title": "耳机"})
+        self.assertEqual(len(calls), 2)
+
+        second["intent"]["title"] = "被修改"
+        self.assertEqual((await cache.get("想买个充电宝"))["intent"]["title"], "充电宝")
+
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['entries']), (2, 2))
+        self.assertAlmostEqual(stats['hit_rate'], 2 / 4)
+
+    async def test_dissimilar_input_and_ttl_miss(self):
+        """测试不相似的输入与过期条目不命中"""
+        cache = SemanticCache(FakeEmbeddingService(), threshold=0.9, ttl=60)
+        await cache.put("推荐一款笔记本", {"title": "笔记本"})
+        self.assertIsNone(await cache.get("想买个充电宝"))
+
+        cache.ttl = 0
+        time.sleep(0.01)
+        self.assertIsNone(await cache.get("推荐一款笔记本"))
+        self.assertEqual(cache.stats()['expired'], 1)
+
+    def test_normalize_text(self):
+        """测试全角、大小写与标点归一化"""
+        self.assertEqual(normalize_text(" 推荐一款ＭａｃＢｏｏｋ， 谢谢！"), "推荐一款macbook谢谢")
+
+
+if __name__ == "__main__":
+    unittest.main()
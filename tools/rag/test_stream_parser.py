@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件
+
+用于测试流式 JSON 输出的增量解析。
+"""
+
+import json
+import unittest
+
+from tools.rag.stream_parser import IntentStreamParser, parse_llm_json
+
+
+class TestIntentStreamParser(unittest.TestCase):
+    """流式解析测试"""
+
+    def _feed_in_pieces(self, text, size):
+        parser = IntentStreamParser()
+        events = []
+        for i in range(0, len(text), size):
+            events.extend(parser.feed(text[i:i + size]))
+        return parser, events
+
+    def test_intent_and_message_events(self):
+        """测试 intent 一次性推送、message 逐段推送"""
+        output = json.dumps({
+            "intent": {"title": "充电宝", "attrs": ["安全"], "stop_words": ["黑色"]},
+            "message": "建议确认是否有 \"3C\" 标识\n有需要可以告诉我",
+        }, ensure_ascii=True)
+        for size in (1, 2, 7, len(output)):
+            parser, events = self._feed_in_pieces(output, size)
+            intents = [data for name, data in events if name == "intent"]
+            message = "".join(data for name, data in events if name == "message")
+            self.assertEqual(intents, [{"title": "充电宝", "attrs": ["安全"], "stop_words": ["黑色"]}])
+            self.assertEqual(message, "建议确认是否有 \"3C\" 标识\n有需要可以告诉我")
+            self.assertEqual(parser.result()["message"], message)
+
+    def test_intent_emitted_before_message_finishes(self):
+        """测试 intent 完整后立即推送，无需等待 message 结束"""
+        parser = IntentStreamParser()
+        events = parser.feed('{"intent": {"title": "耳机", "attrs": []}, "message": "正在')
+        self.assertEqual(events[0], ("intent", {"title": "耳机", "attrs": []}))
+        self.assertEqual(events[1], ("message", "正在"))
+
+    def test_escaped_surrogate_pair(self):
+        """测试转义的非 BMP 字符合并为一个字符，输出可编码为 UTF-8"""
+        output = json.dumps({"intent": {}, "message": "好😀"})
+        for size in (1, 3, 7, len(output)):
+            _, events = self._feed_in_pieces(output, size)
+            message = "".join(data for name, data in events if name == "message")
+            self.assertEqual(message, "好😀")
+            json.dumps(message, ensure_ascii=False).encode("utf-8")
+
+    def test_invalid_unicode_escape(self):
+        """测试无效的十六进制与落单的代理项替换为 U+FFFD，不抛出异常"""
+        _, events = self._feed_in_pieces('{"message": "a\\uZZZZb\\ud83dc\\ude00"}', 1)
+        self.assertEqual("".join(data for _, data in events), "a\ufffdb\ufffdc\ufffd")
+
+    def test_parse_llm_json_with_code_fence(self):
+        """测试容忍代码块包裹"""
+        self.assertEqual(parse_llm_json('```json\n{"query": "充电宝"}\n```'), {"query": "充电宝"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件
+
+用于测试商品概述缓存的持久化、失效与并发合并。
+"""
+
+import asyncio
+import os
+import tempfile
+import unittest
+
+from tools.rag.summary_cache import SummaryCache
+from tools.rag.summary_precompute import precompute_summaries
+
+
+class TestSummaryCache(unittest.IsolatedAsyncioTestCase):
+    """概述缓存测试"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "summaries.sqlite3")
+        self.calls = 0
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    async def _generate(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return f"概述{self.calls}"
+
+    async def test_concurrent_requests_generate_once(self):
+        """测试同一商品的并发请求只生成一次"""
+        cache = SummaryCache(self.path)
+        results = await asyncio.gather(*[
+            cache.get_or_create(1, "详情", "v1", self._generate) for _ in range(5)
+        ])
+        self.assertEqual(results, ["概述1"] * 5)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cache.stats['coalesced'], 4)
+        cache.close()
+
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        """测试首个调用方被取消时，其余等待方仍得到结果且结果写入缓存"""
+        cache = SummaryCache(self.path)
+        leader = asyncio.create_task(cache.get_or_create(1, "详情", "v1", self._generate))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(cache.get_or_create(1, "详情", "v1", self._generate))
+        await asyncio.sleep(0.005)
+        leader.cancel()
+        self.assertEqual(await follower, "概述1")
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cache.get(cache.make_key(1, "详情", "v1")), "概述1")
+        cache.close()
+
+    async def test_persisted_and_invalidated_by_detail_or_version(self):
+        """测试重启后命中持久化存储，详情或提示词版本变化时重新生成"""
+        cache = SummaryCache(self.path)
+        await cache.get_or_create(1, "详情", "v1", self._generate)
+        cache.close()
+
+        cache = SummaryCache(self.path)
+        self.assertEqual(await cache.get_or_create(1, "详情", "v1", self._generate), "概述1")
+        self.assertEqual(cache.stats['store_hits'], 1)
+        self.assertEqual(await cache.get_or_create(1, "新详情", "v1", self._generate), "概述2")
+        self.assertEqual(await cache.get_or_create(1, "详情", "v2", self._generate), "概述3")
+        cache.close()
+
+    async def test_failure_not_cached(self):
+        """测试生成失败时不写入缓存"""
+        cache = SummaryCache(self.path)
+
+        async def fail():
+            raise RuntimeError("rate limited")
+
+        with self.assertRaises(RuntimeError):
+            await cache.get_or_create(1, "详情", "v1", fail)
+        self.assertEqual(await cache.get_or_create(1, "详情", "v1", self._generate), "概述1")
+        cache.close()
+
+    async def test_precompute_only_changed_with_rate_limit_retry(self):
+        """测试预计算只生成变化的商品，并在限流后重试"""
+        cache = SummaryCache(self.path)
+        items = [
+            {"goodId": i, "detail": f"详情{i}", "name": f"商品{i}", "picUrl": "", "price": "99"} for i in range(6)
+        ]
+        stats = await precompute_summaries(items, lambda prompt: self._generate(), cache, concurrency=2)
+        self.assertEqual(stats["generated"], 6)
+
+        class RateLimitError(Exception):
+            status_code = 429
+
+        failures = []
+
+        async def flaky(prompt):
+            if not failures:
+                failures.append(prompt)
+                raise RateLimitError("too many requests")
+            return await self._generate()
+
+        items[0] = {"goodId": 0, "detail": "新详情", "name": "商品0", "picUrl": "", "price": "99"}
+        # 只扫描部分目录时，目录之外的商品（goodId 5）不会被删除
+        items.pop()
+        stats = await precompute_summaries(items, flaky, cache, base_delay=0.01)
+        self.assertEqual((stats["generated"], stats["skipped"], stats["rate_limited"]), (1, 4, 1))
+        self.assertEqual(stats["pruned"], 1)
+        self.assertTrue(cache.contains(cache.make_key(0, "新详情", "v1")))
+        self.assertTrue(cache.contains(cache.make_key(5, "详情5", "v1")))
+        cache.close()
+
+    async def test_lookup_product_without_detail(self):
+        """测试按 goodId 读取商品卡片与匹配的概述，详情变化后未重新生成时视为未命中"""
+        cache = SummaryCache(self.path)
+        self.assertIsNone(cache.lookup_product(1, "v1"))
+        cache.put_product(1, "详情", "充电宝", "http://pic", 99)
+        self.assertIsNone(cache.lookup_product(1, "v1"))
+        await cache.get_or_create(1, "详情", "v1", self._generate)
+        self.assertEqual(
+            cache.lookup_product(1, "v1"),
+            {"title": "充电宝", "pic_url": "http://pic", "price": "99", "summary": "概述1"}
+        )
+        self.assertIsNone(cache.lookup_product(1, "v2"))
+        cache.put_product(1, "新详情", "充电宝", "http://pic", 99)
+        self.assertIsNone(cache.lookup_product(1, "v1"))
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件
+
+用于测试商品导入的增量同步：断点只在被中断的导入中生效，失败的商品不会让断点永久保留。
+数据库与嵌入模型以内存实现替代。
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+
+import tools.import_goods_to_pgvector as importer_module
+from tools.import_goods_to_pgvector import GoodsImporter
+
+
+class FakeEmbedding:
+    """返回固定维度向量的嵌入模型"""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, max_length=512):
+        self.encoded.extend(texts)
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+class FakeDB:
+    """以字典保存 {good_key: content_hash} 的数据库"""
+
+    def __init__(self):
+        self.rows = {}
+        self.pending = {}
+        self.deleted = []
+        self.unkeyed_deletes = 0
+        self.index_builds = 0
+        self.has_index = True
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def create_table(self, vector_dim):
+        pass
+
+    def fetch_content_hashes(self):
+        return dict(self.rows)
+
+    def insert_goods_batch(self, goods, embeddings):
+        for good in goods:
+            self.pending[good['good_key']] = good['content_hash']
+
+    def delete_goods(self, good_keys):
+        for key in good_keys:
+            self.rows.pop(key, None)
+        self.deleted.extend(good_keys)
+        return len(good_keys)
+
+    def delete_unkeyed_goods(self):
+        self.unkeyed_deletes += 1
+        return 0
+
+    def commit(self):
+        self.rows.update(self.pending)
+        self.pending = {}
+
+    def rollback(self):
+        self.pending = {}
+
+    def has_vector_index(self):
+        return self.has_index
+
+    def count_goods(self):
+        return len(self.rows)
+
+    def build_vector_index(self, method):
+        self.index_builds += 1
+        self.has_index = True
+        return {}
+
+    def measure_recall(self, params):
+        return 1.0
+
+
+class TestIncrementalImport(unittest.TestCase):
+    """增量导入测试"""
+
+    def setUp(self):
+        """测试前准备"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.goods_dir = Path(self.tmpdir.name) / "good"
+        self.goods_dir.mkdir()
+        self.checkpoint_path = os.path.join(self.tmpdir.name, "import.checkpoint.json")
+        self.db = FakeDB()
+        for i in range(3):
+            self.write_good(f"good_{i}", f"商品{i}", f"详情{i}")
+        # 缺少 clean_data.json，每次导入都会失败
+        (self.goods_dir / "broken").mkdir()
+
+    def tearDown(self):
+        """测试后清理"""
+        self.tmpdir.cleanup()
+
+    def write_good(self, name, title, detail):
+        folder = self.goods_dir / name
+        folder.mkdir(exist_ok=True)
+        with open(folder / "clean_data.json", "w", encoding="utf-8") as f:
+            json.dump({"good_short_name": title, "price": 100}, f, ensure_ascii=False)
+        with open(folder / "detail.txt", "w", encoding="utf-8") as f:
+            f.write(detail)
+
+    def run_import(self, skip_existing=True):
+        embedding = FakeEmbedding()
+        with mock.patch.object(importer_module, "QwenEmbedding", lambda: embedding), \
+                mock.patch.object(importer_module, "PGVectorDB", lambda params: self.db):
+            importer = GoodsImporter(str(self.goods_dir), {}, checkpoint_path=self.checkpoint_path)
+            importer.import_all_goods(skip_existing=skip_existing)
+        # 第一条是探测向量维度的示例文本
+        return embedding.encoded[1:], importer
+
+    def test_failed_folder_does_not_pin_checkpoint(self):
+        """测试失败的商品不会让断点保留，之后修改的商品仍会被重新嵌入"""
+        encoded, importer = self.run_import()
+        self.assertEqual(len(encoded), 3)
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+        with open(importer.checkpoint.failed_path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["failed"], ["broken"])
+
+        # 内容未变化的再次导入不重新嵌入
+        encoded, _ = self.run_import()
+        self.assertEqual(encoded, [])
+
+        time.sleep(0.01)
+        self.write_good("good_1", "商品1", "修改后的详情")
+        encoded, _ = self.run_import()
+        self.assertEqual(len(encoded), 1)
+        self.assertIn("修改后的详情", encoded[0])
+        self.assertEqual(self.db.unkeyed_deletes, 3)
+
+    def test_checkpoint_resumes_only_unmodified_folders(self):
+        """测试中断后续传跳过已提交的商品，但已提交后被修改的商品会重新处理"""
+        signatures = {
+            d.name: importer_module.folder_signature(d) for d in self.goods_dir.iterdir()
+        }
+        with open(self.checkpoint_path, "w", encoding="utf-8") as f:
+            json.dump({"done": {"good_0": signatures["good_0"], "good_1": signatures["good_1"]}}, f)
+        time.sleep(0.01)
+        self.write_good("good_1", "商品1", "修改后的详情")
+
+        encoded, _ = self.run_import()
+        self.assertEqual(len(encoded), 2)
+        self.assertTrue(any("修改后的详情" in text for text in encoded))
+        self.assertFalse(any("详情0" in text for text in encoded))
+
+    def test_full_reimport_still_deletes_removed_goods(self):
+        """测试 skip_existing=False 时仍会删除目录中已移除的商品"""
+        self.db.rows["removed"] = "hash"
+        encoded, _ = self.run_import(skip_existing=False)
+        self.assertEqual(len(encoded), 3)
+        self.assertEqual(self.db.deleted, ["removed"])
+
+    def test_next_chunk_loads_while_current_is_processed(self):
+        """测试调用方处理当前块时下一块已在后台解析"""
+        with mock.patch.object(importer_module, "QwenEmbedding", FakeEmbedding), \
+                mock.patch.object(importer_module, "PGVectorDB", lambda params: self.db):
+            importer = GoodsImporter(str(self.goods_dir), {}, chunk_size=2, checkpoint_path=None)
+        folders = sorted(d for d in self.goods_dir.iterdir() if d.is_dir())
+        second_chunk_loaded = threading.Event()
+        load_good_data = importer.load_good_data
+
+        def load(folder):
+            data = load_good_data(folder)
+            if folder == folders[-1]:
+                second_chunk_loaded.set()
+            return data
+
+        importer.load_good_data = load
+        chunks = importer.iter_loaded_chunks(folders)
+        first = next(chunks)
+        self.assertEqual([folder for folder, _ in first], folders[:2])
+        self.assertTrue(second_chunk_loaded.wait(timeout=2))
+        self.assertEqual([folder for folder, _ in next(chunks)], folders[2:])
+        self.assertEqual(list(chunks), [])
+
+    def test_index_not_built_for_empty_table(self):
+        """测试表中没有商品时不创建向量索引"""
+        self.db.has_index = False
+        for name in ("good_0", "good_1", "good_2"):
+            for path in (self.goods_dir / name).iterdir():
+                path.unlink()
+            (self.goods_dir / name).rmdir()
+        self.run_import()
+        self.assertEqual(self.db.index_builds, 0)
+
+        self.write_good("good_0", "商品0", "详情0")
+        self.run_import()
+        self.assertEqual(self.db.index_builds, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试文件
+
+用于测试向量索引查询参数的确定规则。
+"""
+
+import unittest
+
+from tools.pgvector_params import choose_ivfflat_lists, search_params
+
+
+class TestSearchParams(unittest.TestCase):
+    """查询参数测试"""
+
+    def test_ivfflat_probes(self):
+        """测试 probes 默认取 sqrt(lists)，可由调用方指定"""
+        self.assertEqual(choose_ivfflat_lists(100_000), 100)
+        self.assertEqual(search_params({'method': 'ivfflat', 'lists': 100}), {'method': 'ivfflat', 'probes': 10})
+        self.assertEqual(search_params({'method': 'ivfflat', 'lists': 100}, probes=3)['probes'], 3)
+
+    def test_hnsw_ef_search_follows_limit(self):
+        """测试 ef_search 只取决于返回数量，与建索引时的 m 无关"""
+        self.assertEqual(search_params({'method': 'hnsw', 'm': 32}, limit=10), {'method': 'hnsw', 'ef_search': 40})
+        self.assertEqual(search_params({'method': 'hnsw', 'm': 16}, limit=50)['ef_search'], 100)
+
+    def test_no_index(self):
+        """测试没有索引时不设置查询参数"""
+        self.assertEqual(search_params({}), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -12,13 +12,18 @@
 import os
 import sys
 import logging
-from typing import List, Dict
+from typing import List, Dict, Optional
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import numpy as np
 from transformers import AutoTokenizer, AutoModel
 import torch
 
+try:
+    from tools.pgvector_params import apply_search_params, search_params
+except ImportError:  # 在 tools 目录下直接运行脚本
+    from pgvector_params import apply_search_params, search_params
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -69,12 +74,39 @@ class SemanticSearcher:
             
             return embedding.cpu().numpy()[0]
     
-    def search(self, query: str, limit: int = 10) -> List[Dict]:
+    def get_index_params(self, cursor) -> Dict:
+        """读取 goods_embedding_idx 的类型与参数
+        
+        每次查询都重新读取（只查系统目录，开销很小），导入工具重建索引后
+        新的 lists 等参数立即生效
+        
+        Args:
+            cursor: 数据库游标
+            
+        Returns:
+            索引参数，例如 {'method': 'ivfflat', 'lists': 100}；无索引时返回空字典
+        """
+        cursor.execute("""
+        SELECT am.amname AS method, c.reloptions AS options
+        FROM pg_class c JOIN pg_am am ON am.oid = c.relam
+        WHERE c.relname = 'goods_embedding_idx';
+        """)
+        row = cursor.fetchone()
+        params = {}
+        if row:
+            params['method'] = row['method']
+            for option in row['options'] or []:
+                key, _, value = option.partition('=')
+                params[key] = int(value)
+        return params
+    
+    def search(self, query: str, limit: int = 10, probes: Optional[int] = None) -> List[Dict]:
         """执行语义搜索
         
         Args:
             query: 搜索查询
             limit: 返回结果数量
+            probes: ivfflat 索引扫描的聚类数，为 None 时取 sqrt(lists)
             
         Returns:
             搜索结果列表
@@ -87,6 +119,10 @@ class SemanticSearcher:
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         try:
+            # 按索引规模设置本次查询的扫描参数（仅在当前事务内生效）
+            # 与导入工具测量召回率时使用相同的规则
+            apply_search_params(cursor, search_params(self.get_index_params(cursor), limit, probes))
+            
             # 执行语义搜索
             search_sql = """
             SELECT 
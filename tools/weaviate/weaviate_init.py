@@ -2,12 +2,19 @@ import weaviate
 from weaviate.classes.init import Auth
 import os
 import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
 from dotenv import load_dotenv
 from weaviate.config import AdditionalConfig, Timeout
 from weaviate.auth import AuthApiKey
 from weaviate.classes.config import Property, DataType
+from weaviate.classes.query import Filter
 from weaviate.collections.classes.config import Configure
 from weaviate.collections.classes.grpc import MetadataQuery
+from weaviate.util import generate_uuid5
+from tools.rag.local_ann_index import load_good_item
 from tools.rag.qwen_embedding import QwenEmbeddingService
 
 # Best practice: store your credentials in environment variables
@@ -29,101 +36,221 @@ client = weaviate.connect_to_custom(
 
 
 collection_name = "ResoGoods"
-client.collections.delete(collection_name)
-client.collections.create(
-    name=collection_name,
-    # 定义文本属性
-    properties=[
-        Property(name="goodId", data_type=DataType.INT),
-        Property(name="name", data_type=DataType.TEXT),
-        Property(name="price", data_type=DataType.TEXT),
-        Property(name="brandName", data_type=DataType.TEXT),
-        Property(name="catagory", data_type=DataType.TEXT),
-        Property(name="subCatagory", data_type=DataType.TEXT),
-        Property(name="itemCatagory", data_type=DataType.TEXT),
-        Property(name="picUrl", data_type=DataType.TEXT),
-        Property(name="detail", data_type=DataType.TEXT)
-    ],
-    # 定义向量属性
-    vectorizer_config=[
-        Configure.NamedVectors.none(name="name"),
-        Configure.NamedVectors.none(name="detail"),
-    ]
-)
+
+
+def ensure_collection():
+    """集合不存在时创建；已存在时保留数据，只补充 contentHash 属性"""
+    if client.collections.exists(collection_name):
+        collection = client.collections.get(collection_name)
+        property_names = {p.name for p in collection.config.get().properties}
+        if "contentHash" not in property_names:
+            collection.config.add_property(Property(name="contentHash", data_type=DataType.TEXT))
+        return collection
+
+    return client.collections.create(
+        name=collection_name,
+        # 定义文本属性
+        properties=[
+            Property(name="goodId", data_type=DataType.INT),
+            Property(name="name", data_type=DataType.TEXT),
+            Property(name="price", data_type=DataType.TEXT),
+            Property(name="brandName", data_type=DataType.TEXT),
+            Property(name="catagory", data_type=DataType.TEXT),
+            Property(name="subCatagory", data_type=DataType.TEXT),
+            Property(name="itemCatagory", data_type=DataType.TEXT),
+            Property(name="picUrl", data_type=DataType.TEXT),
+            Property(name="detail", data_type=DataType.TEXT),
+            Property(name="contentHash", data_type=DataType.TEXT)
+        ],
+        # 定义向量属性
+        vectorizer_config=[
+            Configure.NamedVectors.none(name="name"),
+            Configure.NamedVectors.none(name="detail"),
+        ]
+    )
+
 
 qwen = QwenEmbeddingService()
 
-def insert(item):
-    article_collection = client.collections.get(collection_name)
-    
-    # 检查是否已存在相同 ID 的数据
-    from weaviate.classes.query import Filter
-    existing_items = article_collection.query.fetch_objects(
-        filters=Filter.by_property("goodId").equal(item["goodId"]),
-        limit=1
+
+def content_hash(item):
+    """商品内容哈希，覆盖全部写入 Weaviate 的属性（包括生成向量的 name 与 detail）"""
+    payload = json.dumps(
+        {k: v for k, v in item.items() if k != "contentHash"}, ensure_ascii=False, sort_keys=True
     )
-    
-    if existing_items.objects:
-        print(f"跳过插入: ID {item['goodId']} 已存在")
-        return
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def fetch_existing_hashes():
+    """读取已入库商品的 {goodId: (uuid, contentHash)}"""
+    article_collection = client.collections.get(collection_name)
+    existing = {}
+    for obj in article_collection.iterator(return_properties=["goodId", "contentHash"]):
+        existing[obj.properties["goodId"]] = (obj.uuid, obj.properties.get("contentHash"))
+    return existing
+
+
+def insert(item, existing_uuid=None):
+    article_collection = client.collections.get(collection_name)
+
+    # name 与 detail 合并为一次批量嵌入调用
+    name_vector, detail_vector = qwen.get_embeddings_batch([item["name"], item["detail"]])
+    vector = {
+        "name": name_vector,
+        "detail": detail_vector
+    }
+
+    if existing_uuid is not None:
+        # 内容变化：原地替换属性与向量
+        article_collection.data.replace(uuid=existing_uuid, properties=item, vector=vector)
+        print(f"成功更新: {existing_uuid}")
+        return existing_uuid
 
     # 如果不存在，则插入新数据
     uuid = article_collection.data.insert(
         properties=item,
+        uuid=generate_uuid5(item["goodId"]),
         # 添加向量数据
-        vector={
-            "name": qwen.get_embedding(item["name"]),
-            "detail": qwen.get_embedding(item["detail"])
-        }
+        vector=vector
     )
     print(f"成功插入: {uuid}")
     return uuid
 
 
+def delete_goods(good_ids):
+    """删除目录中已不存在的商品"""
+    if not good_ids:
+        return
+    article_collection = client.collections.get(collection_name)
+    article_collection.data.delete_many(
+        where=Filter.by_property("goodId").contains_any(list(good_ids))
+    )
+    print(f"已删除 {len(good_ids)} 个商品: {sorted(good_ids)}")
+
 
-def process_goods_directory(base_path="/home/scruel/reso/resource/good"):
+def embed_items(items):
+    """一次批量调用为多件商品同时生成 name 与 detail 向量"""
+    texts = []
+    for item in items:
+        texts.extend([item["name"], item["detail"]])
+    embeddings = qwen.get_embeddings_batch(texts)
+    return [
+        {"name": embeddings[2 * i], "detail": embeddings[2 * i + 1]}
+        for i in range(len(items))
+    ]
+
+
+def batch_ingest(pending, workers=4, items_per_call=5, max_retries=3):
+    """
+    批量写入商品
+
+    嵌入在有界线程池中并发计算（每次 API 调用最多 10 条文本，即 5 件商品的 name 与 detail），
+    写入使用客户端的动态批处理，失败对象进入重试队列。
+
+    Args:
+        pending: [(item, uuid)] 列表，uuid 为已有对象的 uuid（内容变化）或 None（新增）
+        workers: 并发嵌入的线程数
+        items_per_call: 每次嵌入调用覆盖的商品数
+        max_retries: 失败对象的最大重试次数
+
+    Returns:
+        统计信息 {"succeeded", "failed", "seconds", "objects_per_sec"}
+    """
+    article_collection = client.collections.get(collection_name)
+    start_time = time.perf_counter()
+    queue = [(item, uuid or generate_uuid5(item["goodId"])) for item, uuid in pending]
+    succeeded = 0
+
+    for attempt in range(max_retries + 1):
+        if not queue:
+            break
+        if attempt:
+            print(f"第 {attempt} 次重试 {len(queue)} 个失败对象")
+        retry = []
+        groups = [queue[i:i + items_per_call] for i in range(0, len(queue), items_per_call)]
+        by_uuid = {str(uuid): (item, uuid) for item, uuid in queue}
+
+        with ThreadPoolExecutor(max_workers=workers) as pool, article_collection.batch.dynamic() as batch:
+            futures = {pool.submit(embed_items, [item for item, _ in group]): group for group in groups}
+            for future in as_completed(futures):
+                group = futures[future]
+                try:
+                    vectors = future.result()
+                except Exception as e:
+                    print(f"嵌入失败，稍后重试 {[item['goodId'] for item, _ in group]}: {e}")
+                    retry.extend(group)
+                    continue
+                for (item, uuid), vector in zip(group, vectors):
+                    batch.add_object(properties=item, uuid=uuid, vector=vector)
+
+        failed_uuids = {str(obj.object_.uuid) for obj in article_collection.batch.failed_objects}
+        retry.extend(by_uuid[u] for u in failed_uuids if u in by_uuid)
+        succeeded += len(queue) - len(retry)
+        queue = retry
+
+    seconds = time.perf_counter() - start_time
+    stats = {
+        "succeeded": succeeded,
+        "failed": len(queue),
+        "seconds": round(seconds, 2),
+        "objects_per_sec": round(succeeded / seconds, 2) if seconds > 0 else 0.0
+    }
+    print(f"批量写入完成 - 成功: {stats['succeeded']}, 失败: {stats['failed']}, "
+          f"耗时: {stats['seconds']}s, 速率: {stats['objects_per_sec']} 个/秒")
+    if queue:
+        print(f"最终失败的商品: {sorted(item['goodId'] for item, _ in queue)}")
+    return stats
+
+
+def process_goods_directory(base_path="/home/scruel/reso/resource/good", batch=True, workers=4):
+    """按内容哈希增量同步：只嵌入新增或变化的商品，并删除已移除的商品
+
+    Args:
+        base_path: 商品数据目录
+        batch: 是否使用批量写入模式，为 False 时逐个写入
+        workers: 批量模式下并发嵌入的线程数
+    """
     if not os.path.exists(base_path):
         print(f"目录不存在: {base_path}")
         return
+    # 一次性取回全部 goodId 及其内容哈希，替代逐个商品的存在性查询
+    existing = fetch_existing_hashes()
+    seen_ids = set()
+    pending = []
+    unchanged = 0
+
     subdirs = [d for d in os.listdir(base_path) if os.path.isdir(os.path.join(base_path, d))]
-    for subdir in subdirs:
-        subdir_path = os.path.join(base_path, subdir)
-        clean_data_path = os.path.join(subdir_path, "clean_data.json")
-        detail_path = os.path.join(subdir_path, "detail.txt")
-        
-        # 检查必要文件是否存在
-        if not os.path.exists(clean_data_path) or not os.path.exists(detail_path):
-            print(f"跳过文件夹 {subdir}: 缺少必要文件")
-            continue
-        
-        try:
-            # 读取 clean_data.json
-            with open(clean_data_path, 'r', encoding='utf-8') as f:
-                clean_data = json.load(f)
-
-            # 读取 detail.txt
-            with open(detail_path, 'r', encoding='utf-8') as f:
-                detail_content = f.read()
-            
-            # 转换数据格式以匹配 weaviate_init.py 中的 insert 方法
-            item = {
-                "goodId": int(subdir),  # 使用文件夹名作为 id
-                "name": clean_data.get("good_short_name", ""),
-                "price": clean_data.get("price", ""),
-                "brandName": clean_data.get("brand_name", ""),
-                "catagory": clean_data.get("catagory_full", ""),
-                "subCatagory": clean_data.get("sub_catagory", ""),
-                "itemCatagory": clean_data.get("item_catagory", ""),
-                "picUrl": clean_data.get("pic_url", ""),
-                "detail": detail_content.strip()
-            }
-            
-            print(f"处理商品 {subdir}: {item['name']}")
-            # 调用 insert 方法插入数据
-            insert(item)
-            print(f"成功插入商品 {subdir}")
-        except Exception as e:
-            raise e
-
-process_goods_directory()
-client.close()  # Free up resources
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        loaded = pool.map(lambda d: (d, load_good_item(Path(base_path) / d)), subdirs)
+        for subdir, item in loaded:
+            if item is None:
+                print(f"跳过文件夹 {subdir}: 缺少必要文件")
+                continue
+            item["contentHash"] = content_hash(item)
+            seen_ids.add(item["goodId"])
+
+            uuid, old_hash = existing.get(item["goodId"], (None, None))
+            if old_hash == item["contentHash"]:
+                unchanged += 1
+                continue
+            pending.append((item, uuid))
+
+    inserted = sum(1 for _, uuid in pending if uuid is None)
+    print(f"待写入 - 新增: {inserted}, 更新: {len(pending) - inserted}, 未变化: {unchanged}")
+
+    if batch:
+        batch_ingest(pending, workers=workers)
+    else:
+        for item, uuid in pending:
+            print(f"处理商品 {item['goodId']}: {item['name']}")
+            insert(item, existing_uuid=uuid)
+
+    removed = set(existing) - seen_ids
+    delete_goods(removed)
+    print(f"同步完成 - 删除: {len(removed)}")
+
+
+if __name__ == "__main__":
+    ensure_collection()
+    process_goods_directory()
+    client.close()  # Free up resources
@@ -1,11 +1,15 @@
 import weaviate
 from weaviate.classes.init import Auth
 import os
+import time
+import asyncio
+import threading
 import json
 from dotenv import load_dotenv
 from weaviate.config import AdditionalConfig, Timeout
 from weaviate.auth import AuthApiKey
 from weaviate.classes.config import Property, DataType
+from weaviate.classes.query import Filter
 from weaviate.collections.classes.config import Configure
 from weaviate.collections.classes.grpc import MetadataQuery
 from tools.rag.qwen_embedding import QwenEmbeddingService
@@ -15,33 +19,130 @@ load_dotenv()
 weaviate_url = os.getenv("WEAVIATE_URL")
 weaviate_api_key = os.getenv("WEAVIATE_API_KEY")
 
-def get_client():
-    client = weaviate.connect_to_custom(
-        http_host='weaviate-http.zeabur.app',
-        http_port=443,
-        http_secure=True,
-        grpc_host='weaviate-grpc.zeabur.app',
-        grpc_port=443,
-        grpc_secure=True,
+# 连接参数，同步与异步客户端共用
+CONNECTION_PARAMS = dict(
+    http_host='weaviate-http.zeabur.app',
+    http_port=443,
+    http_secure=True,
+    grpc_host='weaviate-grpc.zeabur.app',
+    grpc_port=443,
+    grpc_secure=True,
+)
+# 距上次健康检查超过该秒数时，复用前先确认连接可用
+HEALTH_CHECK_INTERVAL = 30
+
+_client = None
+_client_checked_at = 0.0
+_client_lock = threading.Lock()
+
+_async_client = None
+_async_client_checked_at = 0.0
+_async_client_lock = None
+
+
+def _connection_kwargs():
+    return dict(
+        CONNECTION_PARAMS,
         auth_credentials=Auth.api_key(weaviate_api_key),
-    additional_config=AdditionalConfig(
-        timeout=Timeout(init=30, query=60, insert=120)),
+        additional_config=AdditionalConfig(
+            timeout=Timeout(init=30, query=60, insert=120)),
     )
-    return client
+
+
+def get_client():
+    """获取进程内共享的同步客户端：首次调用时建立连接，之后复用并定期做健康检查"""
+    global _client, _client_checked_at
+    with _client_lock:
+        now = time.monotonic()
+        if _client is not None and now - _client_checked_at > HEALTH_CHECK_INTERVAL:
+            try:
+                healthy = _client.is_ready()
+            except Exception:
+                healthy = False
+            if not healthy:
+                print("Weaviate 连接不可用，重新连接")
+                _close_quietly(_client)
+                _client = None
+            _client_checked_at = now
+        if _client is None:
+            _client = weaviate.connect_to_custom(**_connection_kwargs())
+            _client_checked_at = now
+        return _client
+
+
+def close_client():
+    """关闭共享的同步客户端（应用退出时调用）"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _close_quietly(_client)
+            _client = None
+
+
+def _close_quietly(client):
+    try:
+        client.close()
+    except Exception as e:
+        print(f"关闭 Weaviate 客户端失败: {e}")
+
+
+async def get_async_client():
+    """获取共享的异步客户端（绑定到当前事件循环），用法与 get_client 相同"""
+    global _async_client, _async_client_checked_at, _async_client_lock
+    if _async_client_lock is None:
+        _async_client_lock = asyncio.Lock()
+    async with _async_client_lock:
+        now = time.monotonic()
+        if _async_client is not None and now - _async_client_checked_at > HEALTH_CHECK_INTERVAL:
+            try:
+                healthy = await _async_client.is_ready()
+            except Exception:
+                healthy = False
+            if not healthy:
+                print("Weaviate 异步连接不可用，重新连接")
+                await _aclose_quietly(_async_client)
+                _async_client = None
+            _async_client_checked_at = now
+        if _async_client is None:
+            client = weaviate.use_async_with_custom(**_connection_kwargs())
+            await client.connect()
+            _async_client = client
+            _async_client_checked_at = now
+        return _async_client
+
+
+async def close_async_client():
+    """关闭共享的异步客户端（应用退出时调用）"""
+    global _async_client
+    if _async_client is not None:
+        await _aclose_quietly(_async_client)
+        _async_client = None
+
+
+async def _aclose_quietly(client):
+    try:
+        await client.close()
+    except Exception as e:
+        print(f"关闭 Weaviate 异步客户端失败: {e}")
+
 
 collection_name = "ResoGoods"
 qwen = QwenEmbeddingService()
 
-def query(text: str):
+QUERY_PROPERTIES = ["goodId", "name", "price", "brandName", "catagory", "subCatagory", "itemCatagory", "picUrl"]
+
+
+def query(text: str, vector=None):
     client = get_client()
     article_collection = client.collections.get(collection_name)
-    vector = qwen.get_embedding(text)
+    if vector is None:
+        vector = qwen.get_embedding(text)
     response = article_collection.query.near_vector(
         target_vector="detail",
         near_vector=vector,
         limit=10,
         return_metadata=MetadataQuery(distance=True),
-        return_properties=["goodId", "name", "price", "brandName", "catagory", "subCatagory", "itemCatagory", "picUrl"]
+        return_properties=QUERY_PROPERTIES
     )
 
     # 展示数据
@@ -49,20 +150,46 @@ def query(text: str):
         print(o.properties)
         print(o.metadata.distance)
 
-    client.close()  # Free up resources
+    return response.objects
+
+
+async def aquery(text: str):
+    """异步查询：嵌入请求经分发器合并批处理，Weaviate 查询使用共享的异步客户端"""
+    vector = await qwen.aget_embedding(text)
+    client = await get_async_client()
+    article_collection = client.collections.get(collection_name)
+    response = await article_collection.query.near_vector(
+        target_vector="detail",
+        near_vector=vector,
+        limit=10,
+        return_metadata=MetadataQuery(distance=True),
+        return_properties=QUERY_PROPERTIES
+    )
     return response.objects
 
 
 def query_good(good_id: int):
     client = get_client()
     article_collection = client.collections.get(collection_name)
-    from weaviate.classes.query import Filter
     existing_items = article_collection.query.fetch_objects(
         filters=Filter.by_property("goodId").equal(good_id),
         limit=1
     )
     return existing_items.objects[0].properties
 
+
+async def aquery_good(good_id: int):
+    """query_good 的异步版本"""
+    client = await get_async_client()
+    article_collection = client.collections.get(collection_name)
+    existing_items = await article_collection.query.fetch_objects(
+        filters=Filter.by_property("goodId").equal(good_id),
+        limit=1
+    )
+    return existing_items.objects[0].properties
+
+
 if __name__ == "__main__":
     # query("小米充电宝")
     print(query_good(1))
+    close_client()